@@ -0,0 +1,284 @@
+"""Summaries of emotion time series: distribution, dwell time, peak moments and transitions, per session and per hour.
+
+Everything works on an N x 7 float32 array of emotion scores (EMOTIONS order, the `emotion` keys
+of output.js) and an N-vector of timestamps, with whole-array NumPy reductions: there is no
+Python loop over frames, so millions of frames take seconds. Series are read from recordings
+(see recording.py), one per recording, using the main (largest) face of every frame.
+
+Usage:
+    python -m analytics sessions/booth
+    python -m analytics sessions/* --by-hour --session-gap 300
+    python -m analytics sessions/booth --json > summary.json
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from emotion_detection import EMOTIONS
+
+K = len(EMOTIONS)
+
+
+class EmotionSeries:
+    """A growable (timestamps, N x 7 float32 scores) series, appended to one frame at a time by the Tk app.
+
+    With max_seconds, frames older than that (relative to the newest) are dropped, so memory stays
+    flat however long the app runs: the buffers hold at most about 2.7x the frames of the window,
+    at 36 bytes per frame (21 MB for 2 hours at 30 results/s).
+    """
+
+    def __init__(self, capacity=4096, max_seconds=None):
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.emotions = np.empty((capacity, K), dtype=np.float32)
+        self.size = 0
+        self.max_seconds = max_seconds
+
+    def append(self, timestamp, vector):
+        if self.size == len(self.timestamps):
+            self._make_room(timestamp)
+        self.timestamps[self.size] = timestamp
+        self.emotions[self.size] = vector
+        self.size += 1
+
+    def _make_room(self, now):
+        """Drop the frames that fell out of the window if that frees at least a quarter of the
+        buffer, else double it (either way appends stay amortized O(1))."""
+        if self.max_seconds is not None:
+            drop = int(np.searchsorted(self.timestamps[:self.size], now - self.max_seconds))
+            if drop >= self.size // 4:
+                keep = self.size - drop
+                self.timestamps[:keep] = self.timestamps[drop:self.size]
+                self.emotions[:keep] = self.emotions[drop:self.size]
+                self.size = keep
+                return
+        self.timestamps = np.resize(self.timestamps, 2 * self.size)
+        self.emotions = np.resize(self.emotions, (2 * self.size, K))
+
+    def arrays(self):
+        """Views of the timestamps and scores (only the last max_seconds, if set)."""
+        start = 0
+        if self.max_seconds is not None and self.size:
+            start = int(np.searchsorted(self.timestamps[:self.size], self.timestamps[self.size - 1] - self.max_seconds))
+        return self.timestamps[start:self.size], self.emotions[start:self.size]
+
+    def __len__(self):
+        return self.size
+
+
+def run_starts(labels):
+    """Indices where a run of equal values starts in a 1-D array."""
+    if len(labels) == 0:
+        return np.empty(0, dtype=np.intp)
+    return np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+
+
+def frame_durations(timestamps, max_gap=1.0):
+    """Seconds each frame stands for: the time until the next frame, capped at max_gap so pauses
+    without a face don't count. The last frame gets the median frame interval."""
+    if len(timestamps) < 2:
+        return np.zeros(len(timestamps))
+    steps = np.diff(timestamps)
+    return np.minimum(np.append(steps, np.median(steps)), max_gap)
+
+
+def transition_counts(labels):
+    """K x K counts of changes from one dominant emotion (row) to the next (column)."""
+    runs = labels[run_starts(labels)].astype(np.intp)
+    return np.bincount(runs[:-1] * K + runs[1:], minlength=K * K).reshape(K, K)
+
+
+def peak_moments(timestamps, emotions, top=3, spacing=5.0):
+    """For each emotion, the `top` highest-scoring frames as (index, score) arrays of shape K x top.
+
+    Only the best frame of every `spacing`-second window is a candidate, so the peaks are separate
+    moments rather than neighbouring frames of the same one. With fewer windows than `top`, the
+    missing entries have index -1.
+    """
+    n = len(timestamps)
+    index = np.full((K, top), -1, dtype=np.intp)
+    score = np.zeros((K, top), dtype=np.float32)
+    if n == 0 or top == 0:
+        return index, score
+    window = np.floor((timestamps - timestamps[0]) / spacing).astype(np.int64)
+    starts = run_starts(window)
+    window_max = np.maximum.reduceat(emotions, starts, axis=0)
+    window_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    # First frame of each window that reaches the window's maximum: n - max(n - i) over those frames
+    countdown = np.where(emotions == window_max[window_of], np.arange(n, 0, -1, dtype=np.int32)[:, None], 0)
+    window_best = n - np.maximum.reduceat(countdown, starts, axis=0)
+    take = min(top, len(starts))
+    best = np.argpartition(-window_max, take - 1, axis=0)[:take]
+    best_score = np.take_along_axis(window_max, best, axis=0)
+    order = np.argsort(-best_score, axis=0, kind="stable")
+    best = np.take_along_axis(best, order, axis=0)
+    index[:, :take] = np.take_along_axis(window_best, best, axis=0).T
+    score[:, :take] = np.take_along_axis(best_score, order, axis=0).T
+    return index, score
+
+
+def summarize(timestamps, emotions, max_gap=1.0, top=3, spacing=5.0):
+    """Distribution, dwell time, peak moments and transitions of one series (sorted by time)."""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    emotions = np.asarray(emotions, dtype=np.float32)
+    n = len(timestamps)
+    dominant = emotions.argmax(axis=1) if n else np.empty(0, dtype=np.intp)
+    durations = frame_durations(timestamps, max_gap)
+    peak_index, peak_score = peak_moments(timestamps, emotions, top, spacing)
+    transitions = transition_counts(dominant)
+    return {
+        "frames": n,
+        "start": float(timestamps[0]) if n else None,
+        "end": float(timestamps[-1]) if n else None,
+        "seconds": float(durations.sum()),
+        "mean": dict(zip(EMOTIONS, (emotions.mean(axis=0) if n else np.zeros(K)).tolist())),
+        "share": dict(zip(EMOTIONS, (np.bincount(dominant, minlength=K) / max(n, 1)).tolist())),
+        "dwell_seconds": dict(zip(EMOTIONS, np.bincount(dominant, weights=durations, minlength=K).tolist())),
+        "changes": int(transitions.sum()),
+        "transitions": transitions.tolist(),
+        "peaks": {emotion: [{"time": float(timestamps[i]), "score": float(s)}
+                            for i, s in zip(peak_index[e], peak_score[e]) if i >= 0]
+                  for e, emotion in enumerate(EMOTIONS)},
+    }
+
+
+def summarize_groups(timestamps, emotions, groups, max_gap=1.0):
+    """Per-group frames, seconds, mean scores and dwell time, for a series sorted by time whose
+    `groups` keys (e.g. the hour, or the session number) only ever increase.
+
+    Returns (keys, frames, seconds, mean G x K, dwell G x K).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    emotions = np.asarray(emotions, dtype=np.float32)
+    if len(timestamps) == 0:
+        return groups[:0], np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, K)), np.zeros((0, K))
+    starts = run_starts(groups)
+    frames = np.diff(np.append(starts, len(timestamps)))
+    group_of = np.repeat(np.arange(len(starts)), frames)
+    durations = frame_durations(timestamps, max_gap)
+    mean = np.add.reduceat(emotions, starts, axis=0, dtype=np.float64) / frames[:, None]
+    dominant = emotions.argmax(axis=1)
+    dwell = np.bincount(group_of * K + dominant, weights=durations, minlength=len(starts) * K).reshape(-1, K)
+    return groups[starts], frames, np.add.reduceat(durations, starts), mean, dwell
+
+
+def hour_keys(timestamps):
+    """Start of the local hour of each timestamp, as epoch seconds (the UTC offset of the first
+    timestamp is used for the whole series)."""
+    if len(timestamps) == 0:
+        return np.zeros(0)
+    offset = time.localtime(float(timestamps[0])).tm_gmtoff
+    return np.floor((timestamps + offset) / 3600.0) * 3600.0 - offset
+
+
+def session_keys(timestamps, session_gap):
+    """Session number of each timestamp: a new session starts after session_gap seconds without frames."""
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(([0], np.cumsum(np.diff(timestamps) > session_gap)))
+
+
+def load_recording(path):
+    """(timestamps, emotions) of a recording's main face (the largest) in every frame that has a face."""
+    from recording import SessionReader
+
+    reader = SessionReader(path)
+    if reader.faces == 0:
+        return np.zeros(0), np.zeros((0, K), dtype=np.float32)
+    main = reader.main_faces()
+    rows = np.asarray(reader.frame_row)
+    timestamps = np.asarray(reader.timestamp)[rows[main]]
+    return timestamps, np.asarray(reader.emotion[main])
+
+
+def sort_by_time(timestamps, emotions):
+    if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind="stable")
+        return timestamps[order], emotions[order]
+    return timestamps, emotions
+
+
+def format_clock(t):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+
+def format_summary(summary, title="Session"):
+    """Text report of a summarize() result, for the console and the Tk analytics window."""
+    if not summary["frames"]:
+        return f"{title}: no faces yet\n"
+    lines = [f"{title}: {summary['frames']} frames, {summary['seconds']:.0f} s with a face, "
+             f"{format_clock(summary['start'])} - {format_clock(summary['end'])[11:]}",
+             f"{'emotion':<10}{'mean %':>8}{'main %':>8}{'dwell s':>9}  peaks (time score)"]
+    for emotion in EMOTIONS:
+        peaks = "  ".join(f"{format_clock(p['time'])[11:]} {p['score']:.0f}" for p in summary["peaks"][emotion])
+        lines.append(f"{emotion:<10}{summary['mean'][emotion]:>8.1f}{summary['share'][emotion] * 100:>8.1f}"
+                     f"{summary['dwell_seconds'][emotion]:>9.1f}  {peaks}")
+    lines.append(f"Changes of main emotion: {summary['changes']} (rows: from, columns: to)")
+    lines.append(" " * 10 + "".join(f"{e[:7]:>8}" for e in EMOTIONS))
+    for emotion, row in zip(EMOTIONS, summary["transitions"]):
+        lines.append(f"{emotion:<10}" + "".join(f"{n:>8}" for n in row))
+    return "\n".join(lines) + "\n"
+
+
+def format_groups(names, frames, seconds, mean, dwell, label):
+    """Text table of a summarize_groups() result: one line per group with the main emotion by dwell time."""
+    lines = [f"{label:<20}{'frames':>9}{'seconds':>9}  main emotion (dwell %)  " + " ".join(f"{e[:5]:>6}" for e in EMOTIONS)]
+    main = dwell.argmax(axis=1) if len(names) else []
+    for i, name in enumerate(names):
+        share = dwell[i, main[i]] / max(dwell[i].sum(), 1e-9) * 100
+        lines.append(f"{name:<20}{frames[i]:>9}{seconds[i]:>9.0f}  {EMOTIONS[main[i]]:<10}{share:>5.0f}%        "
+                     + " ".join(f"{v:>6.1f}" for v in mean[i]))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="analytics", description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", nargs="+", help="Recording directories (see recording.py), one session each")
+    parser.add_argument("--by-hour", action="store_true", help="Also summarize every hour of all recordings together")
+    parser.add_argument("--session-gap", type=float,
+                        help="Split recordings into separate sessions after this many seconds without a face")
+    parser.add_argument("--max-gap", type=float, default=1.0, help="Longest time one frame counts for (seconds)")
+    parser.add_argument("--top", type=int, default=3, help="Peak moments per emotion")
+    parser.add_argument("--peak-spacing", type=float, default=5.0, help="Minimum seconds between two peaks")
+    parser.add_argument("--json", action="store_true", help="Print the summaries as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sessions = []
+    for path in args.recordings:
+        timestamps, emotions = sort_by_time(*load_recording(path))
+        if args.session_gap is None:
+            sessions.append((path, timestamps, emotions))
+            continue
+        keys = session_keys(timestamps, args.session_gap)
+        bounds = np.append(run_starts(keys), len(timestamps))
+        sessions.extend((f"{path} #{i + 1}", timestamps[a:b], emotions[a:b])
+                        for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])))
+
+    report = {"sessions": [dict(summarize(t, e, args.max_gap, args.top, args.peak_spacing), name=name)
+                           for name, t, e in sessions]}
+    if args.by_hour:
+        timestamps, emotions = sort_by_time(np.concatenate([s[1] for s in sessions]),
+                                            np.concatenate([s[2] for s in sessions]))
+        keys, frames, seconds, mean, dwell = summarize_groups(timestamps, emotions, hour_keys(timestamps), args.max_gap)
+        report["hours"] = [{"hour": float(k), "frames": int(f), "seconds": float(s),
+                            "mean": dict(zip(EMOTIONS, m.tolist())), "dwell_seconds": dict(zip(EMOTIONS, d.tolist()))}
+                           for k, f, s, m, d in zip(keys, frames, seconds, mean, dwell)]
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    for summary in report["sessions"]:
+        print(format_summary(summary, summary["name"]))
+    if args.by_hour:
+        print(format_groups([format_clock(k)[:13] + ":00" for k in keys], frames, seconds, mean, dwell, "hour"))
+    total = sum(s["frames"] for s in report["sessions"])
+    print(f"{total} frames summarized in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
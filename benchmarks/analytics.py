@@ -0,0 +1,73 @@
+"""Session analytics throughput: frames/s of the vectorized summaries against a per-frame Python loop.
+
+The series is synthetic: a main emotion that changes every few seconds, noisy scores around it and
+frames 20-50 ms apart, so hour groups, dwell times and transitions look like a real session's.
+The loop does the dwell time and transition counts only (the cheapest part) and is timed on the
+smallest size.
+
+Usage (from the repository root):
+    python -m benchmarks.analytics
+    python -m benchmarks.analytics --frames 100000 1000000 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import analytics
+from emotion_detection import EMOTIONS
+
+K = len(EMOTIONS)
+
+
+def synthetic_series(frames, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = 1.7e9 + np.cumsum(rng.uniform(0.02, 0.05, frames))
+    segment = np.floor((timestamps - timestamps[0]) / rng.uniform(2, 8)).astype(np.int64)
+    main = rng.integers(0, K, segment[-1] + 1)[segment]
+    emotions = rng.gamma(1.0, 5.0, (frames, K)).astype(np.float32)
+    emotions[np.arange(frames), main] += 40.0
+    emotions *= 100.0 / emotions.sum(axis=1, keepdims=True)
+    return timestamps, emotions
+
+
+def per_frame_loop(timestamps, emotions, max_gap=1.0):
+    """Dwell time and transitions the obvious way, one frame at a time."""
+    dwell = [0.0] * K
+    transitions = [[0] * K for _ in range(K)]
+    previous = None
+    for i in range(len(timestamps)):
+        scores = emotions[i].tolist()
+        main = scores.index(max(scores))
+        if i + 1 < len(timestamps):
+            dwell[main] += min(timestamps[i + 1] - timestamps[i], max_gap)
+        if previous is not None and main != previous:
+            transitions[previous][main] += 1
+        previous = main
+    return dwell, transitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    args = parser.parse_args()
+
+    print(f"{'frames':>10}{'summary s':>11}{'per hour s':>12}{'frames/s':>14}{'loop frames/s':>15}")
+    for frames in args.frames:
+        timestamps, emotions = synthetic_series(frames)
+        start = time.perf_counter()
+        analytics.summarize(timestamps, emotions)
+        summary_s = time.perf_counter() - start
+        start = time.perf_counter()
+        analytics.summarize_groups(timestamps, emotions, analytics.hour_keys(timestamps))
+        hours_s = time.perf_counter() - start
+        loop = "-"
+        if frames == min(args.frames):
+            start = time.perf_counter()
+            per_frame_loop(timestamps, emotions)
+            loop = f"{frames / (time.perf_counter() - start):,.0f}"
+        print(f"{frames:>10,}{summary_s:>11.2f}{hours_s:>12.2f}{frames / (summary_s + hours_s):>14,.0f}{loop:>15}")
+
+
+if __name__ == "__main__":
+    main()
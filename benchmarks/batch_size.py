@@ -0,0 +1,50 @@
+"""Faces/sec of classify_faces() against batch size on CPU.
+
+Usage (from the repository root):
+    python -m benchmarks.batch_size
+    python -m benchmarks.batch_size --faces 512 --sizes 1 4 16 64
+"""
+import argparse
+import os
+import time
+
+# Benchmark the CPU path even on machines with a GPU
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+import numpy as np
+
+import emotion_detection
+
+
+def make_crops(count, seed=0):
+    """Random BGR face-sized crops. The classifier cost does not depend on the pixel values."""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=(160, 160, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def run(faces, sizes, repeats):
+    crops = make_crops(faces)
+    # Build and warm the model so the first batch size is not charged for it
+    emotion_detection.classify_faces(crops[:max(sizes)], batch_size=max(sizes))
+
+    print(f"{'batch':>6} {'faces/s':>10} {'ms/face':>9}")
+    for size in sizes:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            emotion_detection.classify_faces(crops, batch_size=size)
+            best = min(best, time.perf_counter() - start)
+        print(f"{size:>6} {faces / best:>10.1f} {1000.0 * best / faces:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--faces", type=int, default=256, help="Number of face crops per run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64, 128])
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per batch size, the best is reported")
+    args = parser.parse_args()
+    run(args.faces, args.sizes, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
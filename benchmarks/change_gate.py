@@ -0,0 +1,126 @@
+"""Change gating check: which frames TrackingAnalyzer(change_threshold=...) reuses, and whether it misses changes.
+
+The assets/ faces (cropped to the face plus a margin) are placed in a simulated camera frame, the
+face --face-size px high, and replayed in a few scenes:
+
+    still          the same frame throughout (should mostly be reused)
+    expression     a still face whose mouth and chin change to another expression's halfway
+    swap           a still face replaced by another face halfway
+    moving         a face moving sideways --speed px per frame
+
+Reported per scene: frames analyzed and reused, the longest run of reused frames, the frames it
+took to analyze again after the change, and the mean distance of the reported box from the face.
+Exits with status 1 if a change was not picked up on the frame it happened, or a run of reused
+frames was longer than max_skip.
+
+Usage (from the repository root):
+    python -m benchmarks.change_gate --detector-backend haar
+    python -m benchmarks.change_gate --frame 1280x720 --face-size 120 --threshold 3 --speed 5
+"""
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from benchmarks.detect_scale import camera_frame
+from benchmarks.fixtures import load_assets
+
+
+MARGIN = 0.25  # Around the face box on each side, as a fraction of its size
+
+
+def face_image(image, detector_backend):
+    """The image cropped to its main face plus MARGIN on each side."""
+    import emotion_detection
+
+    region = max(emotion_detection.detect_faces(image, detector_backend), key=lambda r: r['w'] * r['h'])
+    x, y, w, h = (region[k] for k in ('x', 'y', 'w', 'h'))
+    mx, my = int(w * MARGIN), int(h * MARGIN)
+    return image[max(y - my, 0):y + h + my, max(x - mx, 0):x + w + mx]
+
+
+def expression_change(before, after):
+    """before with the lower 40% of the face (mouth and chin) taken from after."""
+    after = cv2.resize(after, (before.shape[1], before.shape[0]), interpolation=cv2.INTER_AREA)
+    changed = before.copy()
+    rows = int(before.shape[0] * (MARGIN + 0.6) / (1 + 2 * MARGIN))
+    changed[rows:] = after[rows:]
+    return changed
+
+
+def scenes(faces, width, height, face_fraction, frames, speed):
+    """(name, frames, index of the frame where the face changes or None, x shift per frame index or None)"""
+    first, second = faces["happy"], faces["angry"]
+    still = camera_frame(first, width, height, face_fraction)
+    half = frames // 2
+    yield "still", [still] * frames, None, None
+    changed = camera_frame(expression_change(first, second), width, height, face_fraction)
+    yield "expression", [still] * half + [changed] * (frames - half), half, None
+    yield "swap", [still] * half + [camera_frame(second, width, height, face_fraction)] * (frames - half), half, None
+    shift = lambda i: (i - frames // 2) * speed
+    yield "moving", [np.roll(still, shift(i), axis=1) for i in range(frames)], None, shift
+
+
+def run(analyzer, frames):
+    """Analyze frames in order; returns (reused flag per frame, main face x per frame)."""
+    gate = analyzer.frame_gate
+    reused, xs = [], []
+    for frame in frames:
+        before = gate.skipped_count
+        analysis = analyzer(frame)
+        reused.append(gate.skipped_count > before)
+        xs.append(max(analysis, key=lambda f: f['region']['w'])['region']['x'] if analysis else None)
+    return reused, xs
+
+
+def longest_run(flags):
+    best = current = 0
+    for flag in flags:
+        current = current + 1 if flag else 0
+        best = max(best, current)
+    return best
+
+
+def main():
+    import emotion_detection
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frame", default="640x480", help="Simulated camera frame size, WxH")
+    parser.add_argument("--face-size", type=int, default=160, help="Face height in the frame, px")
+    parser.add_argument("--frames", type=int, default=30, help="Frames per scene")
+    parser.add_argument("--speed", type=int, default=5, help="Pixels per frame in the moving scene")
+    parser.add_argument("--threshold", type=float, default=3.0, help="Change threshold (ed.py's CHANGE_THRESHOLD)")
+    parser.add_argument("--detect-interval", type=int, default=10)
+    parser.add_argument("--max-skip", type=int, default=10)
+    emotion_detection.add_model_arguments(parser)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.frame.split("x"))
+    emotion_detection.warm_up(args.detector_backend, args.cache_dir, args.offline, **emotion_detection.emotion_options(args))
+    faces = {label: face_image(image, args.detector_backend) for label, image in load_assets()}
+    face_fraction = args.face_size * (1 + 2 * MARGIN) / height
+
+    ok = True
+    print(f"{width}x{height} frames, {args.face_size} px face, detector {args.detector_backend}, threshold {args.threshold}, max_skip {args.max_skip}")
+    print(f"{'scene':<12}{'analyzed':>9}{'reused':>8}{'max run':>9}{'pick-up':>9}{'box lag px':>12}")
+    for name, frames, change_at, shift in scenes(faces, width, height, face_fraction, args.frames, args.speed):
+        analyzer = emotion_detection.TrackingAnalyzer(args.detect_interval, detector_backend=args.detector_backend,
+                                                      change_threshold=args.threshold, max_skip=args.max_skip)
+        reused, xs = run(analyzer, frames)
+        pickup = lag = "-"
+        if change_at is not None:
+            delay = reused[change_at:].index(False) if False in reused[change_at:] else len(reused) - change_at
+            pickup = f"{delay} fr"
+            ok &= delay == 0
+        if shift is not None and xs[0] is not None:
+            lag = f"{np.mean([abs(x - xs[0] - shift(i) + shift(0)) for i, x in enumerate(xs) if x is not None]):.1f}"
+        run_length = longest_run(reused)
+        ok &= run_length <= args.max_skip
+        print(f"{name:<12}{reused.count(False):>9}{reused.count(True):>8}{run_length:>9}{pickup:>9}{lag:>12}")
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
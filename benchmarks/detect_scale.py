@@ -0,0 +1,95 @@
+"""Two-resolution analysis: detection cost and accuracy against the detection scale, on the assets/ images.
+
+Each labeled assets/ image is placed in a simulated camera frame (--frame, the face filling
+--face-fraction of its height). For every scale, the faces are detected on a downscaled copy and
+the boxes are mapped back to the frame, as TrackingAnalyzer(detect_scale=...) does. Reported per
+scale:
+
+    detect ms   median time of the resize plus the detection
+    found       images where a face was found
+    IoU         mean overlap of the main face's box with the one found at full resolution
+    full-res    main expression correct with the crop taken from the full frame (the shipped path)
+    low-res     main expression correct with the crop taken from the downscaled copy, for comparison
+    agree       full-res result equal to the scale 1.0 result
+
+Usage (from the repository root):
+    python -m benchmarks.detect_scale
+    python -m benchmarks.detect_scale --frame 1920x1080 --scales 1 0.5 0.25 --detector-backend yunet
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import load_assets
+
+
+def camera_frame(image, width, height, face_fraction):
+    """The image resized to face_fraction of the frame height, centred on a gray frame."""
+    size = int(height * face_fraction)
+    scaled = cv2.resize(image, (size * image.shape[1] // image.shape[0], size), interpolation=cv2.INTER_AREA)
+    frame = np.full((height, width, 3), 128, dtype=np.uint8)
+    y, x = (height - scaled.shape[0]) // 2, (width - scaled.shape[1]) // 2
+    frame[y:y + scaled.shape[0], x:x + scaled.shape[1]] = scaled[:, :width]
+    return frame
+
+
+def main_region(regions):
+    return max(regions, key=lambda r: r['w'] * r['h']) if regions else None
+
+
+def box(region):
+    return (region['x'], region['y'], region['w'], region['h'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frame", default="1280x720", help="Simulated camera frame size, WxH")
+    parser.add_argument("--face-fraction", type=float, default=0.5, help="Image height as a fraction of the frame's")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--repeats", type=int, default=10, help="Timed detections per image and scale")
+    parser.add_argument("--detector-backend", default="opencv")
+    args = parser.parse_args()
+
+    import emotion_detection
+    from tracking import iou
+
+    width, height = (int(v) for v in args.frame.split("x"))
+    frames = [(label, camera_frame(image, width, height, args.face_fraction)) for label, image in load_assets()]
+    emotion_detection.warm_up(args.detector_backend)
+    detector = emotion_detection.get_detector(args.detector_backend)
+
+    reference = {}
+    print(f"{len(frames)} images in {width}x{height} frames, detector {args.detector_backend}")
+    print(f"{'scale':>6}{'detect ms':>11}{'found':>8}{'IoU':>7}{'full-res':>10}{'low-res':>9}{'agree':>7}")
+    for scale in args.scales:
+        times, found, overlaps, full_ok, low_ok, agree = [], 0, [], 0, 0, 0
+        for label, frame in frames:
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                small = emotion_detection.downscale(frame, scale)
+                small_regions = detector(small)
+                times.append(time.perf_counter() - start)
+            regions = emotion_detection.scale_regions(small_regions, 1.0 / scale)
+            region = main_region(regions)
+            if region is None:
+                continue
+            found += 1
+            full = emotion_detection.analyze_regions(frame, [region])[0]['dominant_emotion']
+            low = emotion_detection.analyze_regions(small, [main_region(small_regions)])[0]['dominant_emotion']
+            full_ok += full == label
+            low_ok += low == label
+            if scale == args.scales[0]:
+                reference[label] = (box(region), full)
+            if label in reference:
+                overlaps.append(iou(reference[label][0], box(region)))
+                agree += full == reference[label][1]
+        n = max(found, 1)
+        print(f"{scale:>6.2f}{np.median(times) * 1000:>11.2f}{found:>5}/{len(frames):<2}"
+              f"{np.mean(overlaps) if overlaps else 0.0:>7.2f}{full_ok / n * 100:>9.0f}%{low_ok / n * 100:>8.0f}%"
+              f"{agree / n * 100:>6.0f}%")
+
+
+if __name__ == "__main__":
+    main()
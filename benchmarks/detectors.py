@@ -0,0 +1,98 @@
+"""Latency, faces found and memory of each face detector backend.
+
+Each backend runs in its own interpreter so its memory use is measured in isolation. The input
+is the images in assets/ plus, optionally, a recorded clip.
+
+Usage (from the repository root):
+    python -m benchmarks.detectors
+    python -m benchmarks.detectors --backends haar yunet opencv ssd --video clip.mp4 --repeats 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.fixtures import load_assets, load_clip, peak_rss_mb
+
+DEFAULT_BACKENDS = ["haar", "yunet", "skip", "opencv", "ssd", "mtcnn", "retinaface", "mediapipe"]
+
+
+def load_frames(video, max_video_frames):
+    frames = [frame for _, frame in load_assets()]
+    if video:
+        frames += [frame for _, frame in load_clip(video, max_video_frames)]
+    return frames
+
+
+def measure(backend, video, max_video_frames, repeats):
+    """Run one backend over all frames (in this process) and return its numbers."""
+    import emotion_detection
+
+    frames = load_frames(video, max_video_frames)
+    baseline_mb = peak_rss_mb()
+    detector = emotion_detection.get_detector(backend)
+    start = time.perf_counter()
+    detector.load()
+    detector(frames[0])  # First call pays for lazy initialisation
+    load_ms = (time.perf_counter() - start) * 1000.0
+
+    faces = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        faces = sum(len(detector(frame)) for frame in frames)
+    elapsed = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "frames": len(frames),
+        "ms_per_frame": elapsed * 1000.0 / (repeats * len(frames)),
+        "faces_found": faces,
+        "load_ms": load_ms,
+        "peak_rss_mb": peak_rss_mb(),
+        "model_rss_mb": peak_rss_mb() - baseline_mb,
+    }
+
+
+def run_isolated(backend, args):
+    """Measure one backend in a child interpreter; returns its result dict or an error dict."""
+    cmd = [sys.executable, "-m", "benchmarks.detectors", "--child", backend,
+           "--repeats", str(args.repeats), "--max-video-frames", str(args.max_video_frames)]
+    if args.video:
+        cmd += ["--video", args.video]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"backend": backend, "error": lines[-1] if lines else f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=DEFAULT_BACKENDS)
+    parser.add_argument("--video", help="Recorded clip to add to the assets/ images")
+    parser.add_argument("--max-video-frames", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.video, args.max_video_frames, args.repeats)))
+        return
+
+    results = [run_isolated(backend, args) for backend in args.backends]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'backend':<12}{'ms/frame':>10}{'faces':>7}{'load ms':>9}{'model MB':>10}{'peak MB':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<12}  unavailable: {r['error']}")
+            continue
+        print(f"{r['backend']:<12}{r['ms_per_frame']:>10.2f}{r['faces_found']:>7}{r['load_ms']:>9.0f}"
+              f"{r['model_rss_mb']:>10.1f}{r['peak_rss_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
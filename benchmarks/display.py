@@ -0,0 +1,86 @@
+"""Display path microbenchmark: µs and bytes allocated per frame, before and after DisplayTransform.
+
+"before" is the old update_frame() path: resize_frame() into a fresh array, cvtColor into
+another fresh array, then Image.fromarray. "after" is DisplayTransform.apply() into a reused
+buffer plus to_image(), which swaps BGR->RGB while Pillow copies the pixels.
+
+Allocations are the NumPy/OpenCV array bytes traced by tracemalloc; Pillow's own image buffer
+is allocated outside the Python allocator and is the same in both paths.
+
+Usage (from the repository root):
+    python -m benchmarks.display
+    python -m benchmarks.display --frames 500 --canvas 1024x576
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from display import DisplayTransform, fit_size
+
+ASPECT_RATIO = 16 / 9
+SOURCES = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def before(frame, canvas_width, canvas_height):
+    """The per-frame work update_frame() did before DisplayTransform."""
+    height, width = frame.shape[:2]
+    new_width, new_height = fit_size(width, height, canvas_width, canvas_height, ASPECT_RATIO)
+    resized = cv2.resize(frame, (new_width, new_height))
+    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    return Image.fromarray(rgb)
+
+
+def make_after():
+    transform = DisplayTransform(ASPECT_RATIO)
+
+    def after(frame, canvas_width, canvas_height):
+        buffer, _, _ = transform.apply(frame, canvas_width, canvas_height)
+        return transform.to_image(buffer)
+
+    return after
+
+
+def measure(path, frame, canvas, frames):
+    """Return (µs per frame, traced bytes allocated per frame) in steady state."""
+    for _ in range(5):
+        path(frame, *canvas)  # Let buffers and caches settle
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        path(frame, *canvas)
+    us = (time.perf_counter() - start) * 1e6 / frames
+
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(min(frames, 50)):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        path(frame, *canvas)
+        allocated += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return us, allocated / min(frames, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--canvas", default="1280x720", help="Canvas size WxH")
+    args = parser.parse_args()
+    canvas = tuple(int(v) for v in args.canvas.split("x"))
+
+    rng = np.random.default_rng(0)
+    print(f"canvas {canvas[0]}x{canvas[1]}")
+    print(f"{'source':<7}{'path':<8}{'us/frame':>10}{'KB alloc/frame':>16}")
+    for name, (width, height) in SOURCES.items():
+        frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        for label, path in (("before", before), ("after", make_after())):
+            us, allocated = measure(path, frame, canvas, args.frames)
+            print(f"{name:<7}{label:<8}{us:>10.0f}{allocated / 1024:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
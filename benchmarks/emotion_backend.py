@@ -0,0 +1,108 @@
+"""Emotion classifier backends: DeepFace's Keras model against the ONNX export on ONNX Runtime and OpenCV DNN.
+
+Each backend runs in its own interpreter, so load time and memory include only what that
+backend imports. Reported per backend:
+
+    load ms     importing the backend, building the model and classifying the first face
+    peak MB     peak RSS of the process after the runs
+    TF          whether TensorFlow ended up imported
+    faces/s     classify_faces() throughput per batch size (best of --repeats)
+
+Export the model first (python -m emotion_onnx export --int8); backends whose model is missing
+are reported as failed.
+
+Usage (from the repository root):
+    python -m benchmarks.emotion_backend
+    python -m benchmarks.emotion_backend --threads 1 --sizes 1 8 32 --cache-dir models
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Benchmark the CPU path even on machines with a GPU
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+from benchmarks.batch_size import make_crops
+from benchmarks.fixtures import peak_rss_mb
+
+# name -> (emotion backend, ONNX file in the weights cache)
+VARIANTS = {
+    "deepface": ("deepface", None),
+    "onnxruntime": ("onnxruntime", "facial_expression_model.onnx"),
+    "onnxruntime-int8": ("onnxruntime", "facial_expression_model_int8.onnx"),
+    "opencv": ("opencv", "facial_expression_model.onnx"),
+}
+
+
+def measure(variant, args):
+    """Run one variant in this process and return its result dict."""
+    start = time.perf_counter()
+    import emotion_detection
+
+    if args.cache_dir is not None:
+        emotion_detection.set_model_cache(args.cache_dir)
+    backend, filename = VARIANTS[variant]
+    model = os.path.join(emotion_detection.weights_dir(), filename) if filename else None
+    emotion_detection.set_emotion_backend(backend, model, args.threads)
+    crops = make_crops(args.faces)
+    emotion_detection.classify_faces(crops[:1])
+    load = time.perf_counter() - start
+
+    throughput = {}
+    for size in args.sizes:
+        best = float("inf")
+        for _ in range(args.repeats):
+            begin = time.perf_counter()
+            emotion_detection.classify_faces(crops, batch_size=size)
+            best = min(best, time.perf_counter() - begin)
+        throughput[size] = args.faces / best
+    return dict(variant=variant, load_ms=load * 1000.0, peak_rss_mb=peak_rss_mb(),
+                tensorflow="tensorflow" in sys.modules, faces_per_s=throughput)
+
+
+def run_isolated(variant, argv):
+    """Measure one variant in a child interpreter; returns its result dict or an error dict."""
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.emotion_backend", "--child", variant] + argv,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"variant": variant, "error": lines[-1] if lines else f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--faces", type=int, default=256, help="Number of face crops per run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per batch size, the best is reported")
+    parser.add_argument("--threads", type=int, help="ONNX Runtime / OpenCV threads (default: theirs)")
+    parser.add_argument("--cache-dir", help="Model weights cache (DEEPFACE_HOME)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args)))
+        return
+
+    argv = list(sys.argv[1:])
+    if "--variants" in argv:
+        i = argv.index("--variants")
+        del argv[i:i + 1 + len(args.variants)]
+
+    sizes = "".join(f"{f'b={size} f/s':>12}" for size in args.sizes)
+    print(f"{'backend':<18}{'load ms':>9}{'peak MB':>9}{'TF':>5}{sizes}")
+    for variant in args.variants:
+        r = run_isolated(variant, argv)
+        if "error" in r:
+            print(f"{variant:<18}  failed: {r['error']}")
+            continue
+        rates = "".join(f"{r['faces_per_s'][str(size)]:>12.1f}" for size in args.sizes)
+        print(f"{variant:<18}{r['load_ms']:>9.0f}{r['peak_rss_mb']:>9.1f}{'yes' if r['tensorflow'] else 'no':>5}{rates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""End-to-end benchmark on recorded input: FPS, per-stage latency, peak RSS and accuracy, no webcam needed.
+
+The assets/ images (each held for --hold frames) and any clips are replayed through
+fixtures.ReplayCapture, paced at --fps like a live camera (--fps 0 replays as fast as possible).
+Each variant runs in its own interpreter for --seconds and is scored against the labels:
+
+    v1       the per-frame work of ed.v1.py: Haar detection, DeepFace.analyze on the whole
+             frame, resize + cvtColor + Image.fromarray, all in one loop
+    current  ed.py's pipeline: capture and inference threads, the tracking analyzer with
+             ed.py's default settings (detection on a 0.5x copy, the adaptive quality
+             controller; see --detect-scale and --adaptive-quality), and a 10 ms render loop
+             through DisplayTransform
+
+Tk itself is not run, so the Tk render stage is not included. Results are written as JSON so
+runs from different commits can be compared with --compare.
+
+Usage (from the repository root):
+    python -m benchmarks.end_to_end --output results.json
+    python -m benchmarks.end_to_end --variants current --video clip.mp4:happy --seconds 60
+    python -m benchmarks.end_to_end --compare old.json results.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.fixtures import ReplayCapture, build_sequence, load_assets, load_clip, peak_rss_mb
+
+VARIANTS = ["v1", "current"]
+
+
+class Scorer:
+    """Accuracy and confusion counts of predicted vs. labeled expressions (unlabeled frames are ignored)."""
+
+    def __init__(self):
+        self.total = 0
+        self.correct = 0
+        self.confusion = {}  # label -> {prediction: count}
+
+    def add(self, label, prediction):
+        if label is None:
+            return
+        self.total += 1
+        self.correct += prediction == label
+        row = self.confusion.setdefault(label, {})
+        row[prediction] = row.get(prediction, 0) + 1
+
+    def result(self):
+        return {
+            "accuracy": self.correct / self.total if self.total else None,
+            "scored": self.total,
+            "per_label": {label: row.get(label, 0) / sum(row.values()) for label, row in sorted(self.confusion.items())},
+            "confusion": self.confusion,
+        }
+
+
+def run_v1(cap, seconds, metrics, scorer):
+    """ed.v1.py's update_frame() without Tk. Returns (frames shown, frames analyzed)."""
+    import cv2
+    from PIL import Image
+
+    from display import fit_size
+    from emotion_detection import load_deepface
+
+    DeepFace = load_deepface()
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    DeepFace.analyze(cap.sequence[0][1], actions=['emotion'], enforce_detection=False)  # Load the model
+
+    frames = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        with metrics.stage("capture"):
+            ret, frame = cap.read()
+        captured_at = time.perf_counter()
+        frames += 1
+        with metrics.stage("detection"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            face_cascade.detectMultiScale(gray, 1.1, 4)
+        with metrics.stage("inference"):
+            analysis = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False)
+        metrics.observe("result_age", time.perf_counter() - captured_at)
+        scorer.add(cap.label(frames), analysis[0]['dominant_emotion'])
+        with metrics.stage("resize"):
+            width, height = fit_size(frame.shape[1], frame.shape[0], 1280, 720, 16 / 9)
+            resized = cv2.resize(frame, (width, height))
+        with metrics.stage("convert"):
+            Image.fromarray(cv2.cvtColor(resized, cv2.COLOR_BGR2RGB))
+        metrics.observe("frame_age", time.perf_counter() - captured_at)
+    return frames, frames
+
+
+def run_current(cap, seconds, metrics, scorer, args):
+    """ed.py's pipeline and render loop without Tk. Returns (frames shown, frames analyzed)."""
+    import emotion_detection
+    from display import DisplayTransform
+    from pipeline import AnalysisPipeline
+
+    emotion_detection.warm_up(args.detector_backend)
+    analyzer = emotion_detection.make_analyzer(args.detect_interval, 0.5, args.detector_backend,
+                                               smoothing=args.smoothing, change_threshold=args.change_threshold,
+                                               metrics=metrics, detect_scale=args.detect_scale)
+    quality = None
+    if args.adaptive_quality:
+        from quality import QualityController
+        quality = QualityController(args.target_fps, args.max_staleness, args.detect_interval, log=None,
+                                    detect_scale=args.detect_scale)
+    transform = DisplayTransform(16 / 9)
+    pipeline = AnalysisPipeline(cap, analyzer, metrics=metrics, quality=quality)
+    pipeline.start()
+
+    frames = 0
+    last_seq = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        result = pipeline.latest_result()
+        if result is not None and result[0] != last_seq:
+            last_seq, frame_id, analysis, error = result
+            primary = emotion_detection.primary_face(analysis) if error is None else None
+            scorer.add(cap.label(frame_id), primary['dominant_emotion'] if primary else None)
+        item = pipeline.latest_frame()
+        if item is not None:
+            _, frame, captured_at = item
+            with metrics.stage("resize"):
+                buffer, _, _ = transform.apply(frame, 1280, 720)
+            with metrics.stage("convert"):
+                transform.to_image(buffer)
+            metrics.observe("frame_age", time.perf_counter() - captured_at)
+            frames += 1
+        time.sleep(0.01)  # The Tk loop re-arms every 10 ms
+    pipeline.stop()
+    return frames, pipeline.inference_count
+
+
+def measure(variant, args):
+    """Run one variant in this process and return its result dict."""
+    from telemetry import Metrics
+
+    stills = load_assets()
+    clips = [load_clip(spec, args.max_video_frames) for spec in args.video or ()]
+    cap = ReplayCapture(build_sequence(stills, clips, args.hold), fps=args.fps or None)
+    metrics = Metrics()
+    scorer = Scorer()
+    baseline_mb = peak_rss_mb()
+
+    start = time.perf_counter()
+    if variant == "v1":
+        shown, analyzed = run_v1(cap, args.seconds, metrics, scorer)
+    else:
+        shown, analyzed = run_current(cap, args.seconds, metrics, scorer, args)
+    elapsed = time.perf_counter() - start
+
+    return dict(
+        variant=variant,
+        seconds=elapsed,
+        display_fps=shown / elapsed,
+        inference_fps=analyzed / elapsed,
+        camera_frames_skipped=cap.skipped,
+        peak_rss_mb=peak_rss_mb(),
+        model_rss_mb=peak_rss_mb() - baseline_mb,
+        stages=metrics.snapshot()["stages"],
+        **scorer.result(),
+    )
+
+
+def run_isolated(variant, argv):
+    """Measure one variant in a child interpreter; returns its result dict or an error dict."""
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.end_to_end", "--child", variant] + argv,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"variant": variant, "error": lines[-1] if lines else f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def print_results(results):
+    print(f"{'variant':<10}{'disp fps':>9}{'inf fps':>9}{'e2e p50':>9}{'e2e p95':>9}{'peak MB':>9}{'accuracy':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['variant']:<10}  failed: {r['error']}")
+            continue
+        age = r["stages"].get("result_age", {})
+        accuracy = f"{r['accuracy'] * 100:.1f}%" if r["accuracy"] is not None else "-"
+        print(f"{r['variant']:<10}{r['display_fps']:>9.1f}{r['inference_fps']:>9.1f}{age.get('p50_ms', 0):>9.1f}"
+              f"{age.get('p95_ms', 0):>9.1f}{r['peak_rss_mb']:>9.1f}{accuracy:>10}")
+        for name, s in sorted(r["stages"].items()):
+            print(f"    {name:<18}{s['count']:>7}  p50 {s['p50_ms']:>8.2f}  p95 {s['p95_ms']:>8.2f}  p99 {s['p99_ms']:>8.2f} ms")
+
+
+def compare(old_path, new_path):
+    """Print the headline numbers of two result files side by side, per variant."""
+    with open(old_path) as f:
+        old = {r["variant"]: r for r in json.load(f)["results"] if "error" not in r}
+    with open(new_path) as f:
+        new = {r["variant"]: r for r in json.load(f)["results"] if "error" not in r}
+    keys = [("display_fps", lambda r: r["display_fps"]),
+            ("inference_fps", lambda r: r["inference_fps"]),
+            ("result_age_p95_ms", lambda r: r["stages"].get("result_age", {}).get("p95_ms")),
+            ("peak_rss_mb", lambda r: r["peak_rss_mb"]),
+            ("accuracy", lambda r: r["accuracy"])]
+    print(f"{'variant':<10}{'metric':<20}{'old':>10}{'new':>10}{'change':>9}")
+    for variant in sorted(set(old) & set(new)):
+        for name, get in keys:
+            a, b = get(old[variant]), get(new[variant])
+            if a is None or b is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "-"
+            print(f"{variant:<10}{name:<20}{a:>10.2f}{b:>10.2f}{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--seconds", type=float, default=20.0, help="Duration of each run")
+    parser.add_argument("--fps", type=float, default=30.0, help="Replay rate of the fake camera (0: unpaced)")
+    parser.add_argument("--hold", type=int, default=30, help="Frames each assets/ image is held for")
+    parser.add_argument("--video", nargs="+", help="Clips to replay after the images, as PATH or PATH:LABEL")
+    parser.add_argument("--max-video-frames", type=int, default=300)
+    parser.add_argument("--detector-backend", default="opencv")
+    parser.add_argument("--detect-interval", type=int, default=10)
+    parser.add_argument("--smoothing", default="ema", choices=["none", "ema", "median"])
+    parser.add_argument("--change-threshold", type=float, default=3.0)
+    # The rest of ed.py's defaults for the "current" variant
+    parser.add_argument("--detect-scale", type=float, default=0.5)
+    parser.add_argument("--adaptive-quality", action=argparse.BooleanOptionalAction, default=True,
+                        help="Attach a quality.QualityController, as ed.py's ADAPTIVE_QUALITY does")
+    parser.add_argument("--target-fps", type=float, default=24.0)
+    parser.add_argument("--max-staleness", type=float, default=0.5)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.child:
+        print(json.dumps(measure(args.child, args)))
+        return
+
+    # Children get the same settings, minus the options that only concern this process
+    argv = list(sys.argv[1:])
+    for option in ("--variants", "--output"):
+        if option in argv:
+            i = argv.index(option)
+            end = i + 1
+            while end < len(argv) and not argv[end].startswith("--"):
+                end += 1
+            del argv[i:end]
+
+    results = [run_isolated(variant, argv) for variant in args.variants]
+    print_results(results)
+    if args.output:
+        report = {
+            "meta": {"revision": git_revision(), "python": platform.python_version(),
+                     "platform": platform.platform(), "time": time.time(), "args": vars(args)},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
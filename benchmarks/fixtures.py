@@ -0,0 +1,109 @@
+"""Recorded inputs for the benchmarks: labeled frames from assets/ and clips, and a fake camera that replays them.
+
+The images in assets/ are named after the expression they show (happy.jpeg, ...), which is the
+label used for accuracy. A clip is given as PATH or PATH:LABEL; an unlabeled clip only counts
+towards speed.
+"""
+import glob
+import os
+import resource
+import sys
+import threading
+import time
+
+import cv2
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "*.jpeg")
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_assets(pattern=ASSETS):
+    """Return [(label, frame)] for the labeled still images, label taken from the file name."""
+    frames = []
+    for path in sorted(glob.glob(pattern)):
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames.append((os.path.splitext(os.path.basename(path))[0], frame))
+    if not frames:
+        raise FileNotFoundError(f"No labeled images for the benchmarks: nothing readable matches {pattern}")
+    return frames
+
+
+def load_clip(spec, max_frames=300):
+    """Return [(label, frame)] for the first max_frames frames of a clip given as PATH or PATH:LABEL."""
+    path, label = spec, None
+    if ":" in spec and not os.path.exists(spec):
+        path, label = spec.rsplit(":", 1)
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append((label, frame))
+    cap.release()
+    return frames
+
+
+def build_sequence(stills, clips=(), hold_frames=30):
+    """One replay sequence: each still held for hold_frames frames (so tracking sees a steady face), then the clips.
+
+    Held stills repeat the same array, they are not copied.
+    """
+    sequence = []
+    for label, frame in stills:
+        sequence += [(label, frame)] * hold_frames
+    for clip in clips:
+        sequence += clip
+    return sequence
+
+
+class ReplayCapture:
+    """Stands in for cv2.VideoCapture: read() returns (True, frame) from a recorded sequence, looping.
+
+    With fps set, frames are paced like a live camera: read() waits for the next frame time, and
+    frames whose time has passed while the caller was busy are skipped, as a webcam drops them.
+    With fps=None every frame is returned in order as fast as it is asked for.
+    indices records which sequence entry each read() returned, so results can be matched to labels.
+    """
+
+    def __init__(self, sequence, fps=None):
+        self.sequence = sequence
+        self.fps = fps
+        self.indices = []
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._next = 0
+        self._start = None
+
+    def read(self):
+        with self._lock:
+            if self.fps is None:
+                index = self._next
+            else:
+                if self._start is None:
+                    self._start = time.perf_counter()
+                due = self._start + self._next / self.fps
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                index = max(self._next, int((time.perf_counter() - self._start) * self.fps))
+                self.skipped += index - self._next
+            self._next = index + 1
+            self.indices.append(index)
+        return True, self.sequence[index % len(self.sequence)][1]
+
+    def label(self, read_number):
+        """Label of the frame returned by the read_number-th read() (1-based, like the pipeline's frame_id)."""
+        return self.sequence[self.indices[read_number - 1] % len(self.sequence)][0]
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
@@ -0,0 +1,112 @@
+"""Throughput of the multi-process inference pool against the number of worker processes.
+
+Several simulated cameras replay the assets/ images (plus an optional clip) as fast as the pool
+accepts frames. Each run reports total and per-camera frames/s and the speedup over one worker;
+the "in-process" row is the same work done by one analyzer per camera in this process, which
+shows the cost of the shared-memory hand-off.
+
+Usage (from the repository root):
+    python -m benchmarks.inference_pool
+    python -m benchmarks.inference_pool --cameras 8 --workers 1 2 4 8 --seconds 30 --json
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.fixtures import build_sequence, load_assets, load_clip
+
+
+def camera_sequences(cameras, video, hold):
+    """One frame sequence per camera, each starting at a different offset so they don't run in lockstep."""
+    clips = [load_clip(video)] if video else []
+    sequence = [frame for _, frame in build_sequence(load_assets(), clips, hold)]
+    step = max(1, len(sequence) // cameras)
+    return [sequence[i * step:] + sequence[:i * step] for i in range(cameras)]
+
+
+def run_in_process(sequences, seconds, args):
+    import emotion_detection
+
+    emotion_detection.warm_up(args.detector_backend)
+    analyzers = [emotion_detection.make_analyzer(args.detect_interval, 0.5, args.detector_backend,
+                                                 smoothing=args.smoothing) for _ in sequences]
+    done = [0] * len(sequences)
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for camera, (analyze, frames) in enumerate(zip(analyzers, sequences)):
+            analyze(frames[done[camera] % len(frames)])
+            done[camera] += 1
+    return done, time.perf_counter() - start
+
+
+def run_pool(sequences, workers, seconds, args):
+    from inference_pool import InferencePool
+
+    pool = InferencePool(workers, args.slots, detector_backend=args.detector_backend,
+                         detect_interval=args.detect_interval, smoothing=args.smoothing)
+    sent = [0] * len(sequences)
+    first = 0
+    with pool:
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            submitted = False
+            first = (first + 1) % len(sequences)  # Rotate so cameras sharing a worker take turns
+            for camera in range(first, first + len(sequences)):
+                camera %= len(sequences)
+                if pool.has_free_slot(camera):
+                    frames = sequences[camera]
+                    pool.submit(camera, frames[sent[camera] % len(frames)])
+                    sent[camera] += 1
+                    submitted = True
+            if not submitted:
+                time.sleep(0.0005)
+        elapsed = time.perf_counter() - start
+        stats = pool.stats()
+    return [stats["cameras"][camera]["completed"] for camera in range(len(sequences))], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cores = os.cpu_count() or 1
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, cores} & set(range(1, cores + 1))))
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--slots", type=int, default=2, help="Shared-memory slots per worker")
+    parser.add_argument("--hold", type=int, default=30, help="Frames each assets/ image is held for")
+    parser.add_argument("--video", help="Clip to add to the assets/ images")
+    parser.add_argument("--detector-backend", default="opencv")
+    parser.add_argument("--detect-interval", type=int, default=10)
+    parser.add_argument("--smoothing", default="ema", choices=["none", "ema", "median"])
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    sequences = camera_sequences(args.cameras, args.video, args.hold)
+    runs = [("in-process", None)] + [(f"{n} worker" + ("s" if n > 1 else ""), n) for n in args.workers]
+    results = []
+    for label, workers in runs:
+        if workers is None:
+            done, elapsed = run_in_process(sequences, args.seconds, args)
+        else:
+            done, elapsed = run_pool(sequences, workers, args.seconds, args)
+        results.append({"run": label, "workers": workers, "cameras": args.cameras,
+                        "frames_per_s": sum(done) / elapsed,
+                        "per_camera_fps": [n / elapsed for n in done]})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    one = next((r["frames_per_s"] for r in results if r["workers"] == 1), None)
+    print(f"{args.cameras} cameras, {os.cpu_count()} cores")
+    print(f"{'run':<12}{'frames/s':>10}{'min cam fps':>13}{'speedup':>9}{'efficiency':>12}")
+    for r in results:
+        speedup = efficiency = "-"
+        if one and r["workers"]:
+            ratio = r["frames_per_s"] / one
+            speedup, efficiency = f"{ratio:.2f}x", f"{ratio / r['workers'] * 100:.0f}%"
+        print(f"{r['run']:<12}{r['frames_per_s']:>10.1f}{min(r['per_camera_fps']):>13.1f}{speedup:>9}{efficiency:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Import-time breakdown of what ed.py loads before and after its window appears.
+
+Runs `python -X importtime` in a fresh interpreter for each group of modules and prints the
+slowest top-level imports by cumulative time. ed.py itself prints "Window shown ... ms after
+start" and "Model ready ... ms after start" when it runs.
+
+Usage (from the repository root):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 20
+"""
+import argparse
+import subprocess
+import sys
+
+# What ed.py imports before the window is shown, and what load_stack()/warm-up import afterwards
+GROUPS = {
+    "before first window": ["tkinter", "random", "json", "threading", "sqlite3", "leaderboard", "telemetry"],
+    "background: analysis modules": ["cv2", "PIL.ImageTk", "emotion_detection", "pipeline"],
+    "background: model warm-up": ["deepface.DeepFace"],
+}
+
+
+def import_times(modules):
+    """Import modules in a fresh interpreter; return [(module, self_us, cumulative_us, depth)]."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def report(title, modules, top):
+    try:
+        rows = import_times(modules)
+    except RuntimeError as e:
+        print(f"\n{title}: could not import ({e})")
+        return
+    roots = [r for r in rows if r[3] == 0]
+    total_ms = sum(r[2] for r in roots) / 1000.0
+    print(f"\n{title}: {total_ms:.0f} ms")
+    print(f"  {'module':<40}{'cumulative':>12}{'self':>10}")
+    for name, self_us, cumulative_us, _ in sorted(roots, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"  {name:<40}{cumulative_us / 1000.0:>10.1f}ms{self_us / 1000.0:>8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=10, help="Imports to list per group")
+    args = parser.parse_args()
+    for title, modules in GROUPS.items():
+        report(title, modules, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Capture sources (webcam, video file, RTSP/HTTP stream, image folder, synthetic) and a threaded latest-frame grabber.
+
+Every source has the part of the cv2.VideoCapture interface the app uses: read() -> (ok, frame),
+isOpened() and release(). open_source() picks the right one for a source spec.
+"""
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+STREAM_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://")
+
+
+class RateMeter:
+    """Events per second over a sliding window of `window` seconds."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.times = deque()
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self.times.append(now)
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    def rate(self):
+        if len(self.times) < 2:
+            return 0.0
+        span = time.perf_counter() - self.times[0]
+        return (len(self.times) - 1) / span if span > 0 else 0.0
+
+
+class Pacer:
+    """Sleeps so that successive wait() calls return at most `fps` times a second, without catching up after a stall."""
+
+    def __init__(self, fps):
+        self.period = 1.0 / fps
+        self.due = None
+
+    def wait(self):
+        now = time.perf_counter()
+        if self.due is not None and self.due > now:
+            time.sleep(self.due - now)
+            now = self.due
+        self.due = now + self.period
+
+
+class StreamSource:
+    """A cv2.VideoCapture (webcam, network stream or video file) with the resolution/FPS request applied.
+
+    The driver is asked to buffer a single frame (CAP_PROP_BUFFERSIZE, honoured by V4L2, DirectShow
+    and most streams), so a read never returns a frame that has been waiting in a queue. Video
+    files are paced at their own frame rate when `paced` is set and can loop.
+    """
+
+    def __init__(self, target, width=None, height=None, fps=None, paced=False, loop=False):
+        self.target = target
+        self.cap = cv2.VideoCapture(target)
+        if width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.is_file = not isinstance(target, int) and not str(target).startswith(STREAM_PREFIXES)
+        self.loop = loop
+        self.ended = False
+        self.pacer = Pacer(fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0) if paced and self.is_file else None
+
+    def read(self):
+        if self.pacer is not None:
+            self.pacer.wait()
+        ret, frame = self.cap.read()
+        if not ret and self.is_file:
+            if self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.cap.read()
+            else:
+                self.ended = True
+        return ret, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+    def size(self):
+        """(width, height) the device actually delivers, which may differ from the request."""
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+
+class ImageFolderSource:
+    """Images from a directory, glob or file list played as frames at `fps`, optionally resized and looped."""
+
+    def __init__(self, paths, fps=30.0, width=None, height=None, loop=True, paced=True):
+        self.frames = []
+        for path in paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            if width and height:
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            self.frames.append(frame)
+        self.loop = loop
+        self.ended = False
+        self.index = 0
+        self.pacer = Pacer(fps or 30.0) if paced else None
+
+    def read(self):
+        if self.index >= len(self.frames):
+            if not self.loop or not self.frames:
+                self.ended = True
+                return False, None
+            self.index = 0
+        if self.pacer is not None:
+            self.pacer.wait()
+        frame = self.frames[self.index]
+        self.index += 1
+        return True, frame
+
+    def isOpened(self):
+        return bool(self.frames)
+
+    def release(self):
+        self.frames = []
+
+
+class SyntheticSource:
+    """Generated frames (a square moving over a gradient, with a frame counter) for running without any camera."""
+
+    def __init__(self, width=640, height=480, fps=30.0, paced=True):
+        self.width = width or 640
+        self.height = height or 480
+        ramp = np.linspace(40, 200, self.width, dtype=np.uint8)
+        self.background = np.repeat(np.tile(ramp, (self.height, 1))[:, :, None], 3, axis=2)
+        self.count = 0
+        self.ended = False
+        self.pacer = Pacer(fps or 30.0) if paced else None
+
+    def read(self):
+        if self.pacer is not None:
+            self.pacer.wait()
+        frame = self.background.copy()
+        size = self.height // 4
+        x = int((self.width - size) * (0.5 + 0.5 * np.sin(self.count / 30.0)))
+        y = (self.height - size) // 2
+        cv2.rectangle(frame, (x, y), (x + size, y + size), (255, 255, 255), -1)
+        cv2.putText(frame, str(self.count), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+        self.count += 1
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def open_source(spec, width=None, height=None, fps=None, paced=True, loop=False):
+    """Open a capture source from a spec.
+
+    spec is a camera index (0 or "0"), an rtsp://, rtmp:// or http(s):// URL, "synthetic" or
+    "synthetic:WxH", a recording directory (see recording.py), an image directory or glob, an
+    image file, or a video file. width, height and fps are requested from cameras and streams and
+    used directly by the other sources. With paced=False, files, recordings and generated frames
+    are returned as fast as they are read.
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        source = StreamSource(int(spec), width, height, fps)
+    elif str(spec).startswith("synthetic"):
+        if ":" in spec:
+            width, height = (int(v) for v in spec.split(":", 1)[1].split("x"))
+        source = SyntheticSource(width, height, fps, paced)
+    elif str(spec).startswith(STREAM_PREFIXES):
+        source = StreamSource(spec, width, height, fps)
+    elif os.path.isfile(os.path.join(str(spec), "session.json")):
+        from recording import SessionSource  # recording imports emotion_detection, which imports this module
+
+        source = SessionSource(spec, speed=1.0 if paced else None, loop=loop)
+    elif os.path.isdir(spec):
+        paths = sorted(p for p in glob.glob(os.path.join(spec, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+        source = ImageFolderSource(paths, fps, width, height, loop, paced)
+    elif glob.has_magic(spec):
+        source = ImageFolderSource(sorted(glob.glob(spec)), fps, width, height, loop, paced)
+    elif spec.lower().endswith(IMAGE_EXTENSIONS):
+        source = ImageFolderSource([spec], fps, width, height, loop, paced)
+    else:
+        source = StreamSource(spec, width, height, fps, paced, loop)
+    if not source.isOpened():
+        raise FileNotFoundError(f"Cannot open video source: {spec}")
+    return source
+
+
+class ThreadedCapture:
+    """Reads a source on a background thread and keeps only the newest frame.
+
+    Frames are numbered as they arrive. Each consumer asks for the newest frame after the last
+    one it saw (latest(after=...)), so any number of consumers can read at their own pace, none of
+    them ever works through a backlog, and the frames a consumer skipped are counted as dropped.
+    With a telemetry.Metrics object, every source read is timed as the "capture" stage.
+    """
+
+    def __init__(self, source, metrics=None):
+        self.source = source
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._item = None  # (seq, frame, captured_at)
+        self._stop = threading.Event()
+        self._thread = None
+        self.seq = 0
+        self.read_failures = 0
+        self.ended = False
+        self.camera_rate = RateMeter()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._grab_loop, name="capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _grab_loop(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            ret, frame = self.source.read()
+            if self.metrics is not None:
+                self.metrics.observe("capture", time.perf_counter() - start)
+            if not ret:
+                self.read_failures += 1
+                if getattr(self.source, "ended", False):
+                    break
+                time.sleep(0.01)  # Avoid spinning if the camera goes away
+                continue
+            now = time.perf_counter()
+            self.camera_rate.tick(now)
+            with self._cond:
+                self.seq += 1
+                self._item = (self.seq, frame, now)
+                self._cond.notify_all()
+        with self._cond:
+            self.ended = True
+            self._cond.notify_all()
+
+    def latest(self, after=0, timeout=None):
+        """Return (seq, frame, captured_at) for the newest frame numbered above `after`.
+
+        Waits up to timeout seconds for one (None waits until there is one, 0 doesn't wait).
+        Returns None on timeout, or once the source has ended and nothing newer is left.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: (self._item is not None and self._item[0] > after)
+                                       or self.ended or self._stop.is_set(), timeout):
+                return None
+            if self._item is None or self._item[0] <= after:
+                return None
+            return self._item
+
+    def read(self):
+        """cv2.VideoCapture-style read of the newest frame (it may be one that was returned before)."""
+        item = self.latest(timeout=None)
+        return (True, item[1]) if item is not None else (False, None)
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def release(self):
+        self.stop()
+        self.source.release()
+
+    def stats(self):
+        return {"frames": self.seq, "read_failures": self.read_failures, "camera_fps": self.camera_rate.rate()}
+
+
+class FrameCursor:
+    """One consumer's position in a ThreadedCapture, with its consumed-FPS and drop counts."""
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.last_seq = 0
+        self.taken = 0
+        self.dropped = 0  # Frames that were newer than the last one taken but were never seen
+        self.rate = RateMeter()
+
+    def next(self, timeout=None):
+        """Take the newest unseen frame as (seq, frame, captured_at), or None (see ThreadedCapture.latest)."""
+        item = self.capture.latest(self.last_seq, timeout)
+        if item is not None:
+            self.dropped += item[0] - self.last_seq - 1
+            self.last_seq = item[0]
+            self.taken += 1
+            self.rate.tick()
+        return item
+
+    def stats(self):
+        return {
+            "depth": 1 if self.capture.seq > self.last_seq else 0,
+            "taken": self.taken,
+            "dropped": self.dropped,
+            "fps": self.rate.rate(),
+        }
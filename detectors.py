@@ -0,0 +1,140 @@
+"""Selectable face detector backends.
+
+Every detector is a callable taking a BGR frame and returning a list of
+{'x', 'y', 'w', 'h', 'confidence'} region dicts. Backends:
+
+    haar            OpenCV Haar cascade run directly (what ed.v1.py used), no DeepFace needed
+    yunet           OpenCV DNN YuNet (cv2.FaceDetectorYN), weights file from the model cache
+    skip            No detection: the whole frame is the face (for pre-cropped input)
+    <name>          Any DeepFace detector_backend: opencv, ssd, mtcnn, retinaface, mediapipe, ...
+    deepface:<name> Force the DeepFace implementation, e.g. deepface:yunet
+"""
+import os
+import threading
+
+import cv2
+
+YUNET_WEIGHTS = "face_detection_yunet_2023mar.onnx"
+
+NATIVE_BACKENDS = ("haar", "yunet", "skip")
+DEEPFACE_BACKENDS = ("opencv", "ssd", "dlib", "mtcnn", "fastmtcnn", "retinaface", "mediapipe",
+                     "yolov8", "yunet", "centerface")
+
+
+class HaarDetector:
+    """OpenCV's haarcascade_frontalface_default.xml on the grayscale frame."""
+
+    name = "haar"
+
+    def __init__(self, scale_factor=1.1, min_neighbors=4, min_size=(30, 30)):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.cascade = None
+
+    def load(self):
+        if self.cascade is None:
+            self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def __call__(self, frame):
+        self.load()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        faces = self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors, minSize=self.min_size)
+        return [{'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h), 'confidence': 1.0} for (x, y, w, h) in faces]
+
+
+class YuNetDetector:
+    """OpenCV's DNN face detector YuNet (cv2.FaceDetectorYN)."""
+
+    name = "yunet"
+
+    def __init__(self, model_path, score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.net = None
+        self.input_size = None
+
+    def load(self):
+        if self.net is None:
+            if not os.path.isfile(self.model_path):
+                raise FileNotFoundError(f"YuNet weights not found: {self.model_path}")
+            self.net = cv2.FaceDetectorYN.create(self.model_path, "", (320, 320), self.score_threshold,
+                                                 self.nms_threshold, self.top_k)
+
+    def __call__(self, frame):
+        self.load()
+        size = (frame.shape[1], frame.shape[0])
+        if size != self.input_size:
+            self.net.setInputSize(size)
+            self.input_size = size
+        _, faces = self.net.detect(frame)
+        if faces is None:
+            return []
+        return [{'x': int(f[0]), 'y': int(f[1]), 'w': int(f[2]), 'h': int(f[3]), 'confidence': float(f[-1])}
+                for f in faces]
+
+
+class SkipDetector:
+    """Treats the whole input as one face, for frames that are already face crops."""
+
+    name = "skip"
+
+    def load(self):
+        pass
+
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        return [{'x': 0, 'y': 0, 'w': width, 'h': height, 'confidence': 1.0}]
+
+
+class DeepFaceDetector:
+    """One of DeepFace's detector backends, through DeepFace.extract_faces (without alignment)."""
+
+    def __init__(self, backend):
+        self.name = backend
+        self.backend = backend
+        self.deepface = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.deepface is None:
+                from deepface import DeepFace
+                try:
+                    DeepFace.build_model(self.backend, task="face_detector")  # DeepFace keeps it cached
+                except TypeError:
+                    # deepface < 0.0.93 has no task argument
+                    DeepFace.build_model(self.backend)
+                self.deepface = DeepFace
+
+    def __call__(self, frame):
+        self.load()
+        height, width = frame.shape[:2]
+        faces = self.deepface.extract_faces(frame, detector_backend=self.backend, enforce_detection=False, align=False)
+        regions = []
+        for face in faces:
+            area = face['facial_area']
+            # With enforce_detection=False DeepFace reports "no face" as the whole frame with confidence 0
+            if face.get('confidence', 0) <= 0 and area['w'] >= width and area['h'] >= height:
+                continue
+            regions.append({'x': area['x'], 'y': area['y'], 'w': area['w'], 'h': area['h'],
+                            'confidence': float(face.get('confidence', 0.0))})
+        return regions
+
+
+def make_detector(name, model_dir=None):
+    """Create the detector for a backend name (see the module docstring). model_dir holds YuNet's weights."""
+    if name.startswith("deepface:"):
+        return DeepFaceDetector(name.split(":", 1)[1])
+    if name == "haar":
+        return HaarDetector()
+    if name == "yunet":
+        return YuNetDetector(os.path.join(model_dir or ".", YUNET_WEIGHTS))
+    if name == "skip":
+        return SkipDetector()
+    if name in DEEPFACE_BACKENDS:
+        return DeepFaceDetector(name)
+    raise ValueError(f"Unknown detector backend: {name}")
+
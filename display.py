@@ -0,0 +1,59 @@
+"""Display transform: fit a camera frame to the canvas with cached geometry and reused buffers."""
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def fit_size(frame_width, frame_height, max_width, max_height, aspect_ratio):
+    """Size that fits the frame to max_width/max_height keeping its aspect ratio (the rule resize_frame() uses)."""
+    frame_aspect_ratio = frame_width / frame_height
+    if frame_aspect_ratio > aspect_ratio:
+        # Width is the limiting factor
+        return max_width, int(max_width / frame_aspect_ratio)
+    # Height is the limiting factor
+    return int(max_height * frame_aspect_ratio), max_height
+
+
+class DisplayTransform:
+    """Resizes frames for display into one preallocated buffer.
+
+    The target size and centering offsets are computed once per (frame size, canvas size) pair
+    and cached. The resized frame stays BGR: the BGR->RGB swap happens inside the copy Pillow
+    makes anyway when it builds the image (raw mode "BGR"), so there is no separate cvtColor pass
+    and no intermediate RGB array.
+    """
+
+    def __init__(self, aspect_ratio=16 / 9, default_size=(800, 600)):
+        self.aspect_ratio = aspect_ratio
+        self.default_size = default_size
+        self._key = None
+        self._geometry = None
+        self.buffer = None
+
+    def geometry(self, frame_width, frame_height, canvas_width, canvas_height):
+        """Return (width, height, x_offset, y_offset) of the displayed frame, cached per size pair."""
+        key = (frame_width, frame_height, canvas_width, canvas_height)
+        if key != self._key:
+            if canvas_width > 1 and canvas_height > 1:
+                width, height = fit_size(frame_width, frame_height, canvas_width, canvas_height, self.aspect_ratio)
+            else:
+                # Use the default size if the canvas size is not valid yet
+                width, height = self.default_size
+            self._geometry = (width, height, (canvas_width - width) // 2, (canvas_height - height) // 2)
+            self._key = key
+        return self._geometry
+
+    def apply(self, frame, canvas_width, canvas_height):
+        """Resize frame into the reused buffer. Returns (BGR buffer, x_offset, y_offset)."""
+        frame_height, frame_width = frame.shape[:2]
+        width, height, x_offset, y_offset = self.geometry(frame_width, frame_height, canvas_width, canvas_height)
+        if self.buffer is None or self.buffer.shape[:2] != (height, width):
+            self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        cv2.resize(frame, (width, height), dst=self.buffer)
+        return self.buffer, x_offset, y_offset
+
+    @staticmethod
+    def to_image(buffer):
+        """RGB Pillow image from a BGR buffer, swapping the channels while Pillow copies the pixels."""
+        height, width = buffer.shape[:2]
+        return Image.frombuffer("RGB", (width, height), buffer, "raw", "BGR", 0, 1)
@@ -1,11 +1,19 @@
+import time
+START_TIME = time.perf_counter()  # For the time-to-first-window report
+
 import tkinter as tk
 from tkinter import Canvas, messagebox
-import cv2
-import numpy as np
-from PIL import Image, ImageTk
-from deepface import DeepFace
 import random
-import json
+import threading
+from leaderboard import Leaderboard, LeaderboardStore
+from telemetry import Metrics, MetricsExporter, StageTimer
+
+# OpenCV, Pillow and the analysis modules (which pull in DeepFace and TensorFlow) are imported on a
+# background thread by load_stack(), so the window and the leaderboard show up straight away.
+cv2 = None
+Image = ImageTk = None
+emotion_detection = None
+analytics = None
 
 # Create a Tkinter window
 root = tk.Tk()
@@ -76,77 +84,165 @@ lboard_list = tk.Listbox(root,
                     height=10, width=30)
 lboard_list.place(x=500, y=90)
 
+# Fixed rank numbers beside the list, so a new score is one insert/delete in lboard_list
+lboard_ranks = tk.Listbox(root,
+                    font=('Arial', 12),
+                    height=10, width=3,
+                    takefocus=0, activestyle='none')
+lboard_ranks.insert(tk.END, *[f"{i+1}." for i in range(10)])
+lboard_ranks.place(x=470, y=90)
+
 # Expression mapping and user info
 user_score = 0
 current_expression = None
 game_started = False
-lboard = []
-
-# Open the webcam
-cap = cv2.VideoCapture(0)
+lboard = None  # Leaderboard (top 10 in memory) over a LeaderboardStore, opened at startup
+
+# Main-loop instrumentation and the cached layout size
+loop_timer = StageTimer()
+last_report_time = time.perf_counter()
+inference_busy_at_reset = 0.0
+layout_size = None
+
+# Per-stage latency histograms (capture, detection/tracking, emotion inference, smoothing,
+# resize, convert, Tk render, frame and result age), shared with the pipeline threads
+metrics = Metrics()
+metrics_exporter = None
+overlay_item = None
+overlay_state = (0.0, 0, 0)  # (time, display frames, results) at the last overlay refresh
+
+# The main face's emotion scores for every result in the last ANALYTICS_WINDOW seconds (an
+# analytics.EmotionSeries, created by load_stack()), the F3 analytics window, and the thread that
+# computes its text and the text it last produced
+emotion_series = None
+analytics_window = None
+analytics_text = None
+analytics_job = None
+analytics_result = None
+
+# Webcam and analysis pipeline, created by load_stack()
+cap = None
+pipeline = None
+quality = None
+recorder = None
+load_error = None
 
 # 16:9 Aspect Ratio
 ASPECT_RATIO = 16 / 9
 
-# File to store leaderboard data
+# What to capture: a camera index, an rtsp:// or http(s):// URL, a video file, an image folder or
+# glob, or "synthetic" (generated frames, no camera needed). CAMERA_WIDTH/HEIGHT/FPS are requested
+# from the device (None keeps its default); files and folders are played at CAMERA_FPS or their own rate.
+CAMERA_SOURCE = 0
+CAMERA_WIDTH = None
+CAMERA_HEIGHT = None
+CAMERA_FPS = None
+
+# Model weights are read from MODEL_CACHE_DIR/.deepface/weights (None uses DeepFace's default, the
+# home directory). With OFFLINE_MODELS the app never downloads: fill the cache beforehand with
+# `python -m emotion_detection warmup --cache-dir <dir>`.
+MODEL_CACHE_DIR = None
+OFFLINE_MODELS = False
+
+# Emotion classifier: "deepface" (DeepFace's Keras model), or the model exported once with
+# `python -m emotion_onnx export --cache-dir <dir> [--int8]`, run by "onnxruntime" or "opencv" (DNN).
+# EMOTION_MODEL is the ONNX file (None: the float export in the model cache), EMOTION_THREADS the
+# ONNX Runtime/OpenCV thread count (None: their default). With an ONNX backend and the "haar" or
+# "yunet" detector, TensorFlow is never loaded.
+EMOTION_BACKEND = "deepface"
+EMOTION_MODEL = None
+EMOTION_THREADS = None
+
+# Face detector: "haar" (OpenCV Haar cascade), "yunet" (OpenCV DNN, needs its weights in the
+# model cache), "skip" (whole frame is the face), or any DeepFace backend ("opencv", "ssd",
+# "mtcnn", "retinaface", ...). Compare them with `python -m benchmarks.detectors`.
+DETECTOR_BACKEND = "opencv"
+
+# Detect and track faces on a copy of the camera frame downscaled by DETECT_SCALE (detection costs
+# about DETECT_SCALE^2 as much); the emotion model still gets the face cropped from the full frame.
+# Faces smaller than about 60 px / DETECT_SCALE are missed. Check with `python -m benchmarks.detect_scale`.
+DETECT_SCALE = 0.5
+
+# Run full face detection every DETECT_INTERVAL frames and track faces in between.
+# Tracking re-detects early when a face's tracking confidence drops below TRACK_MIN_CONFIDENCE.
+# Set DETECT_INTERVAL to 1 to run the whole DeepFace pipeline on every frame.
+DETECT_INTERVAL = 10
+TRACK_MIN_CONFIDENCE = 0.5
+
+# Smooth each face's emotion scores over time ("ema", "median" or "none") so the label and the
+# game score don't follow single noisy frames. With SKIP_STABLE_FACES the emotion model is not
+# re-run for faces whose smoothed scores have settled.
+SMOOTHING = "ema"
+SKIP_STABLE_FACES = False
+
+# Reuse the previous result when the frame, or a face, changed by less than this many gray levels
+# on average since it was last analyzed (None analyzes every frame). Saves most of the CPU while
+# the person in front of the camera holds still.
+CHANGE_THRESHOLD = 3.0
+
+# Adapt the analysis to the machine: when the display falls below TARGET_FPS or results get older
+# than MAX_STALENESS seconds (capture to result), detect faces on smaller frames, detect less often
+# and cap the inference rate; go back up once there is room again. Decisions are printed and the
+# current settings are shown on the F2 overlay. False always analyzes at the settings above.
+ADAPTIVE_QUALITY = True
+TARGET_FPS = 24
+MAX_STALENESS = 0.5
+
+# Send frames to a running analysis service (`python -m service`) instead of loading the models
+# in this process, e.g. "http://127.0.0.1:8765". None analyzes locally.
+ANALYSIS_SERVER = None
+
+# Record every analyzed frame and its results to this directory (None doesn't record). RECORD_STORAGE
+# is "raw", "jpeg", "roi" (face crops only) or "none" (results only); see recording.py. A recording
+# directory can be played back as CAMERA_SOURCE, or re-analyzed with `python -m recording replay`.
+RECORD_SESSION = None
+RECORD_STORAGE = "jpeg"
+
+# Print how the Tk main loop spends its time (layout vs. rendering vs. result handling, plus
+# the inference worker's busy time) every LOOP_REPORT_INTERVAL seconds
+LOOP_REPORT_INTERVAL = 30
+
+# Show an FPS/latency overlay on the video (toggle with F2 while running)
+SHOW_OVERLAY = False
+OVERLAY_INTERVAL = 0.5
+
+# F3 opens a summary of the last ANALYTICS_WINDOW seconds (emotion distribution, dwell time, peaks,
+# transitions and per-hour figures for the main face), recomputed in the background every
+# ANALYTICS_INTERVAL seconds while it is open. Older results are dropped so memory stays flat.
+ANALYTICS_INTERVAL = 2.0
+ANALYTICS_WINDOW = 2 * 3600
+
+# Export the stage histograms, p50/p95/p99 and dropped-frame counts. METRICS_FILE is rewritten every
+# METRICS_EXPORT_INTERVAL seconds (JSON if it ends in .json, Prometheus text otherwise);
+# METRICS_PORT serves /metrics and /metrics.json on 127.0.0.1. None disables either.
+METRICS_FILE = None
+METRICS_PORT = None
+METRICS_EXPORT_INTERVAL = 5.0
+
+# Leaderboard database. Scores from the old LEADERBOARD_FILE are imported into it once.
+LEADERBOARD_DB = "leaderboard.db"
 LEADERBOARD_FILE = "leaderboard.json"
 
-import json
-
-def save_leaderboard():
-    """Save the leaderboard to the JSON file."""
-    # Convert any NumPy data types to native Python types
-    for i in range(len(lboard)):
-        name, expression, score = lboard[i]
-        lboard[i] = (name, expression, float(score))  # Convert score to float
-    
-    with open(LEADERBOARD_FILE, "w") as f:
-        json.dump(lboard, f, indent=4)
-
-def load_leaderboard():
-    """Load the leaderboard from the JSON file."""
-    try:
-        with open(LEADERBOARD_FILE, "r") as f:
-            leaderboard = json.load(f)
-            # Convert any NumPy data types to native Python types when loading
-            for i in range(len(leaderboard)):
-                name, expression, score = leaderboard[i]
-                leaderboard[i] = (name, expression, float(score))  # Convert score to float
-            return leaderboard
-    except (FileNotFoundError, json.JSONDecodeError):
-        # If the file doesn't exist or is corrupted, return an empty leaderboard
-        return []
+def leaderboard_line(record):
+    return f"{record.name} - {record.expression} - {record.score:.2f}%"
 
 def show_leaderboard():
-    """Load the leaderboard from the JSON file and display it on the GUI."""
-    global lboard
-    # Load the leaderboard from the file
-    lboard = load_leaderboard()
-
+    """Display the top 10 scores on the GUI (a full refresh, only needed at startup)."""
     # Clear the current leaderboard list in the listbox
     lboard_list.delete(0, tk.END)
 
-    # Display the top 10 leaderboard entries
-    for i, (name, expression, score) in enumerate(lboard[:10]):
-        lboard_list.insert(tk.END, f"{i+1}. {name} - {expression} - {score:.2f}%")
+    # Display the top 10 leaderboard entries, kept in memory by lboard
+    for record in lboard.overall:
+        lboard_list.insert(tk.END, leaderboard_line(record))
 
-def resize_frame(frame, max_width, max_height):
-    """Resize the frame to fit the window's width and height while maintaining aspect ratio."""
-    frame_height, frame_width = frame.shape[:2]
-    frame_aspect_ratio = frame_width / frame_height
-
-    # Determine the limiting factor (width or height) based on the aspect ratio
-    if frame_aspect_ratio > ASPECT_RATIO:
-        # Width is the limiting factor
-        new_width = max_width
-        new_height = int(new_width / frame_aspect_ratio)
-    else:
-        # Height is the limiting factor
-        new_height = max_height
-        new_width = int(new_height * frame_aspect_ratio)
-    
-    # Resize the frame to fit within the max dimensions
-    return cv2.resize(frame, (new_width, new_height))
+def place_score(name, expression, score):
+    """Record a score and apply its rank change to the list as a single insert (and delete)."""
+    change = lboard.add(name, expression, score)
+    if change["rank"] is not None:
+        lboard_list.insert(change["rank"], leaderboard_line(lboard.overall.records[change["rank"]]))
+        if change["evicted"] is not None:
+            lboard_list.delete(lboard.k)
+    return change
 
 def update_details(main_expression, expression_data):
     """Update the details label with the given information including Expression percentages and main Expression."""
@@ -173,18 +269,18 @@ def update_details(main_expression, expression_data):
     # Update the second label with all Expressions
     d_label_all.config(text=expressions_text)
 
-def update_leaderboard_position():
-    """Update the leaderboard label position once the window is rendered."""
-    window_width = root.winfo_width()  # Get the width of the window after it's rendered
-    window_height = root.winfo_height()  # Get the height of the window after it's rendered
+def update_leaderboard_position(window_width, window_height):
+    """Position the leaderboard, name input and buttons for the given window size."""
     label_width = lboard_label.winfo_reqwidth()  # Get the width of the label
     list_width = lboard_list.winfo_reqwidth()  # Get the width of the listbox
+    ranks_width = lboard_ranks.winfo_reqwidth()  # Get the width of the rank numbers
 
     # Position the leaderboard label 50 pixels from the right side
     lboard_label.place(x=window_width - 20 - label_width, y=20)
 
     # Position the leaderboard list 50 pixels from the right side
     lboard_list.place(x=window_width - 20 - list_width, y=60)
+    lboard_ranks.place(x=window_width - 20 - list_width - ranks_width, y=60)
 
     # Position the start and stop buttons from the bottom and right
     st_btn_width = start_button.winfo_reqwidth()
@@ -211,63 +307,284 @@ def update_leaderboard_position():
     # Position the stop button next to the start button, maintaining right alignment
     stop_button.place(x=(window_width - 20 - name_e_width) + st_btn_width + 20, y=y_position)
 
-def update_frame():
-    """Fetches a frame from the webcam and updates the Tkinter canvas"""
-    ret, frame = cap.read()
-    if not ret:
-        return   # If frame reading fails, return early
-    
+def on_configure(event):
+    """Re-run the layout only when the window size actually changed (<Configure> on the root window)."""
+    global layout_size
+    if event.widget is not root or (event.width, event.height) == layout_size:
+        return  # A child widget changed, or the window only moved
+    layout_size = (event.width, event.height)
+    with loop_timer.stage("layout"):
+        update_leaderboard_position(event.width, event.height)
+
+def report_loop_time(final=False):
+    """Print how the Tk main loop's time was split between layout, results and rendering."""
+    global last_report_time, inference_busy_at_reset
+    now = time.perf_counter()
+    if not final and now - last_report_time < LOOP_REPORT_INTERVAL:
+        return
+    busy = pipeline.inference_seconds if pipeline is not None else 0.0
+    extra = {"inference (worker thread)": busy - inference_busy_at_reset}
+    print(f"\nTk main loop, last {now - loop_timer.started:.0f} s:\n" + loop_timer.format(extra))
+    print("Stage latency since start:\n" + metrics.format())
+    loop_timer.reset()
+    last_report_time = now
+    inference_busy_at_reset = busy
+
+def warm_up_models():
+    """Load and warm the models once at startup (on the inference thread) and report the timings."""
+    timings = emotion_detection.warm_up(DETECTOR_BACKEND, MODEL_CACHE_DIR, OFFLINE_MODELS, EMOTION_BACKEND, EMOTION_MODEL,
+                                        EMOTION_THREADS)
+    print("\nModel warm-up:\n" + emotion_detection.format_timings(timings))
+    print(f"Model ready {(time.perf_counter() - START_TIME) * 1000:.0f} ms after start")
+
+def load_stack():
+    """Import the heavy modules, open the webcam and start the pipeline. Runs on a background thread."""
+    global cv2, Image, ImageTk, emotion_detection, analytics, cap, pipeline, quality, recorder, emotion_series
+    global display_transform, load_error
     try:
-        # Use a faster backend like 'VGG-Face' or 'Facenet'
-        analysis = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False)
-        expressions = analysis[0]['emotion']
-        d_expression = analysis[0]['dominant_emotion']
-        print(f"\rExpression : {d_expression}         ", end='', flush=True)
-
-        # Get the face region from the analysis
-        dominant_face_region = analysis[0]['region']
-        x, y, w, h = dominant_face_region['x'], dominant_face_region['y'], dominant_face_region['w'], dominant_face_region['h']
-        
-        # Draw a rectangle around the dominant face (Green)
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)  # Green rectangle for dominant face
+        import cv2
+        from PIL import Image, ImageTk
+        import emotion_detection
+        import analytics
+        from display import DisplayTransform
+        from capture import open_source
+        from pipeline import AnalysisPipeline
+
+        # Open the webcam (or whatever CAMERA_SOURCE names); it is read on the pipeline's capture thread
+        cap = open_source(CAMERA_SOURCE, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS, loop=True)
+
+        # Capture and inference run on background threads, the Tk loop only renders.
+        # DeepFace itself is imported and warmed up by warm_up_models() on the inference thread.
+        if ANALYSIS_SERVER is None:
+            analyzer = emotion_detection.make_analyzer(DETECT_INTERVAL, TRACK_MIN_CONFIDENCE, DETECTOR_BACKEND,
+                                                       smoothing=SMOOTHING, skip_stable=SKIP_STABLE_FACES,
+                                                       change_threshold=CHANGE_THRESHOLD, metrics=metrics,
+                                                       detect_scale=DETECT_SCALE)
+            warm_up = warm_up_models
+        else:
+            from service import RemoteAnalyzer
+            analyzer = RemoteAnalyzer(ANALYSIS_SERVER)
+            warm_up = analyzer.wait_ready  # The service loads the models, this process never imports DeepFace
+        emotion_series = analytics.EmotionSeries(max_seconds=ANALYTICS_WINDOW)
+        display_transform = DisplayTransform(ASPECT_RATIO)
+        if RECORD_SESSION is not None:
+            from recording import SessionRecorder
+            recorder = SessionRecorder(RECORD_SESSION, RECORD_STORAGE)
+        if ADAPTIVE_QUALITY:
+            from quality import QualityController
+            quality = QualityController(TARGET_FPS, MAX_STALENESS, DETECT_INTERVAL, log=lambda text: print("\n" + text),
+                                        detect_scale=DETECT_SCALE)
+            metrics.add_source(quality.counters)
+        new_pipeline = AnalysisPipeline(cap, analyzer, warm_up=warm_up, metrics=metrics, recorder=recorder,
+                                        quality=quality)
+        metrics.add_source(new_pipeline.counters)
+        new_pipeline.start()
+        pipeline = new_pipeline  # Published last: the Tk thread starts rendering once this is set
     except Exception as e:
-        print(f"❌ DeepFace Error: {e}")
-        expressions = "Natural"
+        load_error = e
+
+def wait_for_stack():
+    """Poll (on the Tk thread) until load_stack() is done, then start the video feed."""
+    if load_error is not None:
+        print(f"❌ Startup Error: {load_error}")
+        d_label_main.config(text="LOAD FAILED")
+        return
+    if pipeline is None:
+        root.after(50, wait_for_stack)
+        return
+    update_frame()
+
+def report_first_window(event):
+    """Print the time-to-first-window once the main window is mapped."""
+    root.unbind("<Map>")
+    print(f"Window shown {(time.perf_counter() - START_TIME) * 1000:.0f} ms after start")
+
+last_result_seq = 0
+last_faces = []  # Every face of the latest result, each with its own track ID
+last_primary_id = None  # Track ID of the face that drives the labels and the score
+
+# The video is shown through one canvas image item and one PhotoImage that are updated in place.
+# They (and the display_transform's resize buffer) are only reallocated when the displayed frame
+# size changes, so memory stays flat however long the app runs.
+display_transform = None
+canvas_image = None
+photo = None
+
+def apply_latest_result():
+    """Pick up the newest result from the inference worker, if there is one, and update the labels."""
+    global last_result_seq, last_faces, last_primary_id
+    result = pipeline.latest_result()
+    if result is None or result[0] == last_result_seq:
+        return  # Nothing new since the last render
+
+    last_result_seq, _, analysis, error = result
+    if error is not None:
+        print(f"❌ DeepFace Error: {error}")
+        return
+
+    last_faces = analysis
+    primary = emotion_detection.primary_face(analysis)
+    if primary is None:
+        return  # No face in this frame, keep showing the last result
+
+    # The largest face is the player, the labels and the game score follow it
+    expressions = primary['emotion']
+    d_expression = primary['dominant_emotion']
+    last_primary_id = primary.get('face_id')
+    emotion_series.append(time.time(), emotion_detection.emotion_vector(expressions))
+
+    stats = pipeline.stats()
+    print(f"\rExpression : {d_expression}   faces={len(analysis)} "
+          f"| camera {stats['camera_fps']:.0f} fps display {stats['display']['fps']:.0f} fps "
+          f"infer {stats['inference']['fps']:.1f} fps "
+          f"| infer q={stats['inference']['depth']} dropped={stats['inference']['dropped']} "
+          f"{stats['inference']['last_ms']:.0f}ms "
+          f"| display q={stats['display']['depth']} dropped={stats['display']['dropped']} "
+          f"| faces analyzed={stats['analyzer']['classified_faces']} reused={stats['analyzer']['skipped_faces']}         ",
+          end='', flush=True)
 
     # Update the details next to the face box
     update_details(d_expression, expressions)
 
-    # Ensure canvas dimensions are available and valid
-    canvas_width = canvas.winfo_width()
-    canvas_height = canvas.winfo_height()
+def show_frame(frame_bgr, x_offset, y_offset):
+    """Put a BGR frame on the canvas, reusing the canvas item and the PhotoImage."""
+    global canvas_image, photo
+    height, width = frame_bgr.shape[:2]
+    if photo is None or (photo.width(), photo.height()) != (width, height):
+        # Displayed size changed (or first frame): allocate once for the new size
+        photo = ImageTk.PhotoImage("RGB", (width, height))
+        if canvas_image is None:
+            canvas_image = canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=photo)
+        else:
+            canvas.itemconfigure(canvas_image, image=photo)
+
+    # Copy the pixels into the existing PhotoImage (Tkinter needs RGB, the swap happens in to_image)
+    with metrics.stage("convert"):
+        image = display_transform.to_image(frame_bgr)
+    with metrics.stage("tk_render"):
+        photo.paste(image)
+        canvas.coords(canvas_image, x_offset, y_offset)
+
+def render_frame():
+    """Draws the newest camera frame, if there is one, on the Tkinter canvas with the latest emotion result on top"""
+    item = pipeline.latest_frame()
+    if item is None:
+        return  # No new camera frame yet
+    _, frame, captured_at = item
+
+    # Resize the frame to fit the canvas while maintaining aspect ratio. The target size and
+    # offsets are cached per canvas size and the result is written into a reused buffer.
+    with metrics.stage("resize"):
+        frame_resized, x_offset, y_offset = display_transform.apply(frame, canvas.winfo_width(), canvas.winfo_height())
+
+    # Draw a box and ID for every face: green for the player, blue for everyone else. The frame
+    # is shared with the inference worker, so draw on the resized buffer, scaling the regions to match.
+    sx = frame_resized.shape[1] / frame.shape[1]
+    sy = frame_resized.shape[0] / frame.shape[0]
+    for face in last_faces:
+        region = face['region']
+        x, y, w, h = int(region['x'] * sx), int(region['y'] * sy), int(region['w'] * sx), int(region['h'] * sy)
+        color = (0, 255, 0) if face.get('face_id') == last_primary_id else (255, 0, 0)
+        cv2.rectangle(frame_resized, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(frame_resized, f"#{face.get('face_id')} {face['dominant_emotion']}", (x, max(y - 6, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
     
-    # Wait for canvas size to be valid before resizing the frame
-    if canvas_width > 0 and canvas_height > 0:
-        # Resize the frame to fit the canvas while maintaining aspect ratio
-        frame_resized = resize_frame(frame, canvas_width, canvas_height)
+    show_frame(frame_resized, x_offset, y_offset)
+    metrics.observe("frame_age", time.perf_counter() - captured_at)  # Capture to on screen
+
+def update_overlay():
+    """Refresh the FPS/latency overlay every OVERLAY_INTERVAL seconds, if it is switched on."""
+    global overlay_item, overlay_state
+    if not SHOW_OVERLAY:
+        if overlay_item is not None:
+            canvas.delete(overlay_item)
+            overlay_item = None
+        return
+    now = time.perf_counter()
+    last_time, last_frames, last_results = overlay_state
+    if now - last_time < OVERLAY_INTERVAL:
+        return
+    frames, results = metrics.count("frame_age"), metrics.count("result_age")
+    elapsed = now - last_time
+    counters = metrics.counters()
+    text = (f"camera {counters.get('camera_fps', 0):.1f} fps   display {(frames - last_frames) / elapsed:.1f} fps   "
+            f"inference {(results - last_results) / elapsed:.1f} fps\n"
+            f"frame age p50/p95 {metrics.percentile('frame_age', 50) * 1000:.0f}/{metrics.percentile('frame_age', 95) * 1000:.0f} ms   "
+            f"result age p50/p95 {metrics.percentile('result_age', 50) * 1000:.0f}/{metrics.percentile('result_age', 95) * 1000:.0f} ms\n"
+            f"dropped: display {counters.get('frames_dropped_display', 0)}   inference {counters.get('frames_dropped_inference', 0)}")
+    if quality is not None:
+        text += "\n" + quality.summary()
+    if overlay_item is None:
+        overlay_item = canvas.create_text(8, 8, anchor=tk.NW, fill="yellow", font=('Courier', 10), text=text)
     else:
-        # Use default size if canvas size is invalid or zero
-        frame_resized = cv2.resize(frame, (800, 600))
-    
-    # Convert the frame to RGB (Tkinter needs RGB format)
-    frame_resized = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-    
-    # Convert the frame to a format Tkinter can display
-    img = Image.fromarray(frame_resized)
-    imgtk = ImageTk.PhotoImage(image=img)
-    
-    # Calculate the position to center the image
-    x_offset = (canvas_width - frame_resized.shape[1]) // 2
-    y_offset = (canvas_height - frame_resized.shape[0]) // 2
-    
-    # Update the canvas with the resized and centered image
-    canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=imgtk)
-    canvas.imgtk = imgtk  # Keep a reference to avoid garbage collection
+        canvas.itemconfigure(overlay_item, text=text)
+    canvas.tag_raise(overlay_item)
+    overlay_state = (now, frames, results)
+
+def toggle_overlay(event=None):
+    global SHOW_OVERLAY
+    SHOW_OVERLAY = not SHOW_OVERLAY
+
+def compute_analytics(timestamps, emotions):
+    """Summarize a copy of the series into analytics_result (runs on the analytics thread)."""
+    global analytics_result
+    text = analytics.format_summary(analytics.summarize(timestamps, emotions),
+                                    f"Last {ANALYTICS_WINDOW / 3600:g} h")
+    if len(timestamps):
+        keys, frames, seconds, mean, dwell = analytics.summarize_groups(timestamps, emotions,
+                                                                        analytics.hour_keys(timestamps))
+        text += "\n" + analytics.format_groups([analytics.format_clock(k)[11:16] for k in keys],
+                                               frames, seconds, mean, dwell, "hour")
+    analytics_result = text
+
+def refresh_analytics():
+    """Show the latest analytics text, start the next computation, and re-arm while the window is open.
+
+    The summaries run on a background thread over a copy of the series, so the Tk loop only pays
+    for the copy (a few ms for the whole window).
+    """
+    global analytics_job, analytics_result
+    if analytics_window is None or not analytics_window.winfo_exists():
+        return
+    text, analytics_result = analytics_result, None
+    if emotion_series is None:
+        text = "Waiting for the model..."
+    elif analytics_job is None or not analytics_job.is_alive():
+        timestamps, emotions = emotion_series.arrays()
+        analytics_job = threading.Thread(target=compute_analytics, args=(timestamps.copy(), emotions.copy()),
+                                         name="analytics", daemon=True)
+        analytics_job.start()
+    if text is not None:
+        analytics_text.config(state=tk.NORMAL)
+        analytics_text.delete("1.0", tk.END)
+        analytics_text.insert(tk.END, text)
+        analytics_text.config(state=tk.DISABLED)
+    # Poll quickly until the first text is in, then every ANALYTICS_INTERVAL
+    delay = ANALYTICS_INTERVAL if analytics_text.get("1.0", "1.end") else 0.1
+    analytics_window.after(int(delay * 1000), refresh_analytics)
+
+def show_analytics(event=None):
+    """Open the session analytics window (F3), or bring it to the front."""
+    global analytics_window, analytics_text
+    if analytics_window is not None and analytics_window.winfo_exists():
+        analytics_window.lift()
+        return
+    analytics_window = tk.Toplevel(root)
+    analytics_window.title("Session analytics")
+    analytics_text = tk.Text(analytics_window, font=('Courier', 10), width=110, height=30)
+    analytics_text.pack(fill="both", expand=True)
+    refresh_analytics()
 
-    # Update the position of the leaderboard lebel. so it will align to the left.
-    update_leaderboard_position()
-    
-    # Update the frame every 10 ms
+def update_frame():
+    """One tick of the video loop: apply the latest result, draw the latest frame, re-arm"""
+    with loop_timer.stage("results"):
+        apply_latest_result()
+    with loop_timer.stage("render"):
+        render_frame()
+        update_overlay()
+    report_loop_time()
+
+    # Update the frame every 10 ms. The layout is not redone here, only on <Configure>.
     canvas.after(10, update_frame)
 
 def start_game():
@@ -299,18 +616,14 @@ def stop_game():
 
     game_started = False
 
-    # Add the score to the Leaderboard
-    lboard.append((name_entry.get(), current_expression, user_score))
-    lboard.sort(key=lambda x: x[2], reverse=True)
-
-    save_leaderboard()
+    # Add the score to the Leaderboard (one indexed insert, committed atomically) and
+    # update the top 10 on screen with only the rows that changed
+    change = place_score(name_entry.get(), current_expression, float(user_score))
+    rank, total = lboard.rank_in_history(user_score)
+    print(f"\nScore {user_score:.2f}% for {current_expression}: rank {rank} of {total}"
+          + (f", #{change['rank'] + 1} on the leaderboard" if change["rank"] is not None else ""))
 
     user_score = 0
-
-    # Update the Leaderboard (show top 10 scores)
-    lboard_list.delete(0, tk.END)
-    for i, (name, expression, score) in enumerate(lboard[:10]):
-        lboard_list.insert(tk.END, f"{i+1}. {name} - {expression} - {score:.2f}%")
     
     name_label.config(text=f"Enter Your Name:")
 
@@ -319,11 +632,36 @@ def stop_game():
     start_button.config(state=tk.NORMAL)
 
 print() # Print new line to the console.
+lboard = Leaderboard(LeaderboardStore(LEADERBOARD_DB, legacy_json=LEADERBOARD_FILE), k=10)
+lboard.preload_history()  # The score history for ranks over all games, read in the background
 show_leaderboard()
-# Start the video feed after a short delay to ensure canvas size is available
-root.after(100, update_frame)
+d_label_main.config(text="LOADING MODEL")
+root.bind("<Map>", report_first_window)
+root.bind("<Configure>", on_configure)
+root.bind("<F2>", toggle_overlay)
+root.bind("<F3>", show_analytics)
+if METRICS_FILE is not None or METRICS_PORT is not None:
+    metrics_exporter = MetricsExporter(metrics, METRICS_FILE, METRICS_PORT, METRICS_EXPORT_INTERVAL)
+    metrics_exporter.start()
+
+# Load the ML stack and open the webcam in the background, then start the video feed
+threading.Thread(target=load_stack, name="loader", daemon=True).start()
+root.after(100, wait_for_stack)
 
 # Run the Tkinter main loop
 root.mainloop()
 
+report_loop_time(final=True)
+if metrics_exporter is not None:
+    metrics_exporter.stop()
+
+# Stop the capture and inference threads before releasing the camera
+if pipeline is not None:
+    pipeline.stop()
+if cap is not None:
+    cap.release()
+if recorder is not None and pipeline is None:
+    recorder.close()  # Otherwise the pipeline closes it once its inference thread is done with it
+lboard.store.close()
+
 print("\nProgram Terminated...")
@@ -0,0 +1,756 @@
+"""Emotion analysis shared by the Tk app and the headless command line.
+
+Usage:
+    python -m emotion_detection warmup --cache-dir models
+    python -m emotion_detection analyze clip.mp4 -o results.jsonl
+    python -m emotion_detection analyze assets/ -o results.csv
+    python -m emotion_detection analyze "captures/*.png" --format csv
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from capture import IMAGE_EXTENSIONS, open_source
+from detectors import NATIVE_BACKENDS, make_detector
+from gating import ChangeGate
+from smoothing import EmotionSmoother
+from tracking import FaceTracker
+
+# The seven emotion keys DeepFace returns, in the model's output order
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+
+# Input size of DeepFace's emotion model (grayscale)
+EMOTION_INPUT_SIZE = 48
+
+CSV_FIELDS = ["frame", "source", "face", "face_id", "dominant_emotion", *EMOTIONS, "x", "y", "w", "h", "face_confidence"]
+
+
+_deepface = None
+_import_lock = threading.Lock()
+
+
+def load_deepface():
+    """Import DeepFace (and with it TensorFlow/Keras) on first use and return the DeepFace class.
+
+    Importing this module stays cheap; the ML stack is only pulled in by the first call that
+    needs it, or explicitly by warm_up().
+    """
+    global _deepface
+    with _import_lock:
+        if _deepface is None:
+            from deepface import DeepFace
+            _deepface = DeepFace
+    return _deepface
+
+
+def analyze_frame(frame):
+    """Run DeepFace emotion analysis on a BGR frame and return one result dict per face."""
+    return load_deepface().analyze(frame, actions=['emotion'], enforce_detection=False, silent=True)
+
+
+_emotion_model = None
+_model_lock = threading.Lock()
+
+# What runs the emotion classifier: DeepFace's Keras model, or the model exported to ONNX by
+# emotion_onnx.py, run by ONNX Runtime or OpenCV DNN (no TensorFlow import)
+EMOTION_BACKENDS = ("deepface", "onnxruntime", "opencv")
+_emotion_backend = {"backend": "deepface", "model": None, "threads": None}
+
+
+def set_emotion_backend(backend="deepface", model=None, threads=None):
+    """Choose the emotion classifier backend before the model is first built.
+
+    model is the exported ONNX file (default: emotion_onnx.EMOTION_ONNX in the weights cache) and
+    threads the ONNX Runtime / OpenCV thread count; both are ignored by the deepface backend.
+    """
+    global _emotion_model
+    if backend not in EMOTION_BACKENDS:
+        raise ValueError(f"Unknown emotion backend {backend!r}, expected one of {EMOTION_BACKENDS}")
+    with _model_lock:
+        if _emotion_backend != {"backend": backend, "model": model, "threads": threads}:
+            _emotion_backend.update(backend=backend, model=model, threads=threads)
+            _emotion_model = None
+
+
+def emotion_model_path():
+    """The exported ONNX emotion model the onnxruntime/opencv backends load."""
+    from emotion_onnx import EMOTION_ONNX
+
+    return _emotion_backend["model"] or os.path.join(weights_dir(), EMOTION_ONNX)
+
+
+def get_emotion_model():
+    """Build the emotion classifier once and return it: DeepFace's Keras model, or an ONNX model
+    with the same call signature and output (see set_emotion_backend())."""
+    global _emotion_model
+    with _model_lock:
+        if _emotion_model is None and _emotion_backend["backend"] != "deepface":
+            import emotion_onnx
+            _emotion_model = emotion_onnx.load_model(_emotion_backend["backend"], emotion_model_path(),
+                                                     _emotion_backend["threads"])
+        if _emotion_model is None:
+            try:
+                client = load_deepface().build_model("Emotion", task="facial_attribute")
+            except TypeError:
+                # deepface < 0.0.93 has no task argument
+                client = load_deepface().build_model("Emotion")
+            _emotion_model = client.model
+    return _emotion_model
+
+
+# Weight files DeepFace needs under <DEEPFACE_HOME>/.deepface/weights. The opencv, mtcnn and
+# mediapipe detectors ship their weights with their packages.
+MODEL_WEIGHTS = {
+    "Emotion": ["facial_expression_model_weights.h5"],
+    "ssd": ["deploy.prototxt", "res10_300x300_ssd_iter_140000.caffemodel"],
+    "yunet": ["face_detection_yunet_2023mar.onnx"],
+    "retinaface": ["retinaface.h5"],
+    "dlib": ["shape_predictor_5_face_landmarks.dat"],
+    "yolov8": ["yolov8n-face.pt"],
+    "centerface": ["centerface.onnx"],
+}
+
+
+def set_model_cache(cache_dir):
+    """Make DeepFace read (and, when online, download) its weights under <cache_dir>/.deepface/weights."""
+    os.environ["DEEPFACE_HOME"] = os.path.abspath(cache_dir)
+
+
+def weights_dir():
+    """Directory DeepFace loads model weights from."""
+    return os.path.join(os.getenv("DEEPFACE_HOME", os.path.expanduser("~")), ".deepface", "weights")
+
+
+def missing_weights(detector_backend="opencv"):
+    """Return the weight files of the emotion model and the detector that are not in the cache."""
+    names = MODEL_WEIGHTS.get(detector_backend.split(":")[-1], [])
+    if _emotion_backend["backend"] == "deepface":
+        names = MODEL_WEIGHTS["Emotion"] + names
+    missing = [name for name in names if not os.path.isfile(os.path.join(weights_dir(), name))]
+    if _emotion_backend["backend"] != "deepface" and not os.path.isfile(emotion_model_path()):
+        missing.append(emotion_model_path())
+    return missing
+
+
+_detectors = {}
+
+
+def get_detector(detector_backend="opencv"):
+    """Return the detector for a backend name (see detectors.py), created once per process."""
+    with _model_lock:
+        if detector_backend not in _detectors:
+            _detectors[detector_backend] = make_detector(detector_backend, weights_dir())
+        return _detectors[detector_backend]
+
+
+def warm_up(detector_backend="opencv", cache_dir=None, offline=False, emotion_backend=None, emotion_model=None,
+            threads=None):
+    """Load the emotion model and the face detector and run each once, so the first real frame is fast.
+
+    The built models stay in memory for the life of the process. With offline=True, missing
+    weights raise FileNotFoundError instead of being downloaded. emotion_backend, emotion_model
+    and threads are passed to set_emotion_backend() when given; with an ONNX backend and a native
+    detector (haar, yunet, skip) DeepFace and TensorFlow are never imported. Returns [(step, seconds)].
+    """
+    if cache_dir is not None:
+        set_model_cache(cache_dir)
+    if emotion_backend is not None:
+        set_emotion_backend(emotion_backend, emotion_model, threads)
+    if offline:
+        missing = missing_weights(detector_backend)
+        if missing:
+            raise FileNotFoundError(
+                f"Model weights missing from {weights_dir()}: {', '.join(missing)}. "
+                f"Run `python -m emotion_detection warmup` once with network access to fill the cache.")
+
+    timings = []
+
+    def step(name, fn):
+        start = time.perf_counter()
+        fn()
+        timings.append((name, time.perf_counter() - start))
+
+    blank = np.zeros((480, 640, 3), dtype=np.uint8)
+    if _emotion_backend["backend"] == "deepface" or detector_backend not in NATIVE_BACKENDS:
+        step("import deepface/tensorflow", load_deepface)
+    step(f"build emotion model ({_emotion_backend['backend']})", get_emotion_model)
+    step("build face detector", lambda: get_detector(detector_backend).load())
+    step("first detection", lambda: detect_faces(blank, detector_backend))
+    step("first emotion inference", lambda: classify_faces([blank[:96, :96]]))
+    return timings
+
+
+def format_timings(timings):
+    """Render warm_up() timings as an aligned report."""
+    lines = [f"  {name:<26}{seconds * 1000.0:>9.0f} ms" for name, seconds in timings]
+    lines.append(f"  {'total':<26}{sum(s for _, s in timings) * 1000.0:>9.0f} ms")
+    return "\n".join(lines)
+
+
+def prepare_face(crop):
+    """Turn a BGR face crop into the 48x48 grayscale [0, 1] input the emotion model expects.
+
+    Mirrors DeepFace's own preprocessing: pad to a square with black borders, keeping the
+    aspect ratio, then convert to grayscale and resize. uint8 crops are divided by 255; float
+    crops are taken to be in [0, 1] already and are not rescaled.
+    """
+    scale = crop.dtype == np.uint8
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    h, w = crop.shape[:2]
+    if h != w:
+        size = max(h, w)
+        top, left = (size - h) // 2, (size - w) // 2
+        crop = cv2.copyMakeBorder(crop, top, size - h - top, left, size - w - left, cv2.BORDER_CONSTANT, value=0)
+    face = cv2.resize(crop, (EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE)).astype(np.float32)
+    if scale:
+        face /= 255.0
+    return face
+
+
+def crop_faces(frame, regions):
+    """Slice the face ROIs out of a frame. The crops are views, nothing is copied.
+
+    Regions are clipped to the frame; one lying entirely outside it gives an empty crop.
+    """
+    height, width = frame.shape[:2]
+    crops = []
+    for region in regions:
+        x, y = int(region['x']), int(region['y'])
+        x2, y2 = min(x + int(region['w']), width), min(y + int(region['h']), height)
+        x, y = max(x, 0), max(y, 0)
+        crops.append(frame[y:max(y2, y), x:max(x2, x)])
+    return crops
+
+
+def emotion_result(probabilities):
+    """Convert one row of model output into the {'emotion', 'dominant_emotion'} shape DeepFace returns."""
+    total = float(probabilities.sum()) or 1.0
+    emotion = {label: 100.0 * float(p) / total for label, p in zip(EMOTIONS, probabilities)}
+    return {"emotion": emotion, "dominant_emotion": EMOTIONS[int(np.argmax(probabilities))]}
+
+
+def classify_faces(crops, batch_size=32):
+    """Classify N face crops with one model forward pass per batch_size crops.
+
+    Returns N dicts with 'emotion' (percentages per label) and 'dominant_emotion', the same
+    shape update_details() consumes from DeepFace.analyze. Empty crops (see crop_faces()) get None.
+    """
+    filled = [i for i, crop in enumerate(crops) if crop.size > 0]
+    results = [None] * len(crops)
+    if not filled:
+        return results
+    model = get_emotion_model()
+    batch = np.stack([prepare_face(crops[i]) for i in filled])[..., np.newaxis]
+    for start in range(0, len(batch), batch_size):
+        probabilities = np.asarray(model(batch[start:start + batch_size], training=False))
+        for i, row in zip(filled[start:start + batch_size], probabilities):
+            results[i] = emotion_result(row)
+    return results
+
+
+def check_detect_scale(scale):
+    """Return a detection scale as a float, raising ValueError unless 0 < scale <= 1."""
+    scale = float(scale)
+    if not 0.0 < scale <= 1.0:
+        raise ValueError(f"Detection scale must be in (0, 1], got {scale}")
+    return scale
+
+
+def detect_scale_arg(text):
+    """argparse type for --detect-scale."""
+    try:
+        return check_detect_scale(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def downscale(frame, scale):
+    """The frame resized by scale (< 1), or the frame itself at scale 1."""
+    if scale == 1.0:
+        return frame
+    return cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def scale_regions(regions, factor):
+    """Copies of the regions with x, y, w and h multiplied by factor, other keys kept."""
+    if factor == 1.0:
+        return regions
+    return [dict(region, **{k: int(round(region[k] * factor)) for k in ('x', 'y', 'w', 'h')}) for region in regions]
+
+
+def detect_faces(frame, detector_backend="opencv", scale=1.0):
+    """Return the face regions a detector backend finds in a BGR frame, as {'x', 'y', 'w', 'h', 'confidence'} dicts.
+
+    With scale below 1 the detector runs on a downscaled copy, which costs roughly scale^2 as much,
+    and the boxes are mapped back to full-frame coordinates. Faces smaller than the detector's
+    minimum size divided by scale are missed.
+    """
+    scale = check_detect_scale(scale)
+    return scale_regions(get_detector(detector_backend)(downscale(frame, scale)), 1.0 / scale)
+
+
+def attach_regions(results, regions):
+    """Add each region's box, detector confidence and track ID to its classification result.
+
+    Regions without a result (empty crops) are left out of the analysis.
+    """
+    analysis = []
+    for region, result in zip(regions, results):
+        if result is None:
+            continue
+        result['region'] = {k: region[k] for k in ('x', 'y', 'w', 'h')}
+        result['face_confidence'] = region.get('confidence', 0.0)
+        result['face_id'] = region.get('id')
+        analysis.append(result)
+    return analysis
+
+
+def analyze_regions(frame, regions):
+    """Classify the given face regions of a frame in one batch, returning DeepFace.analyze-shaped results."""
+    return attach_regions(classify_faces(crop_faces(frame, regions)), regions)
+
+
+def analyze_batch(frames, detector_backend="opencv", detect_scale=1.0):
+    """Detect the faces of several frames and classify all of them in one batch. Returns one analysis per frame.
+
+    Detection runs at detect_scale (see detect_faces()); the faces are cropped from the full frames.
+    """
+    regions = [detect_faces(frame, detector_backend, detect_scale) for frame in frames]
+    crops = [crop for frame, frame_regions in zip(frames, regions) for crop in crop_faces(frame, frame_regions)]
+    results = classify_faces(crops)
+    analyses = []
+    start = 0
+    for frame_regions in regions:
+        analyses.append(attach_regions(results[start:start + len(frame_regions)], frame_regions))
+        start += len(frame_regions)
+    return analyses
+
+
+def emotion_vector(emotion):
+    """Emotion dict -> float32 vector in EMOTIONS order."""
+    return np.array([emotion[label] for label in EMOTIONS], dtype=np.float32)
+
+
+def emotion_dict(vector):
+    """Float vector in EMOTIONS order -> emotion dict of Python floats."""
+    return {label: float(v) for label, v in zip(EMOTIONS, vector)}
+
+
+class TrackingAnalyzer:
+    """Drop-in replacement for analyze_frame() that detects faces every `detect_interval` frames.
+
+    In between, face boxes are propagated with optical flow (see tracking.FaceTracker) and only
+    the emotion classifier runs, on all tracked faces in one batch. Each result carries the
+    face's persistent track ID as 'face_id'.
+
+    With a smoother, 'emotion' and 'dominant_emotion' are the smoothed values (the model output
+    is kept as 'raw_emotion'). With skip_stable, faces whose smoothed scores are stable are not
+    re-classified. With a change threshold, a frame where neither the whole frame nor any face's
+    ROI (at its last box) has changed reuses the whole previous result, and a face whose ROI hasn't
+    changed reuses its own result (see gating.ChangeGate). The faces are compared, not just the
+    frame, because a face is a small part of it: a change of expression barely moves the mean of
+    the whole frame. A frame or a face is reused for at most max_skip frames in a row and never on
+    a detection frame.
+
+    With detect_scale below 1, detection and tracking run on a copy of the frame downscaled by
+    that factor (detection costs roughly detect_scale^2 as much); the boxes are mapped back to the
+    full frame and the emotion model gets face crops sliced from the full-resolution frame, so only
+    the faces are ever looked at in full detail and nothing is copied. detect_scale and
+    detect_interval can be changed between frames (see quality.QualityController).
+
+    With a telemetry.Metrics object, the box update ("detection" on detection frames, "tracking"
+    otherwise), the batched classifier ("emotion_inference") and "smoothing" are timed per frame.
+    """
+
+    def __init__(self, detect_interval=10, min_track_confidence=0.5, detector_backend="opencv",
+                 smoother=None, skip_stable=False, change_threshold=None, max_skip=10, metrics=None, detect_scale=1.0):
+        self.detect_scale = check_detect_scale(detect_scale)
+        self.tracker = FaceTracker(get_detector(detector_backend), interval=detect_interval,
+                                   min_confidence=min_track_confidence)
+        self.smoother = smoother
+        self.skip_stable = skip_stable and smoother is not None
+        self.frame_gate = ChangeGate(change_threshold) if change_threshold is not None else None
+        self.face_gate = ChangeGate(change_threshold) if change_threshold is not None else None
+        self.max_skip = max_skip
+        self.metrics = metrics
+        self.last_analysis = None
+        self.frame_skips = 0  # Consecutive frames that reused last_analysis
+        self.last_results = {}  # face_id -> last result, reused for faces that are skipped
+        self.skipped = {}  # face_id -> consecutive frames the face was not re-classified
+        self.classified_count = 0
+        self.skipped_count = 0
+
+    def __call__(self, frame):
+        if self.frame_gate is not None and self.last_analysis is not None \
+                and self.frame_skips < self.max_skip and not self.tracker.detection_due() \
+                and not self.frame_gate.changed_any(self._gate_images(frame, self.last_analysis)):
+            self.tracker.skip()
+            self.frame_skips += 1
+            return [dict(result) for result in self.last_analysis]
+
+        start = time.perf_counter()
+        regions = scale_regions(self.tracker.update(downscale(frame, self.detect_scale)), 1.0 / self.detect_scale)
+        if self.smoother is not None:
+            self.smoother.next_frame()
+        detected = self.tracker.frames_since_detect == 0
+        self._observe("detection" if detected else "tracking", start)
+        # Boxes that slipped outside the frame have nothing to classify
+        kept = [(region, crop) for region, crop in zip(regions, crop_faces(frame, regions)) if crop.size > 0]
+        regions, crops = [region for region, _ in kept], [crop for _, crop in kept]
+        reuse = [not detected and region['id'] in self.last_results
+                 and self.skipped.get(region['id'], 0) < self.max_skip
+                 and self._can_reuse(region['id'], crop) for region, crop in zip(regions, crops)]
+
+        start = time.perf_counter()
+        fresh = iter(analyze_regions(frame, [r for r, skip in zip(regions, reuse) if not skip]))
+        self._observe("emotion_inference", start)
+
+        start = time.perf_counter()
+        analysis = []
+        for region, skip in zip(regions, reuse):
+            face_id = region['id']
+            if skip:
+                result = dict(self.last_results[face_id], region={k: region[k] for k in ('x', 'y', 'w', 'h')},
+                              face_confidence=region.get('confidence', 0.0))
+                self.skipped[face_id] = self.skipped.get(face_id, 0) + 1
+                self.skipped_count += 1
+            else:
+                result = next(fresh)
+                if self.smoother is not None:
+                    result['raw_emotion'] = result['emotion']
+                    smoothed, label = self.smoother.update(face_id, emotion_vector(result['emotion']))
+                    result['emotion'] = emotion_dict(smoothed)
+                    result['dominant_emotion'] = EMOTIONS[label]
+                self.skipped[face_id] = 0
+                self.classified_count += 1
+            analysis.append(result)
+
+        live = {region['id'] for region in regions}
+        self.last_results = {result['face_id']: result for result in analysis}
+        self.skipped = {face_id: n for face_id, n in self.skipped.items() if face_id in live}
+        if self.face_gate is not None:
+            self.face_gate.forget(live)
+            self.frame_gate.reset(self._gate_images(frame, analysis))
+        self.last_analysis = analysis
+        self.frame_skips = 0
+        if self.smoother is not None:
+            self._observe("smoothing", start)
+        return analysis
+
+    @property
+    def detect_interval(self):
+        return self.tracker.interval
+
+    @detect_interval.setter
+    def detect_interval(self, interval):
+        self.tracker.interval = max(1, int(interval))
+
+    def _observe(self, stage, start):
+        if self.metrics is not None:
+            self.metrics.observe(stage, time.perf_counter() - start)
+
+    @staticmethod
+    def _gate_images(frame, analysis):
+        """What the frame gate compares: the whole frame and each analyzed face's ROI at its box."""
+        images = {"frame": frame}
+        images.update(zip([result['face_id'] for result in analysis],
+                          crop_faces(frame, [result['region'] for result in analysis])))
+        return images
+
+    def _can_reuse(self, face_id, crop):
+        """True if a tracked face can keep its previous result instead of being classified again."""
+        if self.skip_stable and self.smoother.is_stable(face_id):
+            return True
+        return self.face_gate is not None and not self.face_gate.changed(face_id, crop)
+
+    def stats(self):
+        stats = dict(self.tracker.stats(), classified_faces=self.classified_count, skipped_faces=self.skipped_count)
+        if self.frame_gate is not None:
+            stats["frame_gate"] = self.frame_gate.stats()
+            stats["face_gate"] = self.face_gate.stats()
+        return stats
+
+
+def make_analyzer(detect_interval=1, min_track_confidence=0.5, detector_backend="opencv",
+                  smoothing="none", skip_stable=False, change_threshold=None, metrics=None, detect_scale=1.0):
+    """Return a stateful per-frame analysis function that reports every face with a track ID.
+
+    With detect_interval=1 the detector runs on every frame and the tracker only matches IDs.
+    smoothing is "none", "ema" or "median" (see smoothing.EmotionSmoother). change_threshold
+    turns on frame/face change gating (mean gray-level difference, see gating.ChangeGate).
+    metrics is an optional telemetry.Metrics that receives per-stage timings. detect_scale below 1
+    detects and tracks faces on a downscaled copy of each frame (see TrackingAnalyzer).
+    """
+    smoother = None if smoothing == "none" else EmotionSmoother(method=smoothing)
+    return TrackingAnalyzer(detect_interval, min_track_confidence, detector_backend,
+                            smoother=smoother, skip_stable=skip_stable, change_threshold=change_threshold,
+                            metrics=metrics, detect_scale=detect_scale)
+
+
+def primary_face(analysis):
+    """Return the largest face in an analysis result (the person closest to the camera), or None."""
+    if not analysis:
+        return None
+    return max(analysis, key=lambda face: face['region']['w'] * face['region']['h'])
+
+
+def image_paths(source):
+    """The image files of an image file, directory or glob source, or None for any other source."""
+    if os.path.isdir(source):
+        return sorted(p for p in glob.glob(os.path.join(source, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+    if glob.has_magic(source):
+        return sorted(glob.glob(source))
+    if source.lower().endswith(IMAGE_EXTENSIONS):
+        return [source]
+    return None
+
+
+def iter_frames(source):
+    """Yield (frame_index, name, frame) from a video file, an image file, a directory or a glob of images.
+
+    Anything else capture.open_source() accepts (a camera index, a stream URL, "synthetic") is read
+    frame by frame as well; those never end on their own, so use a limit.
+    """
+    paths = image_paths(source)
+    if paths is not None:
+        for index, path in enumerate(paths):
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Skipping unreadable image: {path}", file=sys.stderr)
+                continue
+            yield index, path, frame
+        return
+
+    cap = open_source(source, paced=False)
+    try:
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, source, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def prefetch(iterable, size=8):
+    """Decode frames on a background thread so reading overlaps with inference."""
+    q = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def producer():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    break
+        except Exception as e:
+            q.put(e)
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()  # Release the video capture on this thread
+        q.put(done)
+
+    thread = threading.Thread(target=producer, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # The consumer stopped early (e.g. --limit): let the producer finish and release the source
+        stop.set()
+        while thread.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                thread.join(0.1)
+
+
+def _point(value):
+    """Convert an eye coordinate (tuple of NumPy ints or None) to a JSON friendly list."""
+    return None if value is None else [int(v) for v in value]
+
+
+def to_record(frame_index, source, face_index, face):
+    """Flatten one DeepFace result (the structure in output.js) into plain Python types."""
+    region = face['region']
+    return {
+        "frame": frame_index,
+        "source": source,
+        "face": face_index,
+        "face_id": face.get('face_id'),
+        "emotion": {k: float(v) for k, v in face['emotion'].items()},
+        "dominant_emotion": face['dominant_emotion'],
+        "region": {
+            "x": int(region['x']),
+            "y": int(region['y']),
+            "w": int(region['w']),
+            "h": int(region['h']),
+            "left_eye": _point(region.get('left_eye')),
+            "right_eye": _point(region.get('right_eye')),
+        },
+        "face_confidence": float(face.get('face_confidence', 0.0)),
+    }
+
+
+class JsonlWriter:
+    """Write one JSON object per line."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record):
+        self.f.write(json.dumps(record) + "\n")
+
+
+class CsvWriter:
+    """Write records as flat CSV rows, one column per emotion and region field."""
+
+    def __init__(self, f):
+        self.writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, record):
+        row = {k: record[k] for k in ("frame", "source", "face", "face_id", "dominant_emotion", "face_confidence")}
+        row.update(record["emotion"])
+        row.update({k: record["region"][k] for k in ("x", "y", "w", "h")})
+        self.writer.writerow(row)
+
+
+def analyze_source(source, out, fmt="jsonl", limit=None, analyze=analyze_frame):
+    """Analyze every frame of source and write the records to the open file out. Returns (frames, faces)."""
+    writer = CsvWriter(out) if fmt == "csv" else JsonlWriter(out)
+    frames = faces = 0
+    for frame_index, name, frame in prefetch(iter_frames(source)):
+        if limit is not None and frames >= limit:
+            break
+        try:
+            analysis = analyze(frame)
+        except Exception as e:
+            print(f"❌ DeepFace Error on frame {frame_index}: {e}", file=sys.stderr)
+            analysis = []
+        for face_index, face in enumerate(analysis):
+            writer.write(to_record(frame_index, name, face_index, face))
+        frames += 1
+        faces += len(analysis)
+    return frames, faces
+
+
+def cmd_analyze(args):
+    """Entry point for the `analyze` sub-command."""
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.output and args.output.lower().endswith(".csv") else "jsonl"
+
+    timings = warm_up(args.detector_backend, args.cache_dir, args.offline, **emotion_options(args))
+    print("Model warm-up:\n" + format_timings(timings), file=sys.stderr)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        def new_analyzer():
+            return make_analyzer(args.detect_interval, args.min_track_confidence, args.detector_backend,
+                                 args.smoothing, args.skip_stable, args.change_threshold, detect_scale=args.detect_scale)
+
+        analyze = new_analyzer()
+        if image_paths(args.source) is not None:
+            # Unrelated stills: no face IDs, smoothing or change gating carried over from one image to the next
+            analyze = lambda frame: new_analyzer()(frame)
+        frames, faces = analyze_source(args.source, out, fmt, args.limit, analyze)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"Analyzed {frames} frames ({faces} faces) in {elapsed:.1f}s, {fps:.1f} frames/s", file=sys.stderr)
+    return 0
+
+
+def cmd_warmup(args):
+    """Entry point for the `warmup` sub-command: fill the model cache and report load times."""
+    timings = warm_up(args.detector_backend, args.cache_dir, args.offline, **emotion_options(args))
+    print(f"Model weights in {weights_dir()}")
+    print(format_timings(timings))
+    return 0
+
+
+def add_model_arguments(p):
+    """Options shared by every sub-command that loads the models."""
+    p.add_argument("--detector-backend", default="opencv",
+                   help="Face detector: haar, yunet, skip, or a DeepFace backend (opencv, ssd, mtcnn, retinaface, ...)")
+    p.add_argument("--cache-dir", help="Model weights cache (DEEPFACE_HOME); weights live in <dir>/.deepface/weights")
+    p.add_argument("--offline", action="store_true", help="Fail instead of downloading weights missing from the cache")
+    p.add_argument("--emotion-backend", default="deepface", choices=EMOTION_BACKENDS,
+                   help="Emotion classifier: DeepFace's Keras model, or the ONNX export (python -m emotion_onnx export) "
+                        "on ONNX Runtime or OpenCV DNN")
+    p.add_argument("--emotion-model", help="Exported ONNX emotion model (default: the one in the model cache)")
+    p.add_argument("--threads", type=int, help="Threads for the ONNX Runtime/OpenCV emotion backends")
+
+
+def emotion_options(args):
+    """The emotion classifier options of add_model_arguments(), as warm_up() keyword arguments."""
+    return {"emotion_backend": args.emotion_backend, "emotion_model": args.emotion_model, "threads": args.threads}
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(prog="emotion_detection", description="Headless emotion detection.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("analyze", help="Analyze a video file, an image, a directory or a glob of images.")
+    p.add_argument("source", help="Video file, image file, image directory, glob pattern, camera index, stream URL or \"synthetic\"")
+    p.add_argument("-o", "--output", help="Output file (default: stdout)")
+    p.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from the file extension, else jsonl)")
+    p.add_argument("--limit", type=int, help="Stop after this many frames")
+    p.add_argument("--detect-interval", type=int, default=1,
+                   help="Run face detection every K frames and track faces in between (default: 1, detect every frame)")
+    p.add_argument("--min-track-confidence", type=float, default=0.5,
+                   help="Re-detect early when a tracked face drops below this confidence (0-1)")
+    p.add_argument("--detect-scale", type=detect_scale_arg, default=1.0,
+                   help="Detect faces on a copy of the frame downscaled by this factor, e.g. 0.5 (faces are still "
+                        "classified at full resolution)")
+    add_model_arguments(p)
+    p.add_argument("--smoothing", choices=["none", "ema", "median"], default="none",
+                   help="Smooth each face's emotion scores over time (default: none, raw model output)")
+    p.add_argument("--skip-stable", action="store_true",
+                   help="With smoothing, skip the emotion model for faces whose smoothed scores are stable")
+    p.add_argument("--change-threshold", type=float,
+                   help="Reuse the previous result for frames/faces that changed less than this (mean gray levels, e.g. 3)")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("warmup", help="Download (if needed) and load the models, reporting how long each step takes.")
+    add_model_arguments(p)
+    p.set_defaults(func=cmd_warmup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
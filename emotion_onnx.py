@@ -0,0 +1,247 @@
+"""ONNX export of DeepFace's emotion model, and ONNX Runtime / OpenCV DNN backends to run it without TensorFlow.
+
+The export reads the Keras layers of the model DeepFace builds and writes the same network as
+an ONNX graph (input N x 48 x 48 x 1 float, output N x 7 softmax in EMOTIONS order), optionally
+with int8 weights (ONNX Runtime dynamic quantization). Only exporting needs DeepFace/TensorFlow
+and the onnx package; running needs onnxruntime, or nothing beyond OpenCV for the "opencv" backend.
+
+Usage:
+    python -m emotion_onnx export --cache-dir models --int8
+    python -m emotion_onnx check --cache-dir models --backend onnxruntime
+    python -m emotion_onnx check --cache-dir models --model models/.deepface/weights/facial_expression_model_int8.onnx --tolerance 5
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+EMOTION_ONNX = "facial_expression_model.onnx"
+EMOTION_ONNX_INT8 = "facial_expression_model_int8.onnx"
+OPSET = 13
+IR_VERSION = 7  # The IR version of opset 13: newer onnx packages default to one older runtimes can't load
+
+# The labeled faces of the parity check, next to this file whatever the working directory
+ASSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "*.jpeg")
+
+ACTIVATIONS = {"relu": "Relu", "softmax": "Softmax", "sigmoid": "Sigmoid", "tanh": "Tanh"}
+
+
+class OnnxRuntimeModel:
+    """An exported emotion model run by ONNX Runtime on the CPU, callable like the Keras model."""
+
+    def __init__(self, path, threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input = self.session.get_inputs()[0].name
+
+    def __call__(self, batch, training=False):
+        return self.session.run(None, {self.input: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
+
+class OpenCVModel:
+    """An exported emotion model run by OpenCV's DNN module (float models only).
+
+    threads sets OpenCV's global thread count, which also affects the rest of OpenCV in the process.
+    """
+
+    def __init__(self, path, threads=None):
+        self.net = cv2.dnn.readNetFromONNX(path)
+        if threads:
+            cv2.setNumThreads(threads)
+
+    def __call__(self, batch, training=False):
+        self.net.setInput(np.ascontiguousarray(batch, dtype=np.float32))
+        return self.net.forward()
+
+
+BACKENDS = {"onnxruntime": OnnxRuntimeModel, "opencv": OpenCVModel}
+
+
+def load_model(backend, path, threads=None):
+    """The exported model at path, run by backend ("onnxruntime" or "opencv")."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"ONNX emotion model not found: {path}. "
+                                f"Export it once with `python -m emotion_onnx export`.")
+    return BACKENDS[backend](path, threads)
+
+
+def keras_to_onnx(model):
+    """Convert the emotion model's Keras layers (a chain of Conv2D, pooling, Flatten, Dense, Dropout
+    and Activation layers) into an onnx.ModelProto with the same NHWC input."""
+    from onnx import TensorProto, helper, numpy_helper
+
+    nodes, weights = [], []
+
+    def node(op, inputs, name, **attrs):
+        nodes.append(helper.make_node(op, inputs, [name], name=name, **attrs))
+        return name
+
+    def weight(name, array):
+        weights.append(numpy_helper.from_array(np.asarray(array, dtype=np.float32), name))
+        return name
+
+    def activation(x, name, kind):
+        if kind in (None, "linear"):
+            return x
+        if kind not in ACTIVATIONS:
+            raise ValueError(f"Cannot export activation {kind!r} of layer {name}")
+        return node(ACTIVATIONS[kind], [x], f"{name}_{kind}")
+
+    def window(config, size_key):
+        attrs = {"kernel_shape": list(config[size_key]), "strides": list(config["strides"] or config[size_key])}
+        if config.get("padding") == "same":
+            attrs["auto_pad"] = "SAME_UPPER"  # Keras pads the extra row/column at the bottom/right
+        return attrs
+
+    # Keras works in NHWC, ONNX convolutions in NCHW: transpose once at the start, and back before
+    # Flatten so the Dense weights see the features in Keras order
+    x = node("Transpose", ["input"], "to_nchw", perm=[0, 3, 1, 2])
+    nchw = True
+    for layer in model.layers:
+        kind, config, name = type(layer).__name__, layer.get_config(), layer.name
+        if kind in ("InputLayer", "Dropout"):
+            continue
+        if kind == "Conv2D":
+            kernel, *bias = layer.get_weights()
+            inputs = [x, weight(f"{name}_w", kernel.transpose(3, 2, 0, 1))] + ([weight(f"{name}_b", bias[0])] if bias else [])
+            attrs = window(config, "kernel_size")
+            attrs["dilations"] = list(config.get("dilation_rate", (1, 1)))
+            x = activation(node("Conv", inputs, name, **attrs), name, config.get("activation"))
+        elif kind in ("MaxPooling2D", "AveragePooling2D"):
+            x = node("MaxPool" if kind == "MaxPooling2D" else "AveragePool", [x], name, **window(config, "pool_size"))
+        elif kind == "Flatten":
+            if nchw:
+                x = node("Transpose", [x], f"{name}_nhwc", perm=[0, 2, 3, 1])
+                nchw = False
+            x = node("Flatten", [x], name, axis=1)
+        elif kind == "Dense":
+            kernel, *bias = layer.get_weights()
+            inputs = [x, weight(f"{name}_w", kernel)] + ([weight(f"{name}_b", bias[0])] if bias else [])
+            x = activation(node("Gemm", inputs, name), name, config.get("activation"))
+        elif kind == "Activation":
+            x = activation(x, name, config["activation"])
+        else:
+            raise ValueError(f"Cannot export layer {name} ({kind})")
+    nodes[-1].output[0] = "emotion"
+
+    _, height, width, channels = model.input_shape
+    graph = helper.make_graph(
+        nodes, "emotion",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", height, width, channels])],
+        [helper.make_tensor_value_info("emotion", TensorProto.FLOAT, ["batch", int(model.output_shape[-1])])],
+        weights)
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", OPSET)], ir_version=IR_VERSION,
+                             producer_name="emotion_onnx")
+
+
+def export(path, int8_path=None):
+    """Export DeepFace's emotion model to path (and an int8-quantized copy to int8_path). Returns the paths written."""
+    import onnx
+
+    import emotion_detection
+
+    model = keras_to_onnx(emotion_detection.get_emotion_model())
+    onnx.checker.check_model(model)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    onnx.save(model, path)
+    written = [path]
+    if int8_path is not None:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+        written.append(int8_path)
+    return written
+
+
+def parity_faces(count=64, seed=0):
+    """Model inputs for the parity check: the faces in assets/ plus random crops, as an N x 48 x 48 x 1 batch."""
+    import glob
+
+    import emotion_detection
+
+    crops = []
+    for path in sorted(glob.glob(ASSETS)):
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        regions = emotion_detection.detect_faces(frame, "haar") or [{'x': 0, 'y': 0, 'w': frame.shape[1], 'h': frame.shape[0]}]
+        crops += emotion_detection.crop_faces(frame, regions)
+    if not crops:
+        raise FileNotFoundError(f"No labeled faces for the parity check: nothing readable matches {ASSETS}")
+    rng = np.random.default_rng(seed)
+    crops += [rng.integers(0, 256, (64, 64, 3), dtype=np.uint8) for _ in range(count)]
+    return np.stack([emotion_detection.prepare_face(crop) for crop in crops])[..., np.newaxis], len(crops) - count
+
+
+def cmd_export(args):
+    import emotion_detection
+
+    if args.cache_dir is not None:
+        emotion_detection.set_model_cache(args.cache_dir)
+    path = args.output or os.path.join(emotion_detection.weights_dir(), EMOTION_ONNX)
+    int8_path = None
+    if args.int8:
+        int8_path = os.path.join(os.path.dirname(path), os.path.basename(path).replace(".onnx", "_int8.onnx"))
+    for written in export(path, int8_path):
+        print(f"Wrote {written} ({os.path.getsize(written) / 1e6:.1f} MB)")
+    return 0
+
+
+def cmd_check(args):
+    """Compare the exported model's output with DeepFace's Keras model on the same inputs."""
+    import emotion_detection
+
+    if args.cache_dir is not None:
+        emotion_detection.set_model_cache(args.cache_dir)
+    path = args.model or os.path.join(emotion_detection.weights_dir(), EMOTION_ONNX)
+    batch, labeled = parity_faces(args.random)
+    expected = np.asarray(emotion_detection.get_emotion_model()(batch, training=False))
+    actual = np.asarray(load_model(args.backend, path, args.threads)(batch))
+    # Compare as the percentages analysis[0]['emotion'] reports
+    expected = 100.0 * expected / expected.sum(axis=1, keepdims=True)
+    actual = 100.0 * actual / actual.sum(axis=1, keepdims=True)
+    diff = np.abs(expected - actual).max(axis=1)
+    same = expected.argmax(axis=1) == actual.argmax(axis=1)
+    print(f"{path} on {args.backend}: {len(batch)} faces ({labeled} from assets/)")
+    print(f"  max difference {diff.max():.4f} percentage points (mean {diff.mean():.4f})")
+    print(f"  dominant emotion identical on {same.mean() * 100:.1f}% ({same[:labeled].mean() * 100:.0f}% of the assets/ faces)")
+    # Within the tolerance on every emotion, the dominant one can only differ on near-ties
+    ok = diff.max() <= args.tolerance
+    print("  OK" if ok else f"  FAILED (tolerance {args.tolerance} percentage points)")
+    return 0 if ok else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="emotion_onnx", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="Export DeepFace's emotion model to ONNX (needs deepface and onnx)")
+    p.add_argument("--output", help=f"Output file (default: {EMOTION_ONNX} in the model cache)")
+    p.add_argument("--int8", action="store_true", help="Also write an int8-quantized copy (*_int8.onnx, needs onnxruntime)")
+    p.add_argument("--cache-dir", help="Model weights cache (DEEPFACE_HOME)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("check", help="Compare an exported model's output with DeepFace's on assets/ faces and random crops")
+    p.add_argument("--model", help=f"Exported model (default: {EMOTION_ONNX} in the model cache)")
+    p.add_argument("--backend", default="onnxruntime", choices=sorted(BACKENDS))
+    p.add_argument("--threads", type=int)
+    p.add_argument("--random", type=int, default=64, help="Random crops to add to the assets/ faces")
+    p.add_argument("--tolerance", type=float, default=0.01,
+                   help="Largest allowed difference in percentage points (int8 models need a few points)")
+    p.add_argument("--cache-dir", help="Model weights cache (DEEPFACE_HOME)")
+    p.set_defaults(func=cmd_check)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
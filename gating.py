@@ -0,0 +1,70 @@
+"""Cheap change detection so unchanged frames and faces can reuse their previous result."""
+import cv2
+import numpy as np
+
+
+class ChangeGate:
+    """Compares a tiny grayscale thumbnail of an image with the one from the last time it was analyzed.
+
+    changed() is True when the mean absolute difference (in 0-255 gray levels) reaches `threshold`,
+    or the first time a key is seen. The reference thumbnail is only replaced when the image is
+    analyzed again, so slow drift still adds up and eventually triggers an update.
+    """
+
+    def __init__(self, threshold=3.0, size=16):
+        self.threshold = threshold
+        self.size = size
+        self.references = {}  # key -> float32 thumbnail of the last analyzed image
+        self.analyzed_count = 0
+        self.skipped_count = 0
+
+    def thumbnail(self, image):
+        """Downscale first, then convert to gray, so the cost barely depends on the image size."""
+        small = cv2.resize(image, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def changed(self, key, image):
+        """True if image needs analyzing; False if the result stored for key can be reused."""
+        if image.size == 0:
+            return True
+        thumb = self.thumbnail(image)
+        reference = self.references.get(key)
+        if reference is not None and float(np.abs(thumb - reference).mean()) < self.threshold:
+            self.skipped_count += 1
+            return False
+        self.references[key] = thumb
+        self.analyzed_count += 1
+        return True
+
+    def changed_any(self, images):
+        """Like changed() for a dict of key -> image, all judged together: False (reuse) only if every
+        key has a reference and none of the images changed. References are left as they are either
+        way; call reset() once the images have been analyzed."""
+        for key, image in images.items():
+            reference = self.references.get(key)
+            if reference is None or image.size == 0 \
+                    or float(np.abs(self.thumbnail(image) - reference).mean()) >= self.threshold:
+                return True
+        self.skipped_count += 1
+        return False
+
+    def reset(self, images):
+        """Make a dict of key -> image (just analyzed) the only references."""
+        self.references = {key: self.thumbnail(image) for key, image in images.items() if image.size}
+        self.analyzed_count += 1
+
+    def forget(self, keys):
+        """Drop the references of keys that are no longer around (e.g. faces that left)."""
+        for key in [k for k in self.references if k not in keys]:
+            del self.references[key]
+
+    def stats(self):
+        """Return skipped vs analyzed counters."""
+        total = self.analyzed_count + self.skipped_count
+        return {
+            "analyzed": self.analyzed_count,
+            "skipped": self.skipped_count,
+            "skip_ratio": self.skipped_count / total if total else 0.0,
+        }
@@ -0,0 +1,404 @@
+"""Multi-process inference for several cameras: a pool of worker processes fed through shared memory.
+
+Each worker process loads the models once and analyzes frames that the parent copies into
+shared-memory slots, so frames are never pickled; only the small task tuple and the results
+cross the process boundary. Every camera is pinned to one worker, which keeps that camera's
+tracking and smoothing state, and its results are routed back by camera.
+
+Usage (server mode, one line of JSON per face and frame):
+    python -m inference_pool 0 1 rtsp://booth-3/stream --workers 6 -o results.jsonl
+    python -m inference_pool synthetic synthetic --workers 2 --seconds 30
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+def _worker_main(index, names, tasks, results, config):
+    """Worker process: load the models once, then analyze frames from its shared-memory slots."""
+    # Split the cores between the workers instead of every TensorFlow/OpenCV runtime using all of them
+    threads = str(config["threads"])
+    os.environ["TF_NUM_INTRAOP_THREADS"] = threads
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = threads
+    import cv2
+    cv2.setNumThreads(config["threads"])
+    import emotion_detection
+
+    blocks = {}
+    for slot, name in names.items():
+        blocks[slot] = shared_memory.SharedMemory(name=name)  # Spawned children share the parent's resource tracker
+    try:
+        try:
+            emotion_detection.warm_up(config["detector_backend"], config["cache_dir"], config["offline"],
+                                      config["emotion_backend"], config["emotion_model"], config["threads"])
+        except Exception as e:
+            results.put(("error", index, repr(e)))
+            return
+        results.put(("ready", index, None))
+
+        analyzers = {}  # camera -> its own stateful analyzer
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, camera, shape = task
+            if camera not in analyzers:
+                analyzers[camera] = emotion_detection.make_analyzer(
+                    config["detect_interval"], 0.5, config["detector_backend"],
+                    smoothing=config["smoothing"], change_threshold=config["change_threshold"])
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=blocks[slot].buf)
+            start = time.perf_counter()
+            try:
+                analysis = analyzers[camera](frame)
+                error = None
+            except Exception as e:
+                analysis = None
+                error = repr(e)
+            del frame  # Drop the view before the slot is handed back
+            results.put(("result", index, (slot, analysis, error, time.perf_counter() - start)))
+    finally:
+        for block in blocks.values():
+            block.close()
+
+
+class InferencePool:
+    """A pool of inference processes that analyzes frames from many cameras in parallel.
+
+    submit(camera, frame) copies the frame into a free shared-memory slot of the camera's worker
+    and returns False (counting a drop) if there is none, so a slow worker never builds a backlog.
+    A frame that doesn't fit a slot (larger than max_frame_bytes, or not uint8) is rejected with an
+    error result for its camera instead.
+    A worker that dies while running is noticed within a second: the frames it held get error
+    results, and its cameras are pinned to the remaining workers from their next frame on.
+    With two slots per worker the next frame is copied in while the current one is analyzed;
+    one slot gives the freshest results. Results are available per camera from latest_result(),
+    in the same (seq, frame_id, analysis, error) form as AnalysisPipeline, and are also passed
+    to on_result(camera, frame_id, analysis, error) on the collector thread if given.
+    """
+
+    def __init__(self, workers=None, slots_per_worker=2, max_frame_bytes=MAX_FRAME_BYTES,
+                 detector_backend="opencv", detect_interval=10, smoothing="ema", change_threshold=None,
+                 cache_dir=None, offline=False, threads_per_worker=None, on_result=None, metrics=None,
+                 emotion_backend="deepface", emotion_model=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.slots_per_worker = slots_per_worker
+        self.max_frame_bytes = max_frame_bytes
+        self.config = {
+            "detector_backend": detector_backend,
+            "detect_interval": detect_interval,
+            "smoothing": smoothing,
+            "change_threshold": change_threshold,
+            "cache_dir": cache_dir,
+            "offline": offline,
+            "emotion_backend": emotion_backend,
+            "emotion_model": emotion_model,
+            "threads": threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers),
+        }
+        self.on_result = on_result
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._blocks = []
+        self._free = []  # Per worker: free slot numbers
+        self._slots = []  # Per worker: all its slot numbers
+        self._pending = {}  # slot -> (camera, frame_id, captured_at)
+        self._processes = []
+        self._tasks = []
+        self._results = None
+        self._collector = None
+        self._stop = threading.Event()
+
+        self.assignments = {}  # camera -> worker
+        self.cameras = {}  # camera -> counters and latest result
+        self.worker_completed = [0] * self.workers
+        self.worker_busy_s = [0.0] * self.workers
+        self.dead_workers = {}  # worker -> exit code
+
+    def start(self, timeout=600.0):
+        """Create the shared memory, start the workers and wait until every one has its models loaded."""
+        context = multiprocessing.get_context("spawn")  # Fresh interpreters: no forked TensorFlow or thread state
+        self._results = context.Queue()
+        for worker in range(self.workers):
+            names = {}
+            for _ in range(self.slots_per_worker):
+                block = shared_memory.SharedMemory(create=True, size=self.max_frame_bytes)
+                names[len(self._blocks)] = block.name
+                self._blocks.append(block)
+            self._free.append(list(names))
+            self._slots.append(list(names))
+            tasks = context.Queue()
+            process = context.Process(target=_worker_main, name=f"inference-{worker}", daemon=True,
+                                      args=(worker, names, tasks, self._results, self.config))
+            process.start()
+            self._tasks.append(tasks)
+            self._processes.append(process)
+
+        deadline = time.monotonic() + timeout
+        ready = set()
+        while len(ready) < self.workers:
+            try:
+                kind, worker, error = self._results.get(timeout=0.5)
+            except queue.Empty:
+                # A worker that died without a word (killed, crashed in native code) never sends "ready"
+                dead = [(i, p.exitcode) for i, p in enumerate(self._processes) if i not in ready and not p.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    self.stop()
+                    if dead:
+                        raise RuntimeError("Inference workers exited while loading the models: " +
+                                           ", ".join(f"{i} (exit code {code})" for i, code in dead))
+                    raise RuntimeError(f"Inference workers not ready after {timeout:.0f}s")
+                continue
+            if kind == "error":
+                self.stop()
+                raise RuntimeError(f"Inference worker {worker} failed to load the models: {error}")
+            ready.add(worker)
+        self._collector = threading.Thread(target=self._collect_loop, name="pool-results", daemon=True)
+        self._collector.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop the workers and release the shared memory."""
+        self._stop.set()
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout)
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def worker_for(self, camera):
+        """The worker a camera is pinned to, or None if no worker is left.
+
+        New cameras, and cameras whose worker died, go to the live worker with the fewest cameras."""
+        if camera not in self.cameras:
+            self.cameras[camera] = {"submitted": 0, "completed": 0, "dropped": 0, "errors": 0,
+                                    "result": None, "seq": 0}
+        if camera not in self.assignments:
+            load = [float("inf") if worker in self.dead_workers else 0 for worker in range(self.workers)]
+            for worker in self.assignments.values():
+                load[worker] += 1
+            if min(load) == float("inf"):
+                return None
+            self.assignments[camera] = load.index(min(load))
+        return self.assignments[camera]
+
+    def has_free_slot(self, camera):
+        with self._lock:
+            worker = self.worker_for(camera)
+            return worker is not None and bool(self._free[worker])
+
+    def submit(self, camera, frame, frame_id=None, captured_at=None):
+        """Queue a frame for analysis. Returns False if the camera's worker has no free slot (the frame is
+        dropped) or the frame can't be analyzed (it is rejected with an error result)."""
+        error = None
+        if frame.nbytes > self.max_frame_bytes or frame.dtype != np.uint8:
+            error = f"Frame {frame.shape} {frame.dtype} does not fit a {self.max_frame_bytes}-byte uint8 slot"
+        with self._lock:
+            worker = self.worker_for(camera)
+            state = self.cameras[camera]
+            if worker is None and error is None:
+                error = "No inference workers left: " + self._dead_description()
+            if error is None and not self._free[worker]:
+                state["dropped"] += 1
+                return False
+            state["submitted"] += 1
+            frame_id = state["submitted"] if frame_id is None else frame_id
+            if error is None:
+                slot = self._free[worker].pop()
+                self._pending[slot] = (camera, frame_id, captured_at or time.perf_counter())
+            else:
+                state["errors"] += 1
+                state["seq"] += 1
+                state["result"] = (state["seq"], frame_id, None, error)
+        if error is not None:
+            if self.on_result is not None:
+                self.on_result(camera, frame_id, None, error)
+            return False
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self._blocks[slot].buf)[...] = frame
+        self._tasks[worker].put((slot, camera, frame.shape))
+        return True
+
+    def _dead_description(self):
+        return ", ".join(f"worker {i} exited (exit code {code})" for i, code in sorted(self.dead_workers.items()))
+
+    def _reap_dead_workers(self):
+        """Fail the frames held by workers that died and unpin their cameras. Returns the error results to report."""
+        failed = []
+        with self._lock:
+            for worker, process in enumerate(self._processes):
+                if worker in self.dead_workers or process.is_alive():
+                    continue
+                self.dead_workers[worker] = process.exitcode
+                error = f"Inference worker {worker} exited (exit code {process.exitcode})"
+                for slot in self._slots[worker]:
+                    if slot not in self._pending:
+                        continue
+                    camera, frame_id, _ = self._pending.pop(slot)
+                    self._free[worker].append(slot)
+                    state = self.cameras[camera]
+                    state["errors"] += 1
+                    state["seq"] += 1
+                    state["result"] = (state["seq"], frame_id, None, error)
+                    failed.append((camera, frame_id, error))
+                for camera in [c for c, w in self.assignments.items() if w == worker]:
+                    del self.assignments[camera]
+        return failed
+
+    def _collect_loop(self):
+        next_check = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + 0.5
+                for camera, frame_id, error in self._reap_dead_workers():
+                    if self.on_result is not None:
+                        self.on_result(camera, frame_id, None, error)
+            try:
+                kind, worker, payload = self._results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if kind != "result":
+                continue
+            slot, analysis, error, seconds = payload
+            with self._lock:
+                if slot not in self._pending:
+                    continue  # Its worker died after sending this and the frame has already been failed
+                camera, frame_id, captured_at = self._pending.pop(slot)
+                self._free[worker].append(slot)
+                state = self.cameras[camera]
+                state["completed"] += 1
+                state["errors"] += error is not None
+                state["seq"] += 1
+                state["result"] = (state["seq"], frame_id, analysis, error)
+                self.worker_completed[worker] += 1
+                self.worker_busy_s[worker] += seconds
+            if self.metrics is not None:
+                self.metrics.observe("inference", seconds)
+                self.metrics.observe("result_age", time.perf_counter() - captured_at)
+            if self.on_result is not None:
+                self.on_result(camera, frame_id, analysis, error)
+
+    def latest_result(self, camera):
+        """Return (seq, frame_id, analysis, error) of the camera's most recent result, or None."""
+        with self._lock:
+            state = self.cameras.get(camera)
+            return state["result"] if state else None
+
+    def stats(self):
+        """Per-camera submitted/completed/dropped/errors and per-worker completed frames, busy time and
+        exit code (None while it runs)."""
+        with self._lock:
+            return {
+                "cameras": {camera: {k: v for k, v in state.items() if k not in ("result", "seq")}
+                            for camera, state in self.cameras.items()},
+                "workers": [{"completed": n, "busy_s": busy, "cameras": [c for c, w in self.assignments.items() if w == i],
+                             "exit_code": self.dead_workers.get(i)}
+                            for i, (n, busy) in enumerate(zip(self.worker_completed, self.worker_busy_s))],
+            }
+
+
+def serve(sources, out, args):
+    """Feed every source's newest frame to the pool whenever its worker has a free slot; write results as JSON lines."""
+    import emotion_detection
+    from capture import FrameCursor, ThreadedCapture, open_source
+
+    write_lock = threading.Lock()
+    last_errors = {}  # camera -> last error printed, so a camera failing every frame is reported once
+
+    def on_result(camera, frame_id, analysis, error):
+        with write_lock:
+            if error is not None:
+                if last_errors.get(camera) != error:
+                    print(f"camera {camera}: {error}", file=sys.stderr)
+                last_errors[camera] = error
+                return
+            last_errors.pop(camera, None)
+            for face_index, face in enumerate(analysis):
+                record = emotion_detection.to_record(frame_id, sources[camera], face_index, face)
+                out.write(json.dumps(dict(record, camera=camera)) + "\n")
+
+    pool = InferencePool(args.workers, args.slots, detector_backend=args.detector_backend,
+                         detect_interval=args.detect_interval, smoothing=args.smoothing,
+                         change_threshold=args.change_threshold, cache_dir=args.cache_dir,
+                         offline=args.offline, on_result=on_result, threads_per_worker=args.threads,
+                         emotion_backend=args.emotion_backend, emotion_model=args.emotion_model)
+    captures = [ThreadedCapture(open_source(spec)).start() for spec in sources]
+    cursors = [FrameCursor(capture) for capture in captures]
+    print(f"Starting {pool.workers} workers for {len(sources)} cameras...", file=sys.stderr)
+    with pool:
+        start = last_report = time.perf_counter()
+        first = 0
+        try:
+            while args.seconds is None or time.perf_counter() - start < args.seconds:
+                submitted = False
+                first = (first + 1) % len(cursors)  # Rotate so cameras sharing a worker take turns
+                for camera in range(first, first + len(cursors)):
+                    camera %= len(cursors)
+                    cursor = cursors[camera]
+                    if pool.has_free_slot(camera):
+                        item = cursor.next(timeout=0)
+                        if item is not None:
+                            submitted |= pool.submit(camera, item[1], item[0], item[2])
+                if not submitted:
+                    time.sleep(0.002)
+                if time.perf_counter() - last_report >= args.report_interval:
+                    last_report = time.perf_counter()
+                    elapsed = last_report - start
+                    fps = ", ".join(f"cam {c}: {s['completed'] / elapsed:.1f} fps ({s['dropped']} dropped)"
+                                    for c, s in pool.stats()["cameras"].items())
+                    print(f"[{elapsed:.0f}s] {fps}", file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+    for capture in captures:
+        capture.release()
+
+
+def main(argv=None):
+    import emotion_detection
+
+    parser = argparse.ArgumentParser(prog="inference_pool", description=__doc__.splitlines()[0])
+    parser.add_argument("sources", nargs="+", help="One capture source per camera (see capture.open_source)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--slots", type=int, default=2, help="Shared-memory frame slots per worker")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--seconds", type=float, help="Stop after this many seconds (default: until Ctrl+C)")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--detect-interval", type=int, default=10)
+    parser.add_argument("--smoothing", default="ema", choices=["none", "ema", "median"])
+    parser.add_argument("--change-threshold", type=float)
+    emotion_detection.add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        serve(args.sources, out, args)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""Leaderboard storage: SQLite on disk, bounded top-k boards and a compact score history in memory."""
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    score REAL NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scores_score ON scores (score DESC);
+CREATE INDEX IF NOT EXISTS idx_scores_expression_score ON scores (expression, score DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class LeaderboardStore:
+    """Scores in an SQLite database with indexes on score and (expression, score).
+
+    Inserts are O(log n) B-tree updates, each in its own transaction, and top-N queries walk the
+    index, so neither depends on how many games have been played. The database runs in WAL mode
+    with synchronous=FULL: a crash mid-write leaves the previous state intact, never a torn file.
+    """
+
+    def __init__(self, path="leaderboard.db", legacy_json=None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+        if legacy_json is not None:
+            self.import_json(legacy_json)
+
+    def import_json(self, json_path):
+        """Import the old leaderboard.json (a list of [name, expression, score]) once."""
+        if not os.path.isfile(json_path):
+            return 0
+        key = f"imported:{os.path.abspath(json_path)}"
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        try:
+            with open(json_path, "r") as f:
+                rows = json.load(f)
+        except json.JSONDecodeError:
+            rows = []  # A corrupted file is skipped, like load_leaderboard() used to do
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO scores (name, expression, score, created) VALUES (?, ?, ?, ?)",
+                [(name, expression, float(score), now) for name, expression, score in rows])
+            self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(len(rows))))
+        return len(rows)
+
+    def add(self, name, expression, score):
+        """Record one game. Returns the new row id."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO scores (name, expression, score, created) VALUES (?, ?, ?, ?)",
+                (name, expression, float(score), time.time()))
+        return cursor.lastrowid
+
+    def top(self, limit=10, expression=None):
+        """Best scores as (name, expression, score) tuples, overall or for one expression."""
+        if expression is None:
+            cursor = self.conn.execute(
+                "SELECT name, expression, score FROM scores ORDER BY score DESC, id LIMIT ?", (limit,))
+        else:
+            cursor = self.conn.execute(
+                "SELECT name, expression, score FROM scores WHERE expression = ? ORDER BY score DESC, id LIMIT ?",
+                (expression, limit))
+        return cursor.fetchall()
+
+    def rank(self, score, expression=None):
+        """1-based rank a score would have, overall or within one expression."""
+        if expression is None:
+            row = self.conn.execute("SELECT COUNT(*) FROM scores WHERE score > ?", (score,)).fetchone()
+        else:
+            row = self.conn.execute("SELECT COUNT(*) FROM scores WHERE expression = ? AND score > ?",
+                                    (expression, score)).fetchone()
+        return row[0] + 1
+
+    def count(self, expression=None):
+        """Number of recorded games."""
+        if expression is None:
+            return self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM scores WHERE expression = ?", (expression,)).fetchone()[0]
+
+    def scores(self, codes=None, last_id=None):
+        """Yield (score, expression, created) for every recorded game (up to row last_id), oldest first.
+
+        With codes (expression -> int), SQLite returns each expression as its code instead.
+        """
+        expression, params = "expression", []
+        if codes:
+            expression = "CASE expression " + " ".join("WHEN ? THEN ?" for _ in codes) + " END"
+            for name, code in codes.items():
+                params += [name, code]
+        where = ""
+        if last_id is not None:
+            where = " WHERE id <= ?"
+            params.append(last_id)
+        return self.conn.execute(f"SELECT score, {expression}, created FROM scores{where} ORDER BY id", params)
+
+    def last_id(self):
+        """Row id of the newest game (0 if there are none)."""
+        return self.conn.execute("SELECT MAX(id) FROM scores").fetchone()[0] or 0
+
+    def expressions(self):
+        """Distinct expressions that have scores."""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT expression FROM scores")]
+
+    def close(self):
+        self.conn.close()
+
+
+class ScoreRecord:
+    """One leaderboard entry. __slots__ keeps each record small."""
+
+    __slots__ = ("score", "seq", "name", "expression")
+
+    def __init__(self, score, seq, name, expression):
+        self.score = score
+        self.seq = seq
+        self.name = name
+        self.expression = expression
+
+    def key(self):
+        # Higher scores first; for equal scores, the earlier game ranks higher
+        return (-self.score, self.seq)
+
+
+class TopK:
+    """The best k records, kept sorted with bisect insertion."""
+
+    def __init__(self, k=10):
+        self.k = k
+        self._keys = []
+        self.records = []
+
+    def add(self, record):
+        """Insert a record. Returns (rank, evicted): the 0-based rank it got, or None if it didn't
+        make the top k, and the record that fell off the end, if any."""
+        key = record.key()
+        rank = bisect.bisect_left(self._keys, key)
+        if rank >= self.k:
+            return None, None
+        self._keys.insert(rank, key)
+        self.records.insert(rank, record)
+        evicted = None
+        if len(self.records) > self.k:
+            self._keys.pop()
+            evicted = self.records.pop()
+        return rank, evicted
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+def history_dtype():
+    """Every historical score as 13 bytes: enough for millions of games in a few tens of MB."""
+    import numpy as np
+
+    return np.dtype([("score", np.float32), ("expression", np.uint8), ("created", np.float64)])
+
+
+class ScoreHistory:
+    """All scores in a growable NumPy structured array, for ranks and percentiles over the full history.
+
+    NumPy is imported here rather than at module level: ed.py imports this module before its window
+    appears, and the history is only needed once a game ends.
+    """
+
+    def __init__(self, capacity=1024):
+        import numpy as np
+
+        self.data = np.empty(capacity, dtype=history_dtype())
+        self.size = 0
+        self.codes = {}  # expression -> uint8 code
+
+    def code(self, expression):
+        if expression not in self.codes:
+            self.codes[expression] = len(self.codes)
+        return self.codes[expression]
+
+    def _reserve(self, size):
+        import numpy as np
+
+        if size > len(self.data):
+            self.data = np.resize(self.data, max(size, 2 * len(self.data)))  # Amortized O(1) appends
+
+    def append(self, score, expression, created):
+        self._reserve(self.size + 1)
+        self.data[self.size] = (score, self.code(expression), created)
+        self.size += 1
+
+    def extend(self, rows):
+        """Append (score, expression code, created) rows, e.g. a LeaderboardStore.scores(self.codes)
+        cursor, with np.fromiter: no Python code runs per row."""
+        import numpy as np
+
+        new = np.fromiter(rows, dtype=history_dtype())
+        self._reserve(self.size + len(new))
+        self.data[self.size:self.size + len(new)] = new
+        self.size += len(new)
+
+    def rank(self, score, expression=None):
+        """1-based rank of a score (vectorized count of better scores) and the number of scores compared."""
+        import numpy as np
+
+        view = self.data[:self.size]
+        if expression is not None:
+            view = view[view["expression"] == self.codes.get(expression, -1)]
+        return int(np.count_nonzero(view["score"] > np.float32(score))) + 1, len(view)
+
+
+class Leaderboard:
+    """In-memory top-k boards (overall and per expression) in front of a LeaderboardStore.
+
+    add() reports where the new score landed on each board and which entry fell off, so the
+    UI can apply a single insert/delete instead of redrawing the list. The full score history
+    is loaded into a ScoreHistory by preload_history() on a background thread (ranks come from
+    SQLite until it is done), or else the first time a rank over all games is asked for.
+    """
+
+    def __init__(self, store=None, k=10):
+        self.store = store
+        self.k = k
+        self.seq = 0
+        self.overall = TopK(k)
+        self.by_expression = {}
+        self.history = None
+        self._history_lock = threading.Lock()
+        self._loader = None  # Thread running _preload()
+        self._pending = []  # (row id, score, expression, created) of games added while it runs
+        if store is not None:
+            for name, expression, score in store.top(k):
+                self._add_to_boards(self.overall, name, expression, score)
+            for expression in store.expressions():
+                for name, _, score in store.top(k, expression=expression):
+                    self._add_to_boards(self.board(expression), name, expression, score)
+
+    def board(self, expression=None):
+        """The top-k board for one expression, or the overall board."""
+        if expression is None:
+            return self.overall
+        if expression not in self.by_expression:
+            self.by_expression[expression] = TopK(self.k)
+        return self.by_expression[expression]
+
+    def _add_to_boards(self, board, name, expression, score):
+        self.seq += 1
+        return board.add(ScoreRecord(float(score), self.seq, name, expression))
+
+    def add(self, name, expression, score):
+        """Record a game. Returns {'rank', 'evicted', 'expression_rank', 'expression_evicted'} (ranks 0-based or None)."""
+        score = float(score)
+        created = time.time()
+        rowid = self.store.add(name, expression, score) if self.store is not None else None
+        with self._history_lock:
+            if self.history is not None:
+                self.history.append(score, expression, created)
+            elif self._loader is not None:
+                self._pending.append((rowid, score, expression, created))
+        self.seq += 1
+        rank, evicted = self.overall.add(ScoreRecord(score, self.seq, name, expression))
+        expression_rank, expression_evicted = self.board(expression).add(ScoreRecord(score, self.seq, name, expression))
+        return {"rank": rank, "evicted": evicted,
+                "expression_rank": expression_rank, "expression_evicted": expression_evicted}
+
+    @staticmethod
+    def _read_history(store):
+        """A ScoreHistory of every game in store, and the row id of the last one."""
+        history = ScoreHistory()
+        last_id = store.last_id()  # First, so every expression up to it is in the list read next
+        for expression in store.expressions():
+            history.code(expression)
+        history.extend(store.scores(history.codes, last_id))
+        return history, last_id
+
+    def preload_history(self):
+        """Start loading the score history on a background thread, with its own database connection."""
+        if self.store is None or self.store.path == ":memory:" or self.history is not None or self._loader is not None:
+            return
+        self._loader = threading.Thread(target=self._preload, name="history", daemon=True)
+        self._loader.start()
+
+    def _preload(self):
+        store = LeaderboardStore(self.store.path)
+        try:
+            history, last_id = self._read_history(store)
+        finally:
+            store.close()
+        with self._history_lock:
+            for rowid, score, expression, created in self._pending:
+                if rowid > last_id:  # Added after the history was read
+                    history.append(score, expression, created)
+            self._pending = []
+            self.history = history
+
+    def load_history(self):
+        """The ScoreHistory of every stored score: waits for preload_history(), or loads it now."""
+        if self.history is None and self._loader is not None:
+            self._loader.join()
+        with self._history_lock:
+            if self.history is None:  # Not preloaded, or the preload failed
+                self.history = self._read_history(self.store)[0] if self.store is not None else ScoreHistory()
+                self._loader, self._pending = None, []
+        return self.history
+
+    def rank_in_history(self, score, expression=None):
+        """1-based rank of a score among all recorded games, and how many games there are."""
+        if self.history is None and self._loader is not None and self._loader.is_alive():
+            return self.store.rank(score, expression), self.store.count(expression)  # Still loading: ask SQLite
+        return self.load_history().rank(score, expression)
@@ -0,0 +1,234 @@
+"""Producer/consumer pipeline that keeps DeepFace inference off the Tk main loop."""
+import queue
+import threading
+import time
+
+from capture import FrameCursor, ThreadedCapture
+
+RECORD_QUEUE = 8  # Analyzed frames waiting for the recording thread before new ones are dropped
+
+
+class AnalysisPipeline:
+    """Capture thread -> inference worker -> latest result, with the display fed straight from capture.
+
+    A capture.ThreadedCapture reads frames as fast as the camera delivers them and keeps only the
+    newest. The Tk render loop and the inference worker each read it through their own FrameCursor:
+    the worker always analyzes the newest frame, and frames that arrive while it is busy are
+    dropped and counted. `cap` can be a ThreadedCapture or any source with a read() method.
+
+    If given, warm_up() runs on the inference thread before the first frame is analyzed, so
+    model loading never blocks the UI; `ready` is set once it has finished.
+
+    With a telemetry.Metrics object, the camera read ("capture"), each analysis ("inference") and
+    the age of each result since its frame was captured ("result_age") are recorded as histograms.
+
+    With a recording.SessionRecorder, every analyzed frame and its results are handed to a
+    recording thread through a queue of RECORD_QUEUE frames, so JPEG encoding and disk writes
+    never delay the next analysis; each write is timed as "record". Frames the worker dropped are
+    not recorded, and neither are frames that arrive while the queue is full (counted in
+    `recording_dropped`). The pipeline owns the recorder from then on: it is closed once the
+    inference thread has exited and the queue is written, and if a write fails (the frame size
+    changed, the disk is full) recording stops with the error in `recording_error` while the
+    analysis carries on.
+
+    With a quality.QualityController, every result's age is reported to it and it is updated with
+    the display and camera FPS after each analysis; its detection scale and interval are
+    applied to the analyzer and its inference rate limit to the worker loop.
+    """
+
+    def __init__(self, cap, analyze, warm_up=None, metrics=None, recorder=None, quality=None):
+        self.capture = cap if isinstance(cap, ThreadedCapture) else ThreadedCapture(cap)
+        if self.capture.metrics is None:
+            self.capture.metrics = metrics
+        self.analyze = analyze
+        self.warm_up = warm_up
+        self.metrics = metrics
+        self.recorder = recorder
+        self.recording_error = None
+        self.recording_dropped = 0
+        self._recorder_lock = threading.Lock()
+        self._record_queue = queue.Queue(RECORD_QUEUE)
+        self._recording_thread = None
+        self.quality = quality
+        if quality is not None:
+            quality.attach(analyze)
+        self.ready = threading.Event()
+        self.display_cursor = FrameCursor(self.capture)
+        self.inference_cursor = FrameCursor(self.capture)
+
+        self._result_lock = threading.Lock()
+        self._result = None
+        self._result_seq = 0
+
+        self._stop = threading.Event()
+        self._threads = []
+        self.inference_count = 0
+        self.inference_errors = 0
+        self.last_inference_time = 0.0
+        self.inference_seconds = 0.0  # Total time the worker spent analyzing
+
+    def start(self):
+        """Start the capture and inference threads."""
+        self.capture.start()
+        self._threads = [threading.Thread(target=self._inference_loop, name="inference", daemon=True)]
+        if self.recorder is not None:
+            self._recording_thread = threading.Thread(target=self._recording_loop, name="recording", daemon=True)
+            self._threads.append(self._recording_thread)
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        """Signal both threads to finish and wait for them.
+
+        The recorder is closed here if the threads have exited (or never started); otherwise the
+        recording thread closes it itself once the inference thread is done.
+        """
+        self._stop.set()
+        self.capture.stop(timeout)
+        for thread in self._threads:
+            thread.join(timeout)
+        if not any(thread.is_alive() for thread in self._threads):
+            self._close_recorder()
+
+    def _close_recorder(self):
+        with self._recorder_lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            try:
+                recorder.close()
+            except OSError as e:
+                print(f"Could not close the recording: {e}")
+
+    def _record(self, frame_id, frame, analysis):
+        try:
+            self._record_queue.put_nowait((frame_id, frame, analysis, time.time()))
+        except queue.Full:
+            self.recording_dropped += 1
+
+    def _recording_loop(self):
+        try:
+            while True:
+                item = self._record_queue.get()
+                if item is None:
+                    break
+                if self.recorder is None:
+                    continue  # Stopped after an error: drain until the inference thread is done
+                start = time.perf_counter()
+                try:
+                    self.recorder.write(*item)
+                except (ValueError, OSError) as e:
+                    self.recording_error = e
+                    print(f"Recording stopped: {e}")
+                    self._close_recorder()
+                if self.metrics is not None:
+                    self.metrics.observe("record", time.perf_counter() - start)
+        finally:
+            self._close_recorder()
+
+    def _inference_loop(self):
+        try:
+            self._analyze_frames()
+        finally:
+            if self._recording_thread is not None:
+                self._record_queue.put(None)  # The recording thread writes what is queued, then closes
+            else:
+                self._close_recorder()
+
+    def _analyze_frames(self):
+        if self.warm_up is not None:
+            try:
+                self.warm_up()
+            except Exception as e:
+                self.inference_errors += 1
+                self._publish(0, None, e)
+                return  # Without models there is nothing to analyze
+        self.ready.set()
+
+        start = 0.0
+        while not self._stop.is_set():
+            limit = self.quality.max_inference_fps if self.quality is not None else None
+            if limit and self._stop.wait(start + 1.0 / limit - time.perf_counter()):
+                break  # Rate limited: wait before taking a frame, so the frame is as new as possible
+            item = self.inference_cursor.next(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, frame, captured_at = item
+            start = time.perf_counter()
+            try:
+                analysis = self.analyze(frame)
+                error = None
+            except Exception as e:
+                analysis = None
+                error = e
+                self.inference_errors += 1
+            self.last_inference_time = time.perf_counter() - start
+            self.inference_seconds += self.last_inference_time
+            self.inference_count += 1
+            result_age = time.perf_counter() - captured_at
+            if self.metrics is not None:
+                self.metrics.observe("inference", self.last_inference_time)
+                self.metrics.observe("result_age", result_age)
+            if self.quality is not None:
+                self.quality.observe(result_age)
+                display_fps = self.display_cursor.rate.rate() if self.display_cursor.taken else None
+                if self.quality.update(display_fps, self.capture.camera_rate.rate()):
+                    self.quality.apply(self.analyze)
+            if self.recorder is not None:
+                self._record(frame_id, frame, analysis)
+            self._publish(frame_id, analysis, error)
+
+    def _publish(self, frame_id, analysis, error):
+        with self._result_lock:
+            self._result_seq += 1
+            self._result = (self._result_seq, frame_id, analysis, error)
+
+    def latest_frame(self):
+        """Return (frame_id, frame, captured_at) for the newest unseen camera frame, or None."""
+        return self.display_cursor.next(timeout=0)
+
+    def latest_result(self):
+        """Return (seq, frame_id, analysis, error) for the most recent inference, or None."""
+        with self._result_lock:
+            return self._result
+
+    def stats(self):
+        """Return camera FPS, per-consumer depth, drop counters and FPS, plus inference timing."""
+        capture = self.capture.stats()
+        stats = {
+            "frames_captured": capture["frames"],
+            "read_failures": capture["read_failures"],
+            "camera_fps": capture["camera_fps"],
+            "display": self.display_cursor.stats(),
+            "inference": dict(
+                self.inference_cursor.stats(),
+                completed=self.inference_count,
+                errors=self.inference_errors,
+                last_ms=self.last_inference_time * 1000.0,
+                busy_s=self.inference_seconds,
+            ),
+        }
+        if self._recording_thread is not None:
+            stats["recording"] = {"queued": self._record_queue.qsize(), "dropped": self.recording_dropped,
+                                  "error": self.recording_error}
+        if hasattr(self.analyze, "stats"):
+            stats["analyzer"] = self.analyze.stats()
+        return stats
+
+    def counters(self):
+        """Flat frame and drop counters, as a telemetry.Metrics source."""
+        stats = self.stats()
+        counters = {
+            "frames_captured": stats["frames_captured"],
+            "read_failures": stats["read_failures"],
+            "frames_dropped_display": stats["display"]["dropped"],
+            "frames_dropped_inference": stats["inference"]["dropped"],
+            "inference_completed": stats["inference"]["completed"],
+            "inference_errors": stats["inference"]["errors"],
+            "camera_fps": stats["camera_fps"],
+            "display_fps": stats["display"]["fps"],
+            "inference_fps": stats["inference"]["fps"],
+        }
+        if "analyzer" in stats:
+            counters["faces_classified"] = stats["analyzer"]["classified_faces"]
+            counters["faces_reused"] = stats["analyzer"]["skipped_faces"]
+        return counters
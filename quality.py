@@ -0,0 +1,184 @@
+"""Adaptive quality: trade analysis resolution, detection rate and inference rate for a steady display FPS and fresh results."""
+import time
+from collections import deque
+
+from telemetry import LatencyHistogram
+
+SCALES = (1.0, 0.75, 0.5)  # Detection scale per level, relative to the configured one
+MIN_DETECT_SCALE = 0.5  # Never detect on a smaller copy than this (small faces would be missed), unless configured lower
+RATE_LIMITS = (None, 15.0, 10.0, 6.0, 3.0)  # Maximum analyses per second, per level (None: as fast as possible)
+KNOB_NAMES = {"scale": "detection scale", "detect": "detection interval", "rate": "inference rate"}
+
+
+class QualityController:
+    """Feedback loop that steps analysis quality down when the machine can't keep up, and back up when it can.
+
+    Every `interval` seconds it compares the display FPS with target_fps (capped at what the camera
+    delivers) and the 95th percentile result age (capture to result) with max_staleness, then moves
+    at most one knob one step:
+
+      results too stale (each analysis takes too long): detect faces on a smaller copy of the frame
+          (detect_scale, not below min_detect_scale), then run the full detection less often (detect_interval doubles, up to
+          max_detect_interval)
+      display too slow (analysis starves the Tk loop of CPU): cap the inference rate, then downscale
+      both: downscale first, it helps with both
+
+    Once both targets have been met with room to spare for `patience` intervals in a row, the most
+    recent step is undone. A step that has to be taken again right after being undone doubles the
+    patience (up to 8x) so the controller doesn't oscillate around a level the machine can't hold.
+    Each decision is passed to `log` with its reason; the last 100 are kept in `decisions`.
+    """
+
+    def __init__(self, target_fps=24.0, max_staleness=0.5, detect_interval=10, max_detect_interval=60,
+                 interval=2.0, patience=3, headroom=0.7, log=print, detect_scale=1.0, min_detect_scale=MIN_DETECT_SCALE):
+        self.target_fps = target_fps
+        self.max_staleness = max_staleness
+        self.base_detect_interval = detect_interval
+        self.base_detect_scale = detect_scale
+        self.min_detect_scale = min(detect_scale, min_detect_scale)  # A configured scale below the floor is kept
+        self.max_detect_interval = max_detect_interval
+        self.interval = interval
+        self.base_patience = patience
+        self.patience = patience
+        self.headroom = headroom
+        self.log = log
+        self.levels = {"scale": 0, "detect": 0, "rate": 0}
+        self.supported = {"scale": True, "detect": True, "rate": True}
+        self.steps = []  # Knobs stepped down, most recent last
+        self.decisions = deque(maxlen=100)  # (time.time(), text)
+        self.decision_count = 0
+        self.ages = LatencyHistogram()  # Result ages since the last update
+        self.calm = 0  # Updates in a row with both targets met with headroom
+        self.restored = None  # Knob restored at the last update
+        self.last_update = time.perf_counter()
+        self.at_floor = False
+
+    def _scale_at(self, level):
+        return max(self.base_detect_scale * SCALES[level], self.min_detect_scale)
+
+    @property
+    def detect_scale(self):
+        return self._scale_at(self.levels["scale"])
+
+    @property
+    def detect_interval(self):
+        return min(self.base_detect_interval * 2 ** self.levels["detect"], self.max_detect_interval)
+
+    @property
+    def max_inference_fps(self):
+        return RATE_LIMITS[self.levels["rate"]]
+
+    def attach(self, analyzer):
+        """Only use the knobs an analyzer has (a RemoteAnalyzer has neither detect_scale nor detect_interval)."""
+        self.supported["scale"] = hasattr(analyzer, "detect_scale")
+        self.supported["detect"] = hasattr(analyzer, "detect_interval")
+        self.apply(analyzer)
+
+    def apply(self, analyzer):
+        """Set the analyzer's detection scale and interval to the current levels."""
+        if self.supported["scale"]:
+            analyzer.detect_scale = self.detect_scale
+        if self.supported["detect"]:
+            analyzer.detect_interval = self.detect_interval
+
+    def observe(self, result_age):
+        self.ages.observe(result_age)
+
+    def _can_lower(self, knob):
+        if not self.supported[knob]:
+            return False
+        if knob == "scale":
+            level = self.levels["scale"]
+            return level + 1 < len(SCALES) and self._scale_at(level + 1) < self._scale_at(level)
+        if knob == "rate":
+            return self.levels["rate"] + 1 < len(RATE_LIMITS)
+        return self.detect_interval < self.max_detect_interval
+
+    def _value(self, knob):
+        if knob == "scale":
+            return f"{self.detect_scale:.2f}"
+        if knob == "detect":
+            return f"{self.detect_interval} frames"
+        return "unlimited" if self.max_inference_fps is None else f"{self.max_inference_fps:g} fps"
+
+    def _step(self, knob, direction, reason):
+        before = self._value(knob)
+        self.levels[knob] += direction
+        return self._note(f"Quality: {KNOB_NAMES[knob]} {before} -> {self._value(knob)} ({reason})")
+
+    def _note(self, text):
+        self.decisions.append((time.time(), text))
+        self.decision_count += 1
+        if self.log is not None:
+            self.log(text)
+        return text
+
+    def update(self, display_fps=None, camera_fps=None, now=None):
+        """Re-evaluate the targets if `interval` has passed. Returns the decisions taken (usually none).
+
+        display_fps None means there is no display to keep smooth (only staleness counts).
+        """
+        now = time.perf_counter() if now is None else now
+        if now - self.last_update < self.interval:
+            return []
+        self.last_update = now
+        staleness = self.ages.percentile(95) if self.ages.count else None
+        self.ages = LatencyHistogram()
+        target = self.target_fps
+        if camera_fps:
+            target = min(target, camera_fps * 0.9)  # The display can't beat the camera
+
+        stale = staleness is not None and staleness > self.max_staleness
+        slow = display_fps is not None and display_fps < target * 0.9
+        reasons = []
+        if stale:
+            reasons.append(f"result age p95 {staleness * 1000:.0f} ms > {self.max_staleness * 1000:.0f} ms")
+        if slow:
+            reasons.append(f"display {display_fps:.1f} fps < {target:.1f}")
+
+        if stale or slow:
+            self.calm = 0
+            order = ["scale", "rate", "detect"] if stale and slow else ["scale", "detect"] if stale else ["rate", "scale"]
+            knob = next((k for k in order if self._can_lower(k)), None)
+            if knob is None:
+                if not self.at_floor:
+                    self.at_floor = True
+                    return [self._note(f"Quality: already at the lowest settings ({', '.join(reasons)})")]
+                return []
+            if knob == self.restored:
+                self.patience = min(self.patience * 2, self.base_patience * 8)
+            self.restored = None
+            self.steps.append(knob)
+            return [self._step(knob, +1, ", ".join(reasons))]
+
+        self.at_floor = False
+        self.restored = None
+        calm = (display_fps is None or display_fps >= target * 0.97) \
+            and (staleness is None or staleness < self.max_staleness * self.headroom)
+        self.calm = self.calm + 1 if calm else 0
+        if self.calm < self.patience or not self.steps:
+            return []
+        reason = f"display {display_fps:.1f} fps" if display_fps is not None else "no display"
+        if staleness is not None:
+            reason += f", result age p95 {staleness * 1000:.0f} ms"
+        reason += f" for {self.calm * self.interval:.0f}s"
+        self.calm = 0
+        knob = self.steps.pop()
+        self.restored = knob
+        if not self.steps:
+            self.patience = self.base_patience
+        return [self._step(knob, -1, reason)]
+
+    def summary(self):
+        """One line with the current settings, for the overlay."""
+        return (f"quality: detection scale {self._value('scale')}, detect every {self._value('detect')}, "
+                f"inference {self._value('rate')}")
+
+    def counters(self):
+        """Current levels as a telemetry.Metrics source."""
+        return {
+            "quality_detect_scale": self.detect_scale,
+            "quality_detect_interval": self.detect_interval,
+            "quality_max_inference_fps": self.max_inference_fps or 0,
+            "quality_decisions": self.decision_count,
+        }
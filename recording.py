@@ -0,0 +1,408 @@
+"""Session recording and replay: frames (or face ROIs) in a chunked store, analysis results in float32 columns.
+
+A recording is a directory:
+
+    session.json          format, frame shape, storage mode, chunk size
+    frames_00000.bin ...  raw BGR frames, chunk_frames per file (storage "raw", memory-mapped on replay)
+                          or concatenated JPEGs (storage "jpeg") or fixed-size face crops (storage "roi")
+    <column>.bin          one flat little-endian array per column (see FRAME_COLUMNS and FACE_COLUMNS)
+
+Columns are appended as the session runs and read back with np.memmap, so a reader gets them
+without parsing or copying: emotion is an M x 7 float32 array in EMOTIONS order, region is M x 4
+(x, y, w, h). face_start/face_count give each frame's rows in the face columns.
+
+Usage:
+    python -m recording record 0 sessions/booth --storage jpeg --limit 900
+    python -m recording replay sessions/booth --detector-backend yunet
+    python -m recording info sessions/booth
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from emotion_detection import EMOTIONS, emotion_dict, emotion_vector
+
+FORMAT_VERSION = 1
+STORAGE_MODES = ("raw", "jpeg", "roi", "none")
+FRAME_STORAGES = ("raw", "jpeg")  # The modes that keep whole frames, so the recording can be played back
+
+# name -> (dtype, values per row)
+FRAME_COLUMNS = {
+    "frame_id": ("<i8", 1),
+    "timestamp": ("<f8", 1),
+    "face_start": ("<i8", 1),
+    "face_count": ("<i4", 1),
+    "jpeg_offset": ("<i8", 1),  # Storage "jpeg" only: byte offset and length in the frame's chunk
+    "jpeg_length": ("<i8", 1),
+}
+FACE_COLUMNS = {
+    "frame_row": ("<i8", 1),
+    "face_id": ("<i4", 1),  # -1 when the analyzer gave no track ID
+    "emotion": ("<f4", len(EMOTIONS)),
+    "region": ("<f4", 4),
+    "confidence": ("<f4", 1),
+    "dominant": ("u1", 1),
+}
+
+
+def chunk_path(path, index):
+    return os.path.join(path, f"frames_{index:05d}.bin")
+
+
+class SessionRecorder:
+    """Appends frames and their analysis results to a recording directory.
+
+    storage is "raw" (uncompressed frames, replayed zero-copy), "jpeg" (about 10x smaller,
+    decoded on replay), "roi" (only each face, resized to roi_size x roi_size) or "none"
+    (results only). Only "raw" and "jpeg" recordings can be replayed.
+    """
+
+    def __init__(self, path, storage="raw", chunk_frames=256, jpeg_quality=90, roi_size=96):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage {storage!r}, expected one of {STORAGE_MODES}")
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, "session.json")):
+            raise FileExistsError(f"{path} already holds a recording")
+        self.path = path
+        self.storage = storage
+        self.chunk_frames = chunk_frames
+        self.jpeg_quality = jpeg_quality
+        self.roi_size = roi_size
+        self.frame_shape = None
+        self.frames = 0
+        self.faces = 0
+        self._chunk = None
+        self._chunk_index = -1
+        self._chunk_bytes = 0
+        self._columns = {name: open(os.path.join(path, f"{name}.bin"), "ab")
+                         for name in list(FRAME_COLUMNS) + list(FACE_COLUMNS)}
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            "version": FORMAT_VERSION,
+            "storage": self.storage,
+            "chunk_frames": self.chunk_frames,
+            "frame_shape": list(self.frame_shape) if self.frame_shape else None,
+            "roi_size": self.roi_size,
+            "emotions": EMOTIONS,
+            "columns": {name: list(spec) for name, spec in {**FRAME_COLUMNS, **FACE_COLUMNS}.items()},
+            "frames": self.frames,
+            "faces": self.faces,
+        }
+        tmp = os.path.join(self.path, "session.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, "session.json"))
+
+    def _append(self, name, values):
+        dtype, _ = {**FRAME_COLUMNS, **FACE_COLUMNS}[name]
+        self._columns[name].write(np.asarray(values, dtype=dtype).tobytes())
+
+    def _chunk_for(self, row):
+        index = row // self.chunk_frames
+        if index != self._chunk_index:
+            if self._chunk is not None:
+                self._chunk.close()
+            self._chunk = open(chunk_path(self.path, index), "ab")
+            self._chunk_index = index
+            self._chunk_bytes = 0
+        return self._chunk
+
+    def write(self, frame_id, frame, analysis, timestamp=None):
+        """Record one analyzed frame and its faces (analysis may be None after an analysis error)."""
+        analysis = analysis or []
+        if self.frame_shape is None:
+            self.frame_shape = frame.shape
+            self._write_meta()
+        elif frame.shape != self.frame_shape and self.storage in ("raw", "jpeg"):
+            raise ValueError(f"Frame size changed from {self.frame_shape} to {frame.shape} during the recording")
+
+        row = self.frames
+        offset = length = 0
+        if self.storage == "raw":
+            self._chunk_for(row).write(np.ascontiguousarray(frame).data)
+        elif self.storage == "jpeg":
+            _, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            chunk = self._chunk_for(row)
+            offset, length = self._chunk_bytes, len(encoded)
+            chunk.write(encoded.data)
+            self._chunk_bytes += length
+
+        self._append("frame_id", [frame_id])
+        self._append("timestamp", [time.time() if timestamp is None else timestamp])
+        self._append("face_start", [self.faces])
+        self._append("face_count", [len(analysis)])
+        self._append("jpeg_offset", [offset])
+        self._append("jpeg_length", [length])
+
+        for face in analysis:
+            region = face['region']
+            box = [region['x'], region['y'], region['w'], region['h']]
+            vector = emotion_vector(face['emotion'])
+            self._append("frame_row", [row])
+            self._append("face_id", [face.get('face_id') if face.get('face_id') is not None else -1])
+            self._append("emotion", vector)
+            self._append("region", box)
+            self._append("confidence", [face.get('face_confidence', 0.0)])
+            self._append("dominant", [EMOTIONS.index(face['dominant_emotion'])])
+            if self.storage == "roi":
+                self._chunk_for(self.faces).write(self._roi(frame, box).data)
+            self.faces += 1
+        self.frames += 1
+
+    def _roi(self, frame, box):
+        x, y, w, h = (int(v) for v in box)
+        height, width = frame.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        crop = frame[y0:min(y + h, height), x0:min(x + w, width)]
+        if crop.size == 0:
+            return np.zeros((self.roi_size, self.roi_size, 3), dtype=np.uint8)
+        return cv2.resize(crop, (self.roi_size, self.roi_size), interpolation=cv2.INTER_AREA)
+
+    def flush(self):
+        for f in self._columns.values():
+            f.flush()
+        if self._chunk is not None:
+            self._chunk.flush()
+
+    def close(self):
+        for f in self._columns.values():
+            f.close()
+        if self._chunk is not None:
+            self._chunk.close()
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionReader:
+    """Memory-mapped read access to a recording: the columns as NumPy arrays and the frames as views."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "session.json")) as f:
+            self.meta = json.load(f)
+        self.storage = self.meta["storage"]
+        self.chunk_frames = self.meta["chunk_frames"]
+        self.frame_shape = tuple(self.meta["frame_shape"] or ())
+        # Row counts come from the column files (the shortest one wins), so a recording cut short
+        # by a crash is still readable up to its last complete row
+        self.frames = min(self._rows(name) for name in FRAME_COLUMNS)
+        self.faces = min(self._rows(name) for name in FACE_COLUMNS)
+        for name in FRAME_COLUMNS:
+            setattr(self, name, self._map(name, self.frames))
+        for name in FACE_COLUMNS:
+            setattr(self, name, self._map(name, self.faces))
+        self._chunks = {}
+
+    def _rows(self, name):
+        dtype, width = {**FRAME_COLUMNS, **FACE_COLUMNS}[name]
+        return os.path.getsize(os.path.join(self.path, f"{name}.bin")) // (np.dtype(dtype).itemsize * width)
+
+    def _map(self, name, rows):
+        dtype, width = {**FRAME_COLUMNS, **FACE_COLUMNS}[name]
+        shape = (rows, width) if width > 1 else (rows,)
+        if rows == 0:
+            return np.empty(shape, dtype=dtype)  # np.memmap can't map an empty file
+        return np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self):
+        return self.frames
+
+    def _chunk(self, index, shape=None):
+        if index not in self._chunks:
+            path = chunk_path(self.path, index)
+            if shape is None:
+                self._chunks[index] = np.memmap(path, dtype=np.uint8, mode="r")
+            else:
+                count = os.path.getsize(path) // int(np.prod(shape))
+                self._chunks[index] = np.memmap(path, dtype=np.uint8, mode="r", shape=(count, *shape))
+        return self._chunks[index]
+
+    def frame(self, row):
+        """The recorded frame at a row: a read-only view into the memory-mapped chunk for "raw", decoded for "jpeg"."""
+        index, position = divmod(row, self.chunk_frames)
+        if self.storage == "raw":
+            return self._chunk(index, self.frame_shape)[position]
+        if self.storage == "jpeg":
+            start = int(self.jpeg_offset[row])
+            return cv2.imdecode(self._chunk(index)[start:start + int(self.jpeg_length[row])], cv2.IMREAD_COLOR)
+        raise ValueError(f"Recording {self.path} has no frames (storage {self.storage!r})")
+
+    def roi(self, face_row):
+        """The face crop of a face row (storage "roi"), as a view into its chunk."""
+        size = self.meta["roi_size"]
+        index, position = divmod(face_row, self.chunk_frames)
+        return self._chunk(index, (size, size, 3))[position]
+
+    def main_faces(self):
+        """Face rows of the main (largest) face of every frame that has a face, in frame order."""
+        if self.faces == 0:
+            return np.zeros(0, dtype=np.intp)
+        rows = np.asarray(self.frame_row)
+        area = self.region[:, 2] * self.region[:, 3]
+        order = np.lexsort((-area, rows))
+        rows = rows[order]
+        return order[np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))]
+
+    def analysis(self, row):
+        """The recorded results of a frame, in the DeepFace.analyze shape the app uses."""
+        start, count = int(self.face_start[row]), int(self.face_count[row])
+        faces = []
+        for i in range(start, start + count):
+            x, y, w, h = (int(v) for v in self.region[i])
+            faces.append({
+                "emotion": emotion_dict(self.emotion[i]),
+                "dominant_emotion": EMOTIONS[self.dominant[i]],
+                "region": {"x": x, "y": y, "w": w, "h": h},
+                "face_confidence": float(self.confidence[i]),
+                "face_id": int(self.face_id[i]) if self.face_id[i] >= 0 else None,
+            })
+        return faces
+
+
+class SessionSource:
+    """Plays a recording as a capture source (see capture.open_source), at `speed` times real time or, with None, as fast as it is read."""
+
+    def __init__(self, path, speed=None, loop=False):
+        self.reader = SessionReader(path)
+        if self.reader.storage not in FRAME_STORAGES:
+            raise ValueError(f"Recording {path} has no frames to play (storage {self.reader.storage!r}); "
+                             f"only {' and '.join(FRAME_STORAGES)} recordings can be played back")
+        self.speed = speed
+        self.loop = loop
+        self.row = 0
+        self.ended = False
+        self._start = None
+
+    def read(self):
+        if self.row >= len(self.reader):
+            if not self.loop or not len(self.reader):
+                self.ended = True
+                return False, None
+            self.row = 0
+            self._start = None
+        if self.speed:
+            offset = (self.reader.timestamp[self.row] - self.reader.timestamp[0]) / self.speed
+            if self._start is None:
+                self._start = time.perf_counter() - offset
+            wait = self._start + offset - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        frame = self.reader.frame(self.row)
+        self.row += 1
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def cmd_record(args):
+    import emotion_detection
+
+    emotion_detection.warm_up(args.detector_backend, args.cache_dir, args.offline, **emotion_detection.emotion_options(args))
+    analyze = emotion_detection.make_analyzer(args.detect_interval, 0.5, args.detector_backend, smoothing=args.smoothing)
+    start = time.perf_counter()
+    with SessionRecorder(args.directory, args.storage, args.chunk_frames) as recorder:
+        for frame_index, _, frame in emotion_detection.iter_frames(args.source):
+            if args.limit is not None and frame_index >= args.limit:
+                break
+            recorder.write(frame_index, frame, analyze(frame))
+    elapsed = time.perf_counter() - start
+    print(f"Recorded {recorder.frames} frames ({recorder.faces} faces) in {elapsed:.1f}s to {args.directory}",
+          file=sys.stderr)
+    return 0
+
+
+def cmd_replay(args):
+    """Re-analyze every recorded frame in order and compare with the recorded results."""
+    import emotion_detection
+
+    reader = SessionReader(args.directory)
+    if reader.storage not in FRAME_STORAGES:
+        print(f"Cannot replay {args.directory}: it was recorded with storage {reader.storage!r}, which keeps no frames "
+              f"to re-analyze (record with --storage raw or jpeg)", file=sys.stderr)
+        return 1
+    emotion_detection.warm_up(args.detector_backend, args.cache_dir, args.offline, **emotion_detection.emotion_options(args))
+    analyze = emotion_detection.make_analyzer(args.detect_interval, 0.5, args.detector_backend, smoothing=args.smoothing)
+    source = SessionSource(args.directory, speed=args.speed)
+    agree = compared = 0
+    start = time.perf_counter()
+    for row in range(len(reader)):
+        _, frame = source.read()
+        primary = emotion_detection.primary_face(analyze(frame))
+        recorded = emotion_detection.primary_face(reader.analysis(row))
+        if primary is not None and recorded is not None:
+            compared += 1
+            agree += primary['dominant_emotion'] == recorded['dominant_emotion']
+    elapsed = time.perf_counter() - start
+    recorded_s = float(reader.timestamp[-1] - reader.timestamp[0]) if len(reader) > 1 else 0.0
+    print(f"Replayed {len(reader)} frames in {elapsed:.1f}s ({len(reader) / max(elapsed, 1e-9):.1f} frames/s, "
+          f"{recorded_s / max(elapsed, 1e-9):.1f}x real time)")
+    if compared:
+        print(f"Main expression matches the recording on {agree / compared * 100:.1f}% of {compared} frames")
+    return 0
+
+
+def cmd_info(args):
+    reader = SessionReader(args.directory)
+    duration = float(reader.timestamp[-1] - reader.timestamp[0]) if len(reader) > 1 else 0.0
+    size = sum(os.path.getsize(os.path.join(args.directory, name)) for name in os.listdir(args.directory))
+    print(f"{args.directory}: {reader.storage} storage, {len(reader)} frames, {reader.faces} faces, "
+          f"{duration:.1f}s, {size / 1e6:.1f} MB, frame shape {reader.frame_shape}")
+    if reader.faces:
+        counts = np.bincount(reader.dominant[reader.main_faces()], minlength=len(EMOTIONS))
+        print("Main expression (largest face per frame): " + ", ".join(f"{e} {n}" for e, n in zip(EMOTIONS, counts) if n))
+    return 0
+
+
+def build_parser():
+    import emotion_detection
+
+    parser = argparse.ArgumentParser(prog="recording", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="Analyze a source and record frames and results")
+    p.add_argument("source", help="Anything capture.open_source accepts (camera index, file, folder, ...)")
+    p.add_argument("directory", help="New recording directory")
+    p.add_argument("--storage", default="raw", choices=STORAGE_MODES)
+    p.add_argument("--chunk-frames", type=int, default=256)
+    p.add_argument("--limit", type=int, help="Stop after this many frames")
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser("replay", help="Re-analyze a recording faster than real time and compare the results")
+    p.add_argument("directory")
+    p.add_argument("--speed", type=float, help="Pace at this multiple of real time (default: as fast as possible)")
+    p.set_defaults(func=cmd_replay)
+
+    for p in sub.choices.values():
+        p.add_argument("--detect-interval", type=int, default=10)
+        p.add_argument("--smoothing", default="ema", choices=["none", "ema", "median"])
+        emotion_detection.add_model_arguments(p)
+
+    p = sub.add_parser("info", help="Summarize a recording")
+    p.add_argument("directory")
+    p.set_defaults(func=cmd_info)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
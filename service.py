@@ -0,0 +1,384 @@
+"""Local emotion-analysis HTTP service with micro-batching, and a client the Tk app can use instead of local models.
+
+POST /analyze with a JPEG or PNG body (Content-Type image/jpeg or image/png), or raw pixels
+(Content-Type application/octet-stream with X-Width, X-Height and optionally X-Pixel-Format:
+bgr, rgb or gray). The response is the list of faces in the shape of output.js: emotion,
+dominant_emotion, region (x, y, w, h, left_eye, right_eye) and face_confidence.
+GET /health reports readiness and queue statistics, GET /metrics serves Prometheus text.
+
+Requests that arrive together are analyzed as one micro-batch: faces from all of them go through
+the emotion model in one forward pass. A batch starts when max_batch requests are waiting or
+max_wait after the first one arrived. When max_queue requests are already waiting, new ones are
+rejected with 503 instead of piling up. The service listens on 127.0.0.1 by default and never
+needs the network once the models are cached (see --cache-dir/--offline).
+
+Usage:
+    python -m service --port 8765 --max-batch 16 --max-wait-ms 10 --cache-dir models --offline
+    curl --data-binary @assets/happy.jpeg -H "Content-Type: image/jpeg" http://127.0.0.1:8765/analyze
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from telemetry import Metrics
+
+OUTPUT_KEYS = ("emotion", "dominant_emotion", "region", "face_confidence")
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+
+class Overloaded(Exception):
+    """The batcher's queue is full."""
+
+
+class _Request:
+    __slots__ = ("item", "done", "result", "error", "queued_at")
+
+    def __init__(self, item):
+        self.item = item
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.queued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Coalesces concurrent submit() calls into batches for process(items) -> results, on one worker thread."""
+
+    def __init__(self, process, max_batch=16, max_wait=0.01, max_queue=64, metrics=None):
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._stop = False
+        self._thread = threading.Thread(target=self._loop, name="batcher", daemon=True)
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(2.0)
+
+    def submit(self, item, timeout=None):
+        """Queue item and wait for its result. Raises Overloaded if the queue is full, TimeoutError after timeout."""
+        request = _Request(item)
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"{len(self._queue)} requests already waiting")
+            self._queue.append(request)
+            self._cond.notify_all()
+        if not request.done.wait(timeout):
+            raise TimeoutError("Analysis did not finish in time")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stop)
+                if self._stop:
+                    return
+                # Wait for more requests until the batch is full or the first one has waited max_wait
+                deadline = self._queue[0].queued_at + self.max_wait
+                while len(self._queue) < self.max_batch and not self._stop:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            self._run(batch)
+
+    def _run(self, batch):
+        start = time.perf_counter()
+        try:
+            results = self.process([request.item for request in batch])
+            for request, result in zip(batch, results):
+                request.result = result
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        if self.metrics is not None:
+            self.metrics.observe("batch", time.perf_counter() - start)
+            for request in batch:
+                self.metrics.observe("queue_wait", start - request.queued_at)
+        self.batches += 1
+        self.items += len(batch)
+        for request in batch:
+            request.done.set()
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._queue)
+        return {
+            "queue": depth,
+            "batches": self.batches,
+            "requests": self.items,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+            "rejected": self.rejected,
+        }
+
+
+def decode_frame(body, content_type, headers):
+    """Decode a request body into a BGR frame. Raises ValueError if it isn't a usable image."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("image/jpeg", "image/png", "image/jpg"):
+        frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Cannot decode image")
+        return frame
+    if content_type == "application/octet-stream":
+        try:
+            width, height = int(headers["X-Width"]), int(headers["X-Height"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Raw frames need X-Width and X-Height headers")
+        pixel_format = (headers.get("X-Pixel-Format") or "bgr").lower()
+        channels = 1 if pixel_format == "gray" else 3
+        if len(body) != width * height * channels:
+            raise ValueError(f"Expected {width * height * channels} bytes for {width}x{height} {pixel_format}, got {len(body)}")
+        pixels = np.frombuffer(body, dtype=np.uint8).reshape(height, width, channels)
+        if pixel_format == "rgb":
+            return cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+        if pixel_format == "gray":
+            return cv2.cvtColor(pixels, cv2.COLOR_GRAY2BGR)
+        return pixels
+    raise ValueError(f"Unsupported Content-Type: {content_type or 'none'}")
+
+
+def to_output(face):
+    """One face in the JSON shape of output.js."""
+    import emotion_detection
+
+    record = emotion_detection.to_record(0, None, 0, face)
+    return {k: record[k] for k in OUTPUT_KEYS}
+
+
+class EmotionService:
+    """The analysis backend of the HTTP server: a MicroBatcher over emotion_detection.analyze_batch()."""
+
+    def __init__(self, detector_backend="opencv", max_batch=16, max_wait=0.01, max_queue=64, request_timeout=10.0,
+                 detect_scale=1.0):
+        import emotion_detection
+
+        self.detector_backend = detector_backend
+        self.detect_scale = emotion_detection.check_detect_scale(detect_scale)
+        self.request_timeout = request_timeout
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(self._analyze, max_batch, max_wait, max_queue, self.metrics)
+        self.metrics.add_source(self.batcher.stats)
+        self.ready = threading.Event()
+
+    def _analyze(self, frames):
+        import emotion_detection
+
+        with self.metrics.stage("analyze_batch"):
+            return emotion_detection.analyze_batch(frames, self.detector_backend, self.detect_scale)
+
+    def start(self, cache_dir=None, offline=False, emotion_options=None):
+        """Load and warm the models, then start taking requests (emotion_options: see emotion_detection.emotion_options())."""
+        import emotion_detection
+
+        timings = emotion_detection.warm_up(self.detector_backend, cache_dir, offline, **(emotion_options or {}))
+        print("Model warm-up:\n" + emotion_detection.format_timings(timings), file=sys.stderr)
+        self.batcher.start()
+        self.ready.set()
+
+    def analyze(self, frame):
+        return [to_output(face) for face in self.batcher.submit(frame, self.request_timeout)]
+
+    def handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse one connection
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._send(200 if service.ready.is_set() else 503,
+                               dict(service.batcher.stats(), ready=service.ready.is_set()))
+                elif self.path == "/metrics":
+                    self._send(200, service.metrics.to_prometheus(), "text/plain; version=0.0.4")
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def do_POST(self):
+                if self.path != "/analyze":
+                    self._send(404, {"error": "Not found"})
+                    return
+                try:
+                    length = int(self.headers["Content-Length"])
+                except (TypeError, ValueError):
+                    self.close_connection = True
+                    self._send(411, {"error": "Content-Length required"})
+                    return
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    self.close_connection = True  # The unread body makes the connection unusable
+                    self._send(413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"})
+                    return
+                body = self.rfile.read(length)
+                start = time.perf_counter()
+                try:
+                    frame = decode_frame(body, self.headers.get("Content-Type"), self.headers)
+                    faces = service.analyze(frame)
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                except Overloaded as e:
+                    self._send(503, {"error": f"Overloaded: {e}"}, headers={"Retry-After": "1"})
+                    return
+                except TimeoutError as e:
+                    self._send(504, {"error": str(e)})
+                    return
+                except Exception as e:
+                    self._send(500, {"error": repr(e)})
+                    return
+                service.metrics.observe("request", time.perf_counter() - start)
+                self._send(200, faces)
+
+            def _send(self, status, payload, content_type="application/json", headers=None):
+                data = (payload if isinstance(payload, str) else json.dumps(payload)).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep per-request lines out of the console
+
+        return Handler
+
+
+def _boxes(faces):
+    return [tuple(face['region'][k] for k in ('x', 'y', 'w', 'h')) for face in faces]
+
+
+class RemoteAnalyzer:
+    """Per-frame analysis function backed by the service, a drop-in for emotion_detection.make_analyzer().
+
+    Frames are sent as JPEG over one keep-alive connection. The service is stateless, so face IDs
+    are assigned here by matching each frame's boxes to the previous frame's (tracking.match_boxes).
+    """
+
+    def __init__(self, url, timeout=10.0, quality=90):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname or "127.0.0.1", parts.port or 80
+        self.timeout = timeout
+        self.quality = quality
+        self.conn = None
+        self.last_faces = []
+        self.next_id = 1
+        self.frames = 0
+        self.faces = 0
+        self.rejected = 0
+
+    def _request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                return response.status, json.loads(response.read() or b"null")
+            except (http.client.HTTPException, OSError):
+                # The server closed the keep-alive connection, or it timed out mid-response and can't be
+                # reused: reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def wait_ready(self, timeout=600.0):
+        """Block until the service reports that its models are loaded."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                status, _ = self._request("GET", "/health")
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Analysis service at {self.host}:{self.port} is not ready")
+            time.sleep(0.5)
+
+    def __call__(self, frame):
+        from tracking import match_boxes
+
+        _, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        status, payload = self._request("POST", "/analyze", encoded.tobytes(), {"Content-Type": "image/jpeg"})
+        if status == 503:
+            self.rejected += 1
+            return [dict(face) for face in self.last_faces]  # Service busy: keep the previous result
+        if status != 200:
+            raise RuntimeError(f"Analysis service returned {status}: {payload.get('error')}")
+
+        matches = match_boxes(_boxes(self.last_faces), _boxes(payload))
+        for index, face in enumerate(payload):
+            if index in matches:
+                face['face_id'] = self.last_faces[matches[index]]['face_id']
+            else:
+                face['face_id'] = self.next_id
+                self.next_id += 1
+        self.last_faces = payload
+        self.frames += 1
+        self.faces += len(payload)
+        return payload
+
+    def stats(self):
+        return {"frames": self.frames, "classified_faces": self.faces, "skipped_faces": 0, "rejected": self.rejected}
+
+
+def main(argv=None):
+    import emotion_detection
+
+    parser = argparse.ArgumentParser(prog="service", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=16, help="Most requests analyzed together")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="Longest a request waits for a batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Waiting requests before new ones get 503")
+    parser.add_argument("--request-timeout", type=float, default=10.0)
+    parser.add_argument("--detect-scale", type=emotion_detection.detect_scale_arg, default=1.0,
+                        help="Detect faces on frames downscaled by this factor (faces are classified at full resolution)")
+    emotion_detection.add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    service = EmotionService(args.detector_backend, args.max_batch, args.max_wait_ms / 1000.0,
+                             args.max_queue, args.request_timeout, args.detect_scale)
+    service.start(args.cache_dir, args.offline, emotion_detection.emotion_options(args))
+    server = ThreadingHTTPServer((args.host, args.port), service.handler())
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.batcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
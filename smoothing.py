@@ -0,0 +1,111 @@
+"""Streaming temporal smoothing of per-face emotion scores."""
+import numpy as np
+
+
+class FaceState:
+    """Fixed-size smoothing state of one face: a ring buffer of raw scores plus the running outputs."""
+
+    __slots__ = ("ring", "pos", "count", "smoothed", "label", "pending", "pending_count",
+                 "stable_count", "last_update")
+
+    def __init__(self, window, size):
+        self.ring = np.zeros((window, size), dtype=np.float32)
+        self.pos = 0
+        self.count = 0
+        self.smoothed = None
+        self.label = None  # Index of the dominant label currently shown
+        self.pending = None  # Label waiting to take over, and for how many updates it has led
+        self.pending_count = 0
+        self.stable_count = 0
+        self.last_update = 0
+
+
+class EmotionSmoother:
+    """EMA or sliding-median smoothing of emotion score vectors, per face ID.
+
+    The dominant label only switches when another emotion leads the current one by at least
+    `switch_margin` percentage points for `switch_frames` updates in a row (hysteresis), so a
+    single noisy frame cannot flip it. A face counts as stable once its smoothed scores moved by
+    less than `stable_threshold` points (largest per-emotion change) for `stable_frames` updates;
+    callers can use is_stable() to skip inference on it.
+    """
+
+    def __init__(self, method="ema", alpha=0.3, window=9, switch_margin=10.0, switch_frames=3,
+                 stable_threshold=1.0, stable_frames=5, forget_after=60):
+        if method not in ("ema", "median"):
+            raise ValueError(f"Unknown smoothing method: {method}")
+        self.method = method
+        self.alpha = alpha
+        self.window = window
+        self.switch_margin = switch_margin
+        self.switch_frames = switch_frames
+        self.stable_threshold = stable_threshold
+        self.stable_frames = stable_frames
+        self.forget_after = forget_after
+        self.faces = {}
+        self.tick = 0
+
+    def update(self, face_id, scores):
+        """Add one raw score vector for a face. Returns (smoothed scores, dominant label index)."""
+        scores = np.asarray(scores, dtype=np.float32)
+        state = self.faces.get(face_id)
+        if state is None:
+            state = self.faces[face_id] = FaceState(self.window, len(scores))
+
+        state.ring[state.pos] = scores
+        state.pos = (state.pos + 1) % self.window
+        state.count = min(state.count + 1, self.window)
+        state.last_update = self.tick
+
+        previous = state.smoothed
+        if self.method == "median":
+            smoothed = np.median(state.ring[:state.count], axis=0)
+        elif previous is None:
+            smoothed = scores.copy()
+        else:
+            smoothed = previous + self.alpha * (scores - previous)
+        state.smoothed = smoothed
+
+        if previous is not None and float(np.abs(smoothed - previous).max()) < self.stable_threshold:
+            state.stable_count += 1
+        else:
+            state.stable_count = 0
+
+        self._update_label(state, smoothed)
+        return smoothed, state.label
+
+    def _update_label(self, state, smoothed):
+        leader = int(np.argmax(smoothed))
+        if state.label is None:
+            state.label = leader
+        elif leader == state.label or smoothed[leader] - smoothed[state.label] < self.switch_margin:
+            state.pending = None
+            state.pending_count = 0
+        else:
+            if leader != state.pending:
+                state.pending = leader
+                state.pending_count = 0
+            state.pending_count += 1
+            if state.pending_count >= self.switch_frames:
+                state.label = leader
+                state.pending = None
+                state.pending_count = 0
+
+    def current(self, face_id):
+        """Return (smoothed scores, dominant label index) of a face without adding a sample, or None."""
+        state = self.faces.get(face_id)
+        if state is None or state.smoothed is None:
+            return None
+        state.last_update = self.tick
+        return state.smoothed, state.label
+
+    def is_stable(self, face_id):
+        """True when the face's smoothed scores have barely moved for `stable_frames` updates."""
+        state = self.faces.get(face_id)
+        return state is not None and state.stable_count >= self.stable_frames
+
+    def next_frame(self):
+        """Advance the frame clock and drop faces that have not been updated for `forget_after` frames."""
+        self.tick += 1
+        for face_id in [i for i, s in self.faces.items() if self.tick - s.last_update > self.forget_after]:
+            del self.faces[face_id]
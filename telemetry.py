@@ -0,0 +1,290 @@
+"""Lightweight timing instrumentation for the live pipeline: stage timers, latency histograms and metrics export."""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StageTimer:
+    """Accumulates wall time per named stage, e.g. the parts of each Tk main-loop callback."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with-block as one call of stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self.counts.clear()
+            self.started = time.perf_counter()
+
+    def report(self, extra=None):
+        """Return {stage: {'total_s', 'calls', 'mean_ms', 'share'}}; share is of the wall time since reset.
+
+        extra maps more stage names to total seconds measured elsewhere (e.g. on another thread).
+        """
+        with self._lock:
+            wall = max(time.perf_counter() - self.started, 1e-9)
+            totals = dict(self.totals)
+            counts = dict(self.counts)
+        for name, seconds in (extra or {}).items():
+            totals[name] = seconds
+            counts.setdefault(name, 0)
+        return {
+            name: {
+                "total_s": seconds,
+                "calls": counts[name],
+                "mean_ms": seconds * 1000.0 / counts[name] if counts[name] else 0.0,
+                "share": seconds / wall,
+            }
+            for name, seconds in totals.items()
+        }
+
+    def format(self, extra=None):
+        """Render report() as aligned lines."""
+        lines = [f"  {'stage':<28}{'share':>8}{'calls':>9}{'mean ms':>10}"]
+        for name, r in sorted(self.report(extra).items(), key=lambda item: item[1]["total_s"], reverse=True):
+            mean = f"{r['mean_ms']:.2f}" if r["calls"] else "-"
+            lines.append(f"  {name:<28}{r['share'] * 100:>7.1f}%{r['calls']:>9}{mean:>10}")
+        return "\n".join(lines)
+
+
+# Histogram bucket upper bounds: 50 µs to ~27 s, four buckets per doubling (about 19% apart),
+# so a percentile read from the buckets is off by less than 10%.
+BUCKET_BOUNDS = [0.00005 * 2 ** (i / 4) for i in range(77)]
+# Every 4th bound (the doublings) is enough for Prometheus
+PROMETHEUS_BOUNDS = BUCKET_BOUNDS[::4]
+
+
+class LatencyHistogram:
+    """Fixed log-spaced latency buckets: O(log buckets) to record, constant memory, mergeable percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # The last bucket is everything above the top bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Estimated q-th percentile (0-100) in seconds, interpolated inside its bucket."""
+        if not self.count:
+            return 0.0
+        target = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= target:
+                low = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+                high = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                value = low + (high - low) * (target - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def cumulative(self, bound):
+        """Number of observations <= bound, for a bound in BUCKET_BOUNDS."""
+        return sum(self.counts[:BUCKET_BOUNDS.index(bound) + 1])
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "mean_ms": self.sum * 1000.0 / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000.0,
+            "p95_ms": self.percentile(95) * 1000.0,
+            "p99_ms": self.percentile(99) * 1000.0,
+            "max_ms": self.max * 1000.0,
+        }
+
+
+class Metrics:
+    """Thread-safe latency histograms per stage plus counters pulled from registered sources.
+
+    Stages are recorded from any thread with `with metrics.stage("detection"):` or observe().
+    Sources are callables returning {name: number} (e.g. dropped-frame counts), read on export.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.sources = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with-block as one observation of stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            self.histograms[name].observe(seconds)
+
+    def add_source(self, source):
+        """Register a callable returning {counter name: value}, included in every snapshot."""
+        self.sources.append(source)
+
+    def count(self, name):
+        """Observations of a stage so far (0 if it has none)."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return histogram.count if histogram else 0
+
+    def percentile(self, name, q):
+        """q-th percentile of a stage in seconds (0.0 if it has no observations)."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return histogram.percentile(q) if histogram else 0.0
+
+    def counters(self):
+        counters = {}
+        for source in self.sources:
+            try:
+                counters.update(source())
+            except Exception:
+                pass  # A source that isn't ready yet (e.g. no pipeline) is just left out
+        return counters
+
+    def snapshot(self):
+        """Return {'uptime_s', 'stages': {name: summary}, 'counters': {...}} for JSON export."""
+        with self._lock:
+            stages = {name: histogram.summary() for name, histogram in self.histograms.items()}
+        return {"uptime_s": time.perf_counter() - self.started, "stages": stages, "counters": self.counters()}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="emotion"):
+        """Render the Prometheus text exposition format: one histogram family, percentiles and counters."""
+        lines = [f"# HELP {prefix}_stage_seconds Per-stage latency.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            for name, h in histograms:
+                for bound in PROMETHEUS_BOUNDS:
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound:.6g}"}} {h.cumulative(bound)}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {h.count}')
+            lines += [f"# HELP {prefix}_stage_percentile_seconds Per-stage latency percentiles.",
+                      f"# TYPE {prefix}_stage_percentile_seconds gauge"]
+            for name, h in histograms:
+                for q in (50, 95, 99):
+                    lines.append(f'{prefix}_stage_percentile_seconds{{stage="{name}",quantile="0.{q}"}} '
+                                 f'{h.percentile(q):.6f}')
+        for name, value in sorted(self.counters().items()):
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def format(self):
+        """Render the stage percentiles as aligned lines for the console."""
+        lines = [f"  {'stage':<20}{'count':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+        for name, r in sorted(self.snapshot()["stages"].items()):
+            lines.append(f"  {name:<20}{r['count']:>8}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                         f"{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+
+class MetricsExporter:
+    """Publishes a Metrics object to a file every `interval` seconds and/or over HTTP on localhost.
+
+    The file is Prometheus text (e.g. for node_exporter's textfile collector) unless its name ends
+    in .json; it is replaced atomically so readers never see half a file. The HTTP endpoint serves
+    /metrics (Prometheus text) and /metrics.json.
+    """
+
+    def __init__(self, metrics, path=None, port=None, interval=5.0, host="127.0.0.1"):
+        self.metrics = metrics
+        self.path = path
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.path is not None:
+            self._threads.append(threading.Thread(target=self._write_loop, name="metrics-file", daemon=True))
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            self._threads.append(threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self._threads:
+            thread.join(2.0)
+        if self.path is not None:
+            self.write()  # Final numbers
+
+    def write(self):
+        """Write the current metrics to self.path, atomically."""
+        body = self.metrics.to_json() if self.path.endswith(".json") else self.metrics.to_prometheus()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(body)
+        os.replace(tmp, self.path)
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = metrics.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        return Handler
@@ -0,0 +1,188 @@
+"""Detect faces every K frames and follow them with optical flow in between."""
+import cv2
+import numpy as np
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_boxes(old_boxes, new_boxes, min_iou=0.3):
+    """Greedily pair old and new boxes by descending IoU. Returns {new_index: old_index}."""
+    pairs = sorted(((iou(old, new), i, j) for i, old in enumerate(old_boxes) for j, new in enumerate(new_boxes)),
+                   reverse=True)
+    matches = {}
+    used = set()
+    for score, i, j in pairs:
+        if score < min_iou:
+            break
+        if i in used or j in matches:
+            continue
+        matches[j] = i
+        used.add(i)
+    return matches
+
+
+class FaceTracker:
+    """Runs the (expensive) face detector every `interval` frames and tracks the boxes in between.
+
+    Between detections each box is moved and scaled by the median Lucas-Kanade optical flow of
+    corner features inside it, computed on the grayscale frame. The tracking confidence of a box
+    is the fraction of its features that survive a forward-backward consistency check; if any box
+    drops below `min_confidence` the detector runs again straight away.
+
+    Every face gets a track ID that stays the same across frames: fresh detections are matched
+    to the tracked boxes by IoU and inherit their ID, unmatched detections get a new one.
+    """
+
+    def __init__(self, detect, interval=10, min_confidence=0.5, max_corners=40, min_iou=0.3):
+        self.detect = detect  # detect(frame) -> list of {'x', 'y', 'w', 'h', 'confidence'} dicts
+        self.interval = max(1, int(interval))
+        self.min_confidence = min_confidence
+        self.max_corners = max_corners
+        self.min_iou = min_iou
+
+        self.boxes = []  # [x, y, w, h] floats
+        self.ids = []  # Track ID of each box
+        self.next_id = 1
+        self.face_confidences = []  # Detector confidence of each box
+        self.track_confidences = []  # Optical flow confidence of each box
+        self.prev_gray = None
+        self.frames_since_detect = 0
+
+        self.frame_count = 0
+        self.detect_count = 0
+
+    def update(self, frame):
+        """Return the face regions for this frame, detecting or tracking as needed."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.frame_count += 1
+        if self.prev_gray is not None and self.prev_gray.shape != gray.shape:
+            self._resize(gray.shape)
+
+        redetect = self.detection_due()
+        if not redetect and self.boxes:
+            tracked = [self._track_box(box, gray) for box in self.boxes]
+            if min(conf for _, conf in tracked) < self.min_confidence:
+                redetect = True  # Lost a face, don't wait for the next scheduled detection
+            else:
+                self.boxes = [box for box, _ in tracked]
+                self.track_confidences = [conf for _, conf in tracked]
+
+        if redetect:
+            self._redetect(frame)
+        else:
+            self.frames_since_detect += 1
+
+        self.prev_gray = gray
+        return self.regions()
+
+    def detection_due(self):
+        """True if the next update() runs the full detector (unless a face is lost sooner)."""
+        return self.prev_gray is None or self.frames_since_detect + 1 >= self.interval
+
+    def skip(self):
+        """Count a frame that was not looked at (its previous regions were reused) toward the detection schedule."""
+        self.frame_count += 1
+        self.frames_since_detect += 1
+
+    def _redetect(self, frame):
+        detections = self.detect(frame)
+        boxes = [[float(d['x']), float(d['y']), float(d['w']), float(d['h'])] for d in detections]
+
+        # Keep the IDs of faces we were already tracking
+        matches = match_boxes(self.boxes, boxes, self.min_iou)
+        ids = []
+        for j in range(len(boxes)):
+            if j in matches:
+                ids.append(self.ids[matches[j]])
+            else:
+                ids.append(self.next_id)
+                self.next_id += 1
+
+        self.boxes = boxes
+        self.ids = ids
+        self.face_confidences = [float(d.get('confidence', 0.0)) for d in detections]
+        self.track_confidences = [1.0] * len(detections)
+        self.frames_since_detect = 0
+        self.detect_count += 1
+
+    def _resize(self, shape):
+        """The input size changed (e.g. a new analysis scale): move the boxes to the new size and re-detect,
+        so the tracks keep their IDs."""
+        sy, sx = shape[0] / self.prev_gray.shape[0], shape[1] / self.prev_gray.shape[1]
+        self.boxes = [[x * sx, y * sy, w * sx, h * sy] for x, y, w, h in self.boxes]
+        self.prev_gray = None
+
+    def _track_box(self, box, gray):
+        """Move one box from prev_gray to gray. Returns (new_box, confidence)."""
+        height, width = gray.shape
+        x, y, w, h = (int(round(v)) for v in box)
+        x, y = max(x, 0), max(y, 0)
+        roi = self.prev_gray[y:min(y + h, height), x:min(x + w, width)]
+        if roi.size == 0:
+            return box, 0.0
+
+        points = cv2.goodFeaturesToTrack(roi, self.max_corners, 0.01, 5)
+        if points is None or len(points) < 4:
+            return box, 0.0
+        points = points.reshape(-1, 2) + np.float32([x, y])
+
+        lk = dict(winSize=(15, 15), maxLevel=2)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None, **lk)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, moved, None, **lk)
+        fb_error = np.linalg.norm(points - back, axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < 1.0)
+        confidence = float(good.mean())
+        if good.sum() < 4:
+            return box, 0.0
+
+        old, new = points[good], moved[good]
+        dx, dy = np.median(new - old, axis=0)
+
+        # Scale from the change in spread of the points around their centre
+        old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+        new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+        scale = new_spread / old_spread if old_spread > 0 else 1.0
+
+        bx, by, bw, bh = box
+        cx, cy = bx + bw / 2 + dx, by + bh / 2 + dy
+        bw, bh = bw * scale, bh * scale
+        return [cx - bw / 2, cy - bh / 2, bw, bh], confidence
+
+    def regions(self):
+        """Current boxes as DeepFace-style region dicts, clipped to the last frame. Boxes with no area left are dropped."""
+        height, width = self.prev_gray.shape[:2] if self.prev_gray is not None else (float("inf"),) * 2
+        regions = []
+        for face_id, (x, y, w, h), face_conf, track_conf in zip(
+                self.ids, self.boxes, self.face_confidences, self.track_confidences):
+            x, y, w, h = (int(round(v)) for v in (x, y, w, h))
+            x2, y2 = min(x + w, width), min(y + h, height)
+            x, y = max(x, 0), max(y, 0)
+            if x2 <= x or y2 <= y:
+                continue
+            regions.append({
+                'id': face_id,
+                'x': x,
+                'y': y,
+                'w': int(x2 - x),
+                'h': int(y2 - y),
+                'confidence': face_conf,
+                'track_confidence': track_conf,
+            })
+        return regions
+
+    def stats(self):
+        """Return how many frames were seen and how many needed a full detection."""
+        return {
+            "frames": self.frame_count,
+            "detections": self.detect_count,
+            "detect_ratio": self.detect_count / self.frame_count if self.frame_count else 0.0,
+        }